@@ -0,0 +1,55 @@
+import pylink
+import numpy as np
+import time
+import sys
+
+from pyelink_connector.realtime import apply_realtime, get_realtime_state, restore_realtime
+
+# Compares sample-read intervals with and without real-time mode.
+# Usage: python benchmarkReadJitter.py [host] [duration_s] [core ...]
+
+
+def measure(eyelink, duration:float) -> np.ndarray:
+    """Reads samples in a tight loop and returns the local intervals (ms) between newly arrived samples."""
+    arrivals = []
+    last = None
+    end = time.perf_counter() + duration
+    while time.perf_counter() < end:
+        s = eyelink.getNewestSample()
+        if s is not None and s.getTime() != last:
+            arrivals.append(time.perf_counter())
+            last = s.getTime()
+    return np.diff(np.asarray(arrivals)) * 1000.
+
+
+def report(name:str, intervals:np.ndarray):
+    if intervals.size == 0:
+        print(f"{name:>10}: no new samples received")
+        return
+    print(f"{name:>10}: n={intervals.size} mean={intervals.mean():.3f} ms sd={intervals.std():.3f} ms "
+          f"p99={np.percentile(intervals, 99):.3f} ms max={intervals.max():.3f} ms")
+
+
+if __name__ == "__main__":
+    host = sys.argv[1] if len(sys.argv) > 1 else "100.1.1.1"
+    duration = float(sys.argv[2]) if len(sys.argv) > 2 else 10.
+    cores = [int(c) for c in sys.argv[3:]] or None
+
+    eyelink = pylink.EyeLink(host)
+    # samples over link only
+    eyelink.startRecording(0, 0, 1, 0)
+    time.sleep(0.1)
+
+    baseline = get_realtime_state()
+    report("default", measure(eyelink, duration))
+
+    try:
+        apply_realtime(cores)
+        report("realtime", measure(eyelink, duration))
+    finally:
+        restored = restore_realtime(baseline)
+        eyelink.stopRecording()
+        eyelink.close()
+
+    print(f"default scheduling was {baseline.policy} priority {baseline.priority} on cores {baseline.cores}, "
+          f"restored to {restored.policy} priority {restored.priority} on cores {restored.cores}")
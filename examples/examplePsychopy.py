@@ -108,8 +108,9 @@ def main(settings:dict):
 
     # stop recording
     eyeConnector.stopRecording()
-    # download edf file
-    eyeConnector.downloadFile()
+    # download edf file while showing the progress
+    task = eyeConnector.downloadFileAsync()
+    eyeConnector.showDownloadProgress(task)
     # close connection
     eyeConnector.close()
     
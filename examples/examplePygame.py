@@ -123,6 +123,7 @@ class TrialStage(Stage):
         self.clock = clock
         self.eyeConnector = eyeConnector
         self.renderFPS = settings["render_fps"]
+        self.settings = settings
 
         self.terminated = False
 
@@ -211,8 +212,9 @@ class TrialStage(Stage):
         # stop recording
         self.eyeConnector.stopRecording()
 
-        # download edf file
-        self.eyeConnector.downloadFile()
+        # download edf file while showing the progress
+        task = self.eyeConnector.downloadFileAsync()
+        self.eyeConnector.showDownloadProgress(task, self.settings)
 
 
 
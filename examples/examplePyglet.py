@@ -3,6 +3,7 @@ import screeninfo
 
 from pyelink_connector.pyglet.connector import EyeConnector
 from pyelink_connector.pyglet.utils import Target
+from pyelink_connector.sidecar import StimulusLog
 
 # to create a dummy trial
 import random
@@ -74,6 +75,10 @@ class TrialStage():
         self.v = 400
         self.v_angle = np.deg2rad(20)
 
+        # log the target position per frame to a local file instead of the edf file
+        self.stimulus_log = StimulusLog(self.eyeConnector.download_directory, name="target")
+        self.eyeConnector.recording_listeners.append(self.stimulus_log)
+
     def start(self):
         self.target = Target(x=self.win.width//2, y=self.win.height//2, outer_color=(200, 40, 40), batch=self.batch)
 
@@ -109,6 +114,7 @@ class TrialStage():
         vy = np.sin(self.v_angle) * self.v
         self.target.set_x(self.target.x + vx * dt)
         self.target.set_y(self.target.y + vy * dt)
+        self.stimulus_log.log(target=(self.target.x, self.target.y), angle=self.v_angle)
 
         # move cursor according to eye-gaze
         samples = self.eyeConnector.getEyeSample()
@@ -137,10 +143,13 @@ class TrialStage():
 
         # stop recording
         self.eyeConnector.stopRecording()
+        self.eyeConnector.recording_listeners.remove(self.stimulus_log)
+        self.stimulus_log.close()
 
-        # download edf file
-        self.eyeConnector.downloadFile()
+        # download edf file in the background while a progress screen is shown
+        self.eyeConnector.downloadFileAsync(callback=self._on_download_done)
 
+    def _on_download_done(self, task):
         self.terminated = True
 
 
@@ -223,4 +232,9 @@ if __name__ == "__main__":
     handler = Handler(win, batch, eyeConnector)
     handler.start()
 
-    pyglet.app.run(1/settings["render_fps"])
+    # redraw at the render rate, but only windows with changed content. The setup clears win.invalid on unchanged screens.
+    def redraw(dt):
+        if win.invalid:
+            win.draw(dt)
+    pyglet.clock.schedule_interval(redraw, 1/settings["render_fps"])
+    pyglet.app.run(None)
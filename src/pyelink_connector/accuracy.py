@@ -0,0 +1,191 @@
+import pylink
+import numpy as np
+from typing import NamedTuple
+
+from .history import sample_row
+from .link import LinkReader
+
+EYE_COLUMNS = [("left", 1, 2), ("right", 4, 5)] # columns of x and y in history.sample_row
+MIN_SAMPLES = 10 # valid samples needed per target and eye
+
+
+class CheckTarget(NamedTuple):
+    target: tuple # (x, y) in window (tracker) coordinates
+    eye: str # "left" or "right"
+    offset: tuple # median gaze - target (dx, dy) in px
+    accuracy: float # distance of the median gaze to the target in px
+    precision: float # RMS of the sample-to-sample distances in px
+    samples: int # valid samples
+
+
+class QuickCheckResult(NamedTuple):
+    passed: bool|None # None if the thresholds in degrees could not be checked, i.e. pixels_per_degree is None
+    accuracy: float # average error in degrees (px if pixels_per_degree is None)
+    max_error: float # largest error of any target and eye, same unit
+    precision: float # average RMS sample-to-sample precision, same unit
+    targets: list # CheckTargets, values in px
+    pixels_per_degree: float|None
+
+
+def check_targets(n:int, center:tuple, size:tuple, area:float=.5) -> list:
+    """Returns 1 to 5 target positions: the center first, then the corners of the given proportion of the screen.
+    Args:
+        n (int): Number of targets.
+        center (tuple): Screen center in window coordinates, e.g. (0, 0) for psychopy.
+        size (tuple): Screen (width, height) in px.
+        area (float, optional): Proportion of the screen covered by the targets. Defaults to .5.
+    """
+    assert(1 <= n <= 5)
+    cx, cy = center
+    dx, dy = size[0] * area / 2, size[1] * area / 2
+    return [(cx, cy), (cx - dx, cy - dy), (cx + dx, cy + dy), (cx + dx, cy - dy), (cx - dx, cy + dy)][:n]
+
+
+def gaze_stats(x:np.ndarray, y:np.ndarray, target:tuple) -> tuple:
+    """Accuracy and precision of the gaze on a target (nan = missing data).
+    Returns:
+        tuple: (dx, dy) median offset in px, accuracy in px, RMS sample-to-sample precision in px, number of valid samples.
+    """
+    valid = ~(np.isnan(x) | np.isnan(y))
+    x, y = x[valid], y[valid]
+    if x.size < 2:
+        return (np.nan, np.nan), np.nan, np.nan, int(x.size)
+    dx, dy = np.median(x) - target[0], np.median(y) - target[1]
+    precision = np.sqrt(np.mean(np.diff(x)**2 + np.diff(y)**2))
+    return (float(dx), float(dy)), float(np.hypot(dx, dy)), float(precision), int(x.size)
+
+
+def evaluate_check(rows:np.ndarray, windows:list, max_error:float=1., max_precision:float=.5,
+                   pixels_per_degree:float|None=None) -> QuickCheckResult:
+    """Evaluates the samples of a quick check.
+    Args:
+        rows (np.ndarray): Samples as history.sample_row rows sorted by time.
+        windows (list): (t0, t1, target) per target: tracker time range in which the target was fixated.
+        max_error (float, optional): Largest accepted error of any target in degrees. Defaults to 1.
+        max_precision (float, optional): Largest accepted average RMS precision in degrees. Defaults to .5.
+        pixels_per_degree (float|None, optional): Converts the results from px to degrees. Defaults to None,
+            i.e. the results are in px and passed is None unless targets are missing.
+    """
+    rows = np.asarray(rows, dtype=np.float64).reshape(-1, 7)
+    times = rows[:, 0]
+    targets = []
+    complete = True
+    for t0, t1, target in windows:
+        i0, i1 = np.searchsorted(times, [t0, t1], side="left")
+        found = False
+        for eye, cx, cy in EYE_COLUMNS:
+            offset, accuracy, precision, n = gaze_stats(rows[i0:i1, cx], rows[i0:i1, cy], target)
+            if n >= MIN_SAMPLES:
+                targets.append(CheckTarget(tuple(target), eye, offset, accuracy, precision, n))
+                found = True
+        # a target without data, e.g. looked away or blinked, fails the check
+        complete &= found
+
+    pixels_per_degree = pixels_per_degree if pixels_per_degree else None
+    if not targets:
+        return QuickCheckResult(False, np.nan, np.nan, np.nan, [], pixels_per_degree)
+    scale = pixels_per_degree if pixels_per_degree is not None else 1.
+    accuracies = np.array([t.accuracy for t in targets]) / scale
+    precision = float(np.mean([t.precision for t in targets]) / scale)
+    if not complete:
+        passed = False
+    elif pixels_per_degree is None:
+        # px cannot be compared to the thresholds in degrees
+        passed = None
+    else:
+        passed = bool((accuracies.max() <= max_error) and (precision <= max_precision))
+    return QuickCheckResult(passed, float(accuracies.mean()), float(accuracies.max()), precision, targets, pixels_per_degree)
+
+
+class QuickCheck():
+    def __init__(self, eyelink, targets:list, duration:float=1., settle:float=.3, max_error:float=1., max_precision:float=.5,
+                 pixels_per_degree:float|None=None, link:LinkReader|None=None) -> None:
+        """A fast accuracy check between blocks: shows a few targets while recording over the link only and
+        evaluates the samples locally. The tracker does not enter setup mode. Backends call step() once per frame
+        and draw the returned target (see EyeConnector.quickCheck).
+
+        Args:
+            eyelink: pylink.EyeLink. Must not be recording.
+            targets (list): Target positions in window (tracker) coordinates, see check_targets.
+            duration (float, optional): Time each target is shown in s. Defaults to 1.
+            settle (float, optional): Time to look at a new target in s. Its samples are ignored. Defaults to .3.
+            max_error (float, optional): Largest accepted error of any target in degrees. Defaults to 1.
+            max_precision (float, optional): Largest accepted average RMS sample-to-sample precision in degrees. Defaults to .5.
+            pixels_per_degree (float|None, optional): Defaults to None, i.e. the resolution reported with the samples.
+                If the tracker does not report it, the results are in px and passed is None.
+            link (LinkReader|None, optional): Reader shared with other consumers of the link queue (EyeConnector.link).
+                Defaults to None, i.e. a reader of its own.
+        """
+        self.eyelink = eyelink
+        self.link = link if link is not None else LinkReader(eyelink)
+        self.targets = [tuple(t) for t in targets]
+        self.duration = duration
+        self.settle = settle
+        self.max_error = max_error
+        self.max_precision = max_precision
+        self.pixels_per_degree = pixels_per_degree
+
+        self.result = None
+        self._index = -1
+        self._shown = 0.
+        self._windows = []
+        self._rows = []
+
+    @property
+    def running(self) -> bool:
+        return 0 <= self._index < len(self.targets)
+
+    @property
+    def target(self) -> tuple|None:
+        return self.targets[self._index] if self.running else None
+
+    def start(self) -> None:
+        self.result = None
+        self._windows = []
+        self._rows = []
+        # samples read before belong to earlier recordings
+        self.link.samples("quick_check")
+        self.eyelink.sendMessage("QUICK_CHECK START")
+        # samples over the link only, the edf file is not filled
+        self.eyelink.startRecording(0, 0, 1, 1)
+        self._index = -1
+        self._next_target()
+
+    def step(self) -> tuple|None:
+        """Reads the queued samples and switches targets.
+        Returns:
+            tuple|None: Target to draw, None once the check is done (see self.result).
+        """
+        if not self.running:
+            return None
+        self._read()
+        if self.eyelink.trackerTime() >= self._shown + self.duration * 1000:
+            self._next_target()
+        return self.target
+
+    def _next_target(self) -> None:
+        self._index += 1
+        if self._index >= len(self.targets):
+            self._finish()
+            return
+        self._shown = self.eyelink.trackerTime()
+        self._windows.append((self._shown + self.settle * 1000, self._shown + self.duration * 1000, self.targets[self._index]))
+
+    def _read(self) -> None:
+        for s in self.link.samples("quick_check"):
+            self._rows.append(sample_row(s))
+            if (self.pixels_per_degree is None) and hasattr(s, "getPPD"):
+                ppd = s.getPPD()
+                self.pixels_per_degree = (ppd[0] + ppd[1]) / 2 if ppd[0] > 0 else None
+
+    def _finish(self) -> None:
+        self.eyelink.stopRecording()
+        # the samples up to the end of the recording are still queued
+        self._read()
+        rows = np.array(self._rows, dtype=np.float64).reshape(-1, 7)
+        rows[rows == pylink.MISSING_DATA] = np.nan
+        self.result = evaluate_check(rows, self._windows, self.max_error, self.max_precision, self.pixels_per_degree)
+        r = self.result
+        status = "UNCHECKED" if r.passed is None else ("PASSED" if r.passed else "FAILED")
+        self.eyelink.sendMessage(f"QUICK_CHECK {status} {r.accuracy:.2f} avg. {r.max_error:.2f} max "
+                                 f"{r.precision:.3f} RMS {'deg' if r.pixels_per_degree else 'px'}")
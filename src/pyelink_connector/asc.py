@@ -0,0 +1,275 @@
+import numpy as np
+import mmap
+import re
+import os
+import warnings
+from typing import NamedTuple
+
+PARSER_VERSION = 1
+
+# a single "." is a missing value
+_MISSING = re.compile(rb"(?<!\S)\.(?!\S)")
+
+_MSG = re.compile(rb"^MSG\s+(\d+(?:\.\d+)?)\s+(?:-\d+\s+)?([^\n\r]*)", re.M)
+_EFIX = re.compile(rb"^EFIX\s+([LR])\s+(\S+)\s+(\S+)\s+(\S+)\s+(\S+)\s+(\S+)\s+(\S+)", re.M)
+_ESACC = re.compile(rb"^ESACC\s+([LR])\s+(\S+)\s+(\S+)\s+(\S+)\s+(\S+)\s+(\S+)\s+(\S+)\s+(\S+)\s+(\S+)\s+(\S+)", re.M)
+_EBLINK = re.compile(rb"^EBLINK\s+([LR])\s+(\S+)\s+(\S+)\s+(\S+)", re.M)
+_TRIAL = re.compile(r"^TIMESTAMP (.*) - (START|END) OF TRIAL (.*)$")
+
+FIXATION_COLUMNS = ["eye", "start", "end", "duration", "x", "y", "pupil"]
+SACCADE_COLUMNS = ["eye", "start", "end", "duration", "start_x", "start_y", "end_x", "end_y", "amplitude", "peak_velocity"]
+BLINK_COLUMNS = ["eye", "start", "end", "duration"]
+
+
+class AscData(NamedTuple):
+    samples: dict # column name -> array. "time" in ms, x_l, y_l, pupil_l, x_r, ... depending on the recording
+    fixations: dict # FIXATION_COLUMNS -> array. eye is 0 for left and 1 for right
+    saccades: dict # SACCADE_COLUMNS -> array
+    blinks: dict # BLINK_COLUMNS -> array
+    messages: dict # "time" -> array, "text" -> array of str
+    trials: dict # "start", "end" -> array of tracker times, "label", "timestamp" -> array of str
+
+
+def sample_columns(samples_line:str) -> list:
+    """Returns the sample column names for a `SAMPLES ...` line of an asc file."""
+    tokens = samples_line.split()
+    eyes = [e[0].lower() for e in ["LEFT", "RIGHT"] if e in tokens]
+
+    columns = ["time"]
+    for e in eyes:
+        columns += [f"x_{e}", f"y_{e}", f"pupil_{e}"]
+    if "VEL" in tokens:
+        for e in eyes:
+            columns += [f"xv_{e}", f"yv_{e}"]
+    if "RES" in tokens:
+        columns += ["xres", "yres"]
+    if "INPUT" in tokens:
+        columns += ["input"]
+    return columns
+
+
+def parse_samples(block:bytes, columns:list) -> dict:
+    """Parses the sample lines of a block of asc text. All other lines are ignored.
+    Args:
+        block (bytes): Complete lines of an asc file.
+        columns (list): Column names, see sample_columns.
+    Returns:
+        dict: Column name -> array.
+    """
+    buf = np.frombuffer(block, dtype=np.uint8)
+    starts, ends = _lines(buf)
+    is_sample = _is_sample(buf, starts)
+    return _parse_sample_text(buf[_line_mask(is_sample, starts, ends)].tobytes(), int(is_sample.sum()), columns)
+
+
+def _lines(buf:np.ndarray) -> tuple:
+    """Returns the (start, end) offsets of all lines of a byte array. The end (exclusive) includes the newline."""
+    ends = np.flatnonzero(buf == ord("\n")) + 1
+    if buf.size and buf[-1] != ord("\n"):
+        ends = np.append(ends, buf.size)
+    starts = np.concatenate([[0], ends[:-1]]).astype(np.int64)
+    return starts, ends
+
+
+def _is_sample(buf:np.ndarray, starts:np.ndarray) -> np.ndarray:
+    # sample lines start with the time stamp, all other lines with a keyword
+    first = buf[starts]
+    return (first >= ord("0")) & (first <= ord("9"))
+
+
+def _starts_with(buf:np.ndarray, starts:np.ndarray, prefix:bytes) -> np.ndarray:
+    candidates = np.flatnonzero(buf[starts] == prefix[0])
+    head = buf[np.minimum(starts[candidates, None] + np.arange(len(prefix)), buf.size - 1)]
+    out = np.zeros(starts.size, dtype=bool)
+    out[candidates] = (head == np.frombuffer(prefix, dtype=np.uint8)).all(axis=1)
+    return out
+
+
+def _line_mask(lines:np.ndarray, starts:np.ndarray, ends:np.ndarray) -> np.ndarray:
+    """Byte mask of the selected lines."""
+    return np.repeat(lines, ends - starts)
+
+
+def _parse_sample_text(text:bytes, n_lines:int, columns:list) -> dict:
+    n = len(columns)
+    text = text.replace(b"\r", b"")
+
+    # fast path: drop the usual flags and mark missing values with plain replacements
+    fast = text.replace(b"\t.....", b"").replace(b"\t...", b"")
+    for a, b in [(b" .\t", b" nan\t"), (b" .\n", b" nan\n"), (b"\t.\t", b"\tnan\t"), (b"\t.\n", b"\tnan\n")]:
+        fast = fast.replace(a, b)
+    if fast.endswith(b" .") or fast.endswith(b"\t."):
+        fast = fast[:-1] + b"nan"
+    values = _fromstring(fast)
+
+    if (values is None) or (values.size != n_lines * n):
+        # other flags or additional columns: keep the first n fields of every line
+        text = re.sub(rb"^(\S+(?:[ \t]+\S+){%d})[^\n]*" % (n - 1), rb"\1", text, flags=re.M)
+        text = _MISSING.sub(b"nan", text)
+        values = _fromstring(text)
+        if (values is None) or (values.size != n_lines * n):
+            # some lines are shorter than expected, parse them one by one
+            rows = [line.split() for line in text.decode("ascii").splitlines()]
+            values = np.array([r + ["nan"] * (n - len(r)) for r in rows if r], dtype=np.float64)
+    values = values.reshape(-1, n)
+
+    return {c: values[:, i].astype(np.float64 if c == "time" else np.float32) for i, c in enumerate(columns)}
+
+
+def _fromstring(text:bytes) -> np.ndarray:
+    """Parses whitespace separated numbers. Returns None if the text contains anything else."""
+    if not text.strip():
+        return np.empty(0, dtype=np.float64)
+    try:
+        with warnings.catch_warnings():
+            # older numpy versions only warn and stop parsing at the first invalid token
+            warnings.simplefilter("error", DeprecationWarning)
+            return np.fromstring(text, dtype=np.float64, sep=" ")
+    except (ValueError, DeprecationWarning):
+        return None
+
+
+def _parse_events(pattern, block:bytes, n:int) -> np.ndarray:
+    rows = pattern.findall(block)
+    if not rows:
+        return np.empty((0, n), dtype=np.float64)
+    arr = np.array(rows, dtype="S32")
+    arr[arr == b"."] = b"nan"
+    arr[:, 0] = np.where(arr[:, 0] == b"L", b"0", b"1")
+    return arr.astype(np.float64)
+
+
+def _chunks(mm, chunk_size:int):
+    """Yields blocks of complete lines of about chunk_size bytes."""
+    pos = 0
+    size = len(mm)
+    while pos < size:
+        end = min(pos + chunk_size, size)
+        if end < size:
+            nl = mm.rfind(b"\n", pos, end)
+            end = nl + 1 if nl >= 0 else size
+        yield mm[pos:end]
+        pos = end
+
+
+def read_asc(path:str, chunk_size:int=16 * 2**20) -> AscData:
+    """Parses an asc file (edf2asc output) chunk by chunk.
+    Memory use is bounded by the chunk size plus the parsed output.
+    Args:
+        path (str): Path of the asc file.
+        chunk_size (int, optional): Bytes parsed at once. Defaults to 16 MiB.
+    Returns:
+        AscData: Samples, events, messages and the trials recorded by EyeConnector.startRecording/stopRecording.
+    """
+    sample_parts = []
+    fix_parts, sacc_parts, blink_parts = [], [], []
+    msg_times, msg_texts = [], []
+    columns = ["time", "x_l", "y_l", "pupil_l"]
+    all_columns = []
+
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            mm = b""
+        else:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        for chunk in _chunks(mm, chunk_size):
+            # classify all lines of the chunk by their first byte
+            buf = np.frombuffer(chunk, dtype=np.uint8)
+            starts, ends = _lines(buf)
+            is_sample = _is_sample(buf, starts)
+            sample_text = buf[_line_mask(is_sample, starts, ends)].tobytes()
+            other = buf[_line_mask(~is_sample, starts, ends)].tobytes()
+
+            # the sample columns change with every SAMPLES line: parse the samples between two of them at once
+            headers = np.flatnonzero(_starts_with(buf, starts, b"SAMPLES"))
+            header_columns = [columns]
+            for i in headers.tolist():
+                header_columns.append(sample_columns(chunk[starts[i]:ends[i]].decode("ascii")))
+                all_columns += [c for c in header_columns[-1] if c not in all_columns]
+            sample_lines = np.flatnonzero(is_sample)
+            counts = np.bincount(np.searchsorted(headers, sample_lines), minlength=headers.size + 1)
+            offsets = np.concatenate([[0], np.cumsum(ends[sample_lines] - starts[sample_lines])])
+            # recordings usually repeat the same columns in every block, which are then parsed in one pass
+            blocks = []
+            for count, cols in zip(counts.tolist(), header_columns):
+                if blocks and (blocks[-1][1] == cols):
+                    blocks[-1][0] += count
+                else:
+                    blocks.append([count, cols])
+            first = 0
+            for count, cols in blocks:
+                if count:
+                    text = sample_text[offsets[first]:offsets[first + count]]
+                    sample_parts.append(_parse_sample_text(text, count, cols))
+                first += count
+            columns = header_columns[-1]
+
+            fix_parts.append(_parse_events(_EFIX, other, len(FIXATION_COLUMNS)))
+            sacc_parts.append(_parse_events(_ESACC, other, len(SACCADE_COLUMNS)))
+            blink_parts.append(_parse_events(_EBLINK, other, len(BLINK_COLUMNS)))
+
+            for t, text in _MSG.findall(other):
+                msg_times.append(float(t))
+                msg_texts.append(text.decode("utf-8", errors="replace").strip())
+
+        if isinstance(mm, mmap.mmap):
+            mm.close()
+
+    # concatenate the parts, columns missing in a part are filled with nan
+    all_columns = all_columns or columns
+    samples = {}
+    for c in all_columns:
+        dtype = np.float64 if c == "time" else np.float32
+        samples[c] = np.concatenate([p[c] if c in p else np.full(p["time"].size, np.nan, dtype=dtype)
+                                     for p in sample_parts]) if sample_parts else np.empty(0, dtype=dtype)
+
+    messages = {"time": np.array(msg_times, dtype=np.float64), "text": np.array(msg_texts, dtype=object)}
+
+    return AscData(
+        samples=samples,
+        fixations=_event_columns(fix_parts, FIXATION_COLUMNS),
+        saccades=_event_columns(sacc_parts, SACCADE_COLUMNS),
+        blinks=_event_columns(blink_parts, BLINK_COLUMNS),
+        messages=messages,
+        trials=trial_table(messages["time"], messages["text"]),
+    )
+
+
+def _event_columns(parts:list, columns:list) -> dict:
+    arr = np.concatenate(parts) if parts else np.empty((0, len(columns)))
+    out = {c: arr[:, i] for i, c in enumerate(columns)}
+    out["eye"] = out["eye"].astype(np.uint8)
+    return out
+
+
+def trial_table(times:np.ndarray, texts) -> dict:
+    """Finds the trials recorded by EyeConnector.startRecording/stopRecording in the messages.
+    Args:
+        times (np.ndarray): Message times.
+        texts: Message texts.
+    Returns:
+        dict: "start", "end" (tracker time of the START/END OF TRIAL messages, nan if missing),
+            "label" (message passed to startRecording) and "timestamp" (local time of the start).
+    """
+    start, end, label, timestamp = [], [], [], []
+    open_trial = None
+    for t, text in zip(times, texts):
+        m = _TRIAL.match(text)
+        if m is None:
+            continue
+        if m.group(2) == "START":
+            if open_trial is not None:
+                end.append(np.nan)
+            start.append(t)
+            label.append(m.group(3))
+            timestamp.append(m.group(1))
+            open_trial = len(start) - 1
+        elif open_trial is not None:
+            end.append(t)
+            open_trial = None
+    if open_trial is not None:
+        end.append(np.nan)
+
+    return {"start": np.array(start, dtype=np.float64), "end": np.array(end, dtype=np.float64),
+            "label": np.array(label, dtype=object), "timestamp": np.array(timestamp, dtype=object)}
@@ -0,0 +1,178 @@
+import pylink
+import numpy as np
+import hashlib
+import os
+import shutil
+import tempfile
+from collections import OrderedDict
+
+
+def to_rgb_array(image) -> np.ndarray:
+    """Converts an image to an (height, width, 3) uint8 array with the top row first.
+    Args:
+        image: numpy array (height, width[, 3|4]), pygame Surface, pyglet image or PIL image
+            (e.g. a psychopy screenshot from Window.getMovieFrame()).
+    Returns:
+        np.ndarray: RGB pixels.
+    """
+    if type(image).__module__.startswith("pygame"):
+        import pygame
+        # surfarray is indexed [x, y]
+        arr = pygame.surfarray.array3d(image).swapaxes(0, 1)
+    elif hasattr(image, "get_image_data"):
+        # pyglet images are stored bottom-up, a negative pitch returns the rows top-down
+        data = image.get_image_data()
+        arr = np.frombuffer(data.get_data("RGB", -data.width * 3), dtype=np.uint8).reshape(data.height, data.width, 3)
+    else:
+        # numpy arrays and PIL images
+        arr = np.asarray(image)
+
+    if arr.ndim == 2:
+        arr = np.repeat(arr[:, :, None], 3, axis=2)
+    arr = arr[:, :, :3]
+    if arr.dtype != np.uint8:
+        # float images in [0, 1]
+        arr = (np.clip(arr, 0., 1.) * 255 + 0.5).astype(np.uint8)
+    return arr
+
+
+def downscale(arr:np.ndarray, factor:int) -> np.ndarray:
+    """Downscales an (height, width, 3) array by averaging factor x factor blocks."""
+    if factor <= 1:
+        return arr
+    h, w = arr.shape[0] // factor, arr.shape[1] // factor
+    blocks = arr[:h * factor, :w * factor].reshape(h, factor, w, factor, 3)
+    return blocks.mean(axis=(1, 3), dtype=np.float32).round().astype(np.uint8)
+
+
+def write_bmp(path:str, arr:np.ndarray) -> None:
+    """Writes an (height, width, 3) uint8 RGB array as uncompressed 24 bit BMP file."""
+    h, w = arr.shape[:2]
+    stride = (w * 3 + 3) // 4 * 4
+    # BMP rows are BGR, bottom-up and padded to 4 bytes
+    rows = np.zeros((h, stride), dtype=np.uint8)
+    rows[:, :w * 3] = arr[::-1, :, ::-1].reshape(h, w * 3)
+    header = np.zeros(1, dtype=[("type", "<u2"), ("size", "<u4"), ("reserved", "<u4"), ("offset", "<u4"),
+                                ("header_size", "<u4"), ("width", "<i4"), ("height", "<i4"), ("planes", "<u2"),
+                                ("bits", "<u2"), ("compression", "<u4"), ("image_size", "<u4"),
+                                ("xppm", "<i4"), ("yppm", "<i4"), ("colors", "<u4"), ("important", "<u4")])
+    header[0] = (0x4D42, 54 + rows.nbytes, 0, 54, 40, w, h, 1, 24, 0, rows.nbytes, 2835, 2835, 0, 0)
+    with open(path, "wb") as f:
+        f.write(header.tobytes())
+        f.write(rows.tobytes())
+
+
+class BackdropManager():
+    def __init__(self, eyelink, max_size:tuple|None=None, cache_size:int=16,
+                 transfer_options:int=pylink.BX_MAXCONTRAST) -> None:
+        """Sends backdrop images and feedback boxes to the Host PC and skips transfers of what the host already shows.
+        Converted images are cached by content hash as BMP files, which pylink transfers without building
+        per-pixel Python objects. Re-showing a backdrop of an earlier trial does not convert it again.
+
+        Args:
+            eyelink (pylink.EyeLink): Connected tracker.
+            max_size (tuple|None, optional): (width, height) the image is downscaled to fit by an integer factor.
+                The host draws the bitmap as sent, so a downscaled backdrop is shown smaller. Defaults to None, i.e. full size.
+            cache_size (int, optional): Number of converted images to keep. Defaults to 16.
+            transfer_options (int, optional): pylink BX_* transfer options. Defaults to pylink.BX_MAXCONTRAST.
+        """
+        self.eyelink = eyelink
+        self.max_size = max_size
+        self.cache_size = cache_size
+        self.transfer_options = transfer_options
+
+        self._cache = OrderedDict() # content hash -> (width, height, bmp file)
+        self._directory = None
+        self._shown_image = None # (hash, pos) of the backdrop on the host
+        self._shown_backdrop = None # (width, height, bmp file, pos) to redraw under new boxes
+        self._shown_boxes = None
+
+    def invalidate(self) -> None:
+        """Forget what the host shows, e.g. after the host screen was changed by the setup."""
+        self._shown_image = None
+        self._shown_backdrop = None
+        self._shown_boxes = None
+
+    def close(self) -> None:
+        """Deletes the converted images."""
+        if self._directory is not None:
+            shutil.rmtree(self._directory, ignore_errors=True)
+        self._directory = None
+        self._cache.clear()
+
+    def clear(self, color:int=0) -> None:
+        """Clears the host screen."""
+        self.eyelink.sendCommand(f"clear_screen {color}")
+        self.invalidate()
+
+    def show(self, image, pos:tuple=(0, 0)) -> bool:
+        """Shows an image as backdrop on the Host PC, unless it is shown already.
+        Args:
+            image: numpy array, pygame Surface, pyglet image or PIL image. See to_rgb_array.
+            pos (tuple, optional): Position of the image's top left corner in host pixels, measured from the top left
+                of the host display regardless of the window's coordinate system. Defaults to (0, 0).
+        Returns:
+            bool: True if the image was transferred.
+        """
+        arr = np.ascontiguousarray(to_rgb_array(image))
+        key = hashlib.blake2b(arr, digest_size=16).hexdigest() + str(arr.shape)
+
+        if self._shown_image == (key, tuple(pos)):
+            return False
+
+        if key in self._cache:
+            self._cache.move_to_end(key)
+        else:
+            self._cache[key] = self._convert(arr)
+            if len(self._cache) > self.cache_size:
+                _, (_, _, evicted) = self._cache.popitem(last=False)
+                # the shown backdrop may still be needed to redraw under new boxes
+                if (self._shown_backdrop is None) or (evicted != self._shown_backdrop[2]):
+                    os.remove(evicted)
+
+        w, h, path = self._cache[key]
+        if (self._shown_backdrop is not None) and (self._shown_backdrop[2] not in [c[2] for c in self._cache.values()]):
+            os.remove(self._shown_backdrop[2])
+        self._shown_backdrop = (w, h, path, (int(pos[0]), int(pos[1])))
+        self._transfer()
+        self._shown_image = (key, tuple(pos))
+        # the new backdrop replaces the boxes
+        self._shown_boxes = None
+        return True
+
+    def draw_boxes(self, boxes:list, color:int=15) -> bool:
+        """Draws feedback boxes on the Host PC, unless the same boxes are shown already.
+        Args:
+            boxes (list): (left, top, right, bottom) in tracker coordinates, e.g. InterestAreas.
+            color (int, optional): Host color index. Defaults to 15 (white).
+        Returns:
+            bool: True if the boxes were sent.
+        """
+        key = (tuple(tuple(round(v) for v in b[:4]) for b in boxes), color)
+        if self._shown_boxes == key:
+            return False
+        if self._shown_boxes is not None:
+            # boxes are drawn over the host screen, remove the old ones
+            if self._shown_backdrop is not None:
+                self._transfer()
+            else:
+                self.eyelink.sendCommand("clear_screen 0")
+        for left, top, right, bottom in key[0]:
+            self.eyelink.sendCommand(f"draw_box {left} {top} {right} {bottom} {color}")
+        self._shown_boxes = key
+        return True
+
+    def _transfer(self) -> None:
+        w, h, path, (x, y) = self._shown_backdrop
+        self.eyelink.imageBackdrop(path, 0, 0, w, h, x, y, self.transfer_options)
+
+    def _convert(self, arr:np.ndarray) -> tuple:
+        if self.max_size is not None:
+            factor = int(np.ceil(max(arr.shape[1] / self.max_size[0], arr.shape[0] / self.max_size[1])))
+            arr = downscale(arr, factor)
+        if self._directory is None:
+            self._directory = tempfile.mkdtemp(prefix="pyelink_backdrop_")
+        fd, path = tempfile.mkstemp(suffix=".bmp", dir=self._directory)
+        os.close(fd)
+        write_bmp(path, arr)
+        return arr.shape[1], arr.shape[0], path
@@ -0,0 +1,148 @@
+import hashlib
+import shutil
+import json
+import os
+import time
+
+from .asc import read_asc, PARSER_VERSION
+from .session import Session, save_session, SESSION_VERSION, SESSION_SUFFIX
+
+CACHE_DIRECTORY = ".pyelink_cache"
+INDEX_FILE = "index.json"
+
+
+def file_hash(path:str, block_size:int=2**20) -> str:
+    """Returns the blake2b hash of a file's content."""
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        while block := f.read(block_size):
+            h.update(block)
+    return h.hexdigest()
+
+
+def directory_size(path:str) -> int:
+    return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files)
+
+
+class ConversionCache():
+    def __init__(self, directory:str="./eye_tracking/" + CACHE_DIRECTORY, max_bytes:int|None=4 * 2**30) -> None:
+        """Caches converted edf/asc files as sessions, keyed by the content hash of the source file
+        and the parser and session versions. A cached file is opened memory-mapped instead of parsed again.
+        Entries of changed files or older versions are no longer used and are evicted first.
+
+        Args:
+            directory (str, optional): Cache directory. Defaults to "./eye_tracking/.pyelink_cache",
+                i.e. next to the files in EyeConnector's default download_directory.
+            max_bytes (int|None, optional): Size limit. The least recently used entries are removed when it is exceeded.
+                Defaults to 4 GiB. None disables eviction.
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._version = f"p{PARSER_VERSION}s{SESSION_VERSION}"
+        os.makedirs(directory, exist_ok=True)
+
+    ### KEYS
+    def key(self, path:str) -> str:
+        """Returns the cache key of a source file. The content is only hashed again if size or mtime changed."""
+        st = os.stat(path)
+        stat = [st.st_size, st.st_mtime_ns]
+        index = self._read_index()
+        entry = index.get(os.path.abspath(path))
+        if (entry is not None) and (entry["stat"] == stat):
+            digest = entry["hash"]
+        else:
+            digest = file_hash(path)
+            index[os.path.abspath(path)] = {"stat": stat, "hash": digest}
+            self._write_index(index)
+        return f"{self._version}-{digest}"
+
+    def entry_path(self, key:str) -> str:
+        return os.path.join(self.directory, key + SESSION_SUFFIX)
+
+    ### LOADING
+    def load(self, path:str, chunk_size:int=16 * 2**20, edf2asc:str="edf2asc") -> Session:
+        """Returns the session of an edf or asc file. Converts and caches it if it is not cached yet.
+        Args:
+            path (str): edf or asc file.
+            chunk_size (int, optional): Bytes of the asc file parsed at once. Defaults to 16 MiB.
+            edf2asc (str, optional): edf2asc executable used for edf files. Defaults to "edf2asc".
+        """
+        key = self.key(path)
+        out = self.entry_path(key)
+        if os.path.exists(os.path.join(out, "meta.json")):
+            # the modification time of the entry is its last use
+            os.utime(out)
+            return Session(out)
+
+        if path.lower().endswith(".edf"):
+            from .convert import edf_to_asc
+            asc = edf_to_asc(path, edf2asc)
+        else:
+            asc = path
+
+        # write to a temporary directory, so concurrent loads never see a partial entry
+        tmp = f"{out}.{os.getpid()}.tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        save_session(read_asc(asc, chunk_size), tmp, source=os.path.basename(path))
+        try:
+            os.rename(tmp, out)
+        except OSError:
+            # another process cached the same file meanwhile
+            shutil.rmtree(tmp, ignore_errors=True)
+
+        self.evict(keep=key)
+        return Session(out)
+
+    def __contains__(self, path:str) -> bool:
+        return os.path.exists(os.path.join(self.entry_path(self.key(path)), "meta.json"))
+
+    ### EVICTION
+    def entries(self) -> list:
+        """Returns (last use, size in bytes, key) of all entries, least recently used first."""
+        entries = []
+        for name in os.listdir(self.directory):
+            p = os.path.join(self.directory, name)
+            if name.endswith(SESSION_SUFFIX) and os.path.isdir(p):
+                entries.append((os.path.getmtime(p), directory_size(p), name[:-len(SESSION_SUFFIX)]))
+        return sorted(entries)
+
+    def evict(self, keep:str|None=None) -> int:
+        """Removes entries of other versions and the least recently used entries above max_bytes.
+        Args:
+            keep (str|None, optional): Key that is never removed. Defaults to None.
+        Returns:
+            int: Number of removed entries.
+        """
+        entries = self.entries()
+        # stale versions first, then by last use
+        entries.sort(key=lambda e: (e[2].startswith(self._version), e[0]))
+        total = sum(e[1] for e in entries)
+
+        removed = 0
+        for _, size, key in entries:
+            stale = not key.startswith(self._version)
+            if (key == keep) or not (stale or ((self.max_bytes is not None) and (total > self.max_bytes))):
+                continue
+            shutil.rmtree(self.entry_path(key), ignore_errors=True)
+            total -= size
+            removed += 1
+        return removed
+
+    def clear(self) -> None:
+        shutil.rmtree(self.directory, ignore_errors=True)
+        os.makedirs(self.directory, exist_ok=True)
+
+    ### INDEX
+    def _read_index(self) -> dict:
+        try:
+            with open(os.path.join(self.directory, INDEX_FILE)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_index(self, index:dict) -> None:
+        # replace atomically, a lost concurrent update only costs hashing the file again
+        tmp = os.path.join(self.directory, f"{INDEX_FILE}.{os.getpid()}.{time.monotonic_ns()}")
+        with open(tmp, "w") as f:
+            json.dump(index, f)
+        os.replace(tmp, os.path.join(self.directory, INDEX_FILE))
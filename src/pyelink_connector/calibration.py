@@ -0,0 +1,83 @@
+from typing import NamedTuple
+
+
+class CalibrationStage(NamedTuple):
+    calibration_type: str # e.g. "HV5", "HV9", "HV13"
+    calibration_area: tuple = (0.5, 0.5) # proportion of the screen (width, height) covered by the targets
+    validation_area: tuple = (0.5, 0.5)
+
+
+class CalibrationPolicy():
+    def __init__(self, stages:list|None=None, max_avg_error:float|None=None, max_max_error:float|None=None) -> None:
+        """Calibration type and screen area of the setup. Starts with the first stage and moves to the next one
+        when the operator calibrates again after a validation failed the thresholds (C on the validation result),
+        e.g. a quick HV5 calibration that only escalates to HV9 and HV13 when needed.
+        The default is a single HV9 stage on half of the screen.
+
+            eyeConnector.setup.calibration_policy = adaptive_policy(max_avg_error=.5, max_max_error=1.)
+
+        Args:
+            stages (list|None, optional): CalibrationStages or (type, calibration area, validation area) tuples.
+                Defaults to None, i.e. [CalibrationStage("HV9")].
+            max_avg_error (float|None, optional): Maximum average validation error in degrees. Defaults to None, i.e. no limit.
+            max_max_error (float|None, optional): Maximum validation error of any point in degrees. Defaults to None, i.e. no limit.
+        """
+        stages = stages if stages is not None else [CalibrationStage("HV9")]
+        self.stages = [CalibrationStage(*s) for s in stages]
+        self.max_avg_error = max_avg_error
+        self.max_max_error = max_max_error
+        self.stage_index = 0
+
+    @property
+    def stage(self) -> CalibrationStage:
+        return self.stages[self.stage_index]
+
+    def reset(self) -> None:
+        """Starts again with the first stage, e.g. for the next participant."""
+        self.stage_index = 0
+
+    def configure(self, eyelink) -> None:
+        """Sends the calibration type and areas of the current stage to the tracker."""
+        stage = self.stage
+        eyelink.setCalibrationType(stage.calibration_type)
+        eyelink.sendCommand(f"calibration_area_proportion = {stage.calibration_area[0]} {stage.calibration_area[1]}")
+        eyelink.sendCommand(f"validation_area_proportion = {stage.validation_area[0]} {stage.validation_area[1]}")
+
+    def passed(self, error:tuple|None) -> bool:
+        """True if a validation error (avg, max) in degrees is within the thresholds. Unknown errors pass."""
+        if error is None:
+            return True
+        if (self.max_avg_error is not None) and (error[0] > self.max_avg_error):
+            return False
+        if (self.max_max_error is not None) and (error[1] > self.max_max_error):
+            return False
+        return True
+
+    def next_stage(self, error:tuple|None) -> CalibrationStage|None:
+        """Returns the stage escalate would move to for a validation error, None if it keeps the current one."""
+        if self.passed(error) or (self.stage_index + 1 >= len(self.stages)):
+            return None
+        return self.stages[self.stage_index + 1]
+
+    def escalate(self, error:tuple|None) -> bool:
+        """Moves to the next stage if the validation error failed the thresholds.
+        Returns:
+            bool: True if the next calibration uses a new stage.
+        """
+        if self.next_stage(error) is None:
+            return False
+        self.stage_index += 1
+        return True
+
+
+def adaptive_policy(max_avg_error:float=.5, max_max_error:float=1., area:tuple=(0.5, 0.5),
+                    wide_area:tuple=(0.88, 0.83)) -> CalibrationPolicy:
+    """Returns a policy starting with HV5 that escalates to HV9 and HV13 when a validation fails the thresholds.
+    Args:
+        max_avg_error (float, optional): Maximum average validation error in degrees. Defaults to .5.
+        max_max_error (float, optional): Maximum validation error of any point in degrees. Defaults to 1.
+        area (tuple, optional): Screen proportion of HV5 and HV9. Defaults to (0.5, 0.5).
+        wide_area (tuple, optional): Screen proportion of HV13. Defaults to (0.88, 0.83), the tracker's default.
+    """
+    return CalibrationPolicy([("HV5", area, area), ("HV9", area, area), ("HV13", wide_area, wide_area)],
+                             max_avg_error, max_max_error)
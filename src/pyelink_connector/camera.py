@@ -0,0 +1,151 @@
+import pylink
+import numpy as np
+
+from .utils import *
+
+# key names (e.g. pygame.key.name, psychopy key names, lowercase pyglet symbol strings) -> pylink key codes
+PYLINK_KEYS = {
+    "enter": ENTER_KEY, "return": ENTER_KEY, "escape": ESC_KEY, "space": SPACE_KEY, "tab": TAB_KEY,
+    "backspace": BACKSPACE_KEY, "delete": DELETE_KEY,
+    "up": pylink.CURS_UP, "down": pylink.CURS_DOWN, "left": pylink.CURS_LEFT, "right": pylink.CURS_RIGHT,
+    "pageup": pylink.PAGE_UP, "pagedown": pylink.PAGE_DOWN,
+    "plus": ord("+"), "equal": ord("="), "minus": ord("-"),
+}
+
+
+def pylink_key(name:str) -> int|None:
+    """Returns the pylink key code of a key name, or None for keys the tracker does not use."""
+    name = name.lower()
+    if name in PYLINK_KEYS:
+        return PYLINK_KEYS[name]
+    if len(name) == 1:
+        return ord(name)
+    return None
+
+
+class CameraImage():
+    def __init__(self, width:int=384, height:int=320) -> None:
+        """Assembles the camera image lines sent by the tracker into a preallocated RGB frame."""
+        self.frame = 0 # number of completed frames
+        self.palette = np.zeros((256, 3), dtype=np.uint8)
+        self.resize(width, height)
+
+    def resize(self, width:int, height:int) -> None:
+        self.width = width
+        self.height = height
+        self._indices = np.zeros((height, width), dtype=np.uint8)
+        self.rgb = np.zeros((height, width, 3), dtype=np.uint8) # last complete frame, top row first
+
+    def set_palette(self, r, g, b) -> None:
+        n = len(r)
+        self.palette[:n] = np.stack([np.asarray(r), np.asarray(g), np.asarray(b)], axis=1)
+
+    def add_line(self, width:int, line:int, totlines:int, buff) -> bool:
+        """Stores one line of palette indices (line counts from 1). Returns True when the frame is complete."""
+        if (totlines != self.height) or (width > self.width):
+            self.resize(max(width, self.width), totlines)
+        if isinstance(buff, (bytes, bytearray, memoryview)):
+            row = np.frombuffer(buff, dtype=np.uint8, count=width)
+        else:
+            row = np.asarray(buff[:width], dtype=np.uint8)
+        self._indices[line - 1, :width] = row
+
+        if line < totlines:
+            return False
+        # one lookup for the whole frame instead of one per pixel
+        np.take(self.palette, self._indices, axis=0, out=self.rgb)
+        self.frame += 1
+        return True
+
+
+class CameraDisplay(pylink.EyeLinkCustomDisplay):
+    def __init__(self) -> None:
+        """pylink custom display showing the eye camera image during pylink's tracker setup (EyeLink.doTrackerSetup).
+        Backends implement poll() and render(). render() is only called if the image or target changed,
+        so rendering does not slow down receiving the camera lines.
+        """
+        pylink.EyeLinkCustomDisplay.__init__(self)
+        self.image = CameraImage()
+        self.image_shown = False
+        self.title = ""
+        self.target = None # (x, y) of the calibration target in tracker coordinates
+
+        self._keys = []
+        self._rendered = None
+
+    ### BACKEND
+    def poll(self) -> list:
+        """Returns the key names pressed since the last call."""
+        raise NotImplementedError()
+
+    def render(self) -> None:
+        """Draws self.image.rgb (if self.image_shown) or the target and updates the window."""
+        raise NotImplementedError()
+
+    def _render_if_changed(self) -> None:
+        state = (self.image.frame if self.image_shown else -1, self.target, self.title)
+        if state != self._rendered:
+            self._rendered = state
+            self.render()
+
+    ### PROTOCOL
+    def setup_cal_display(self):
+        self.target = None
+        # show the camera image right away
+        self._keys = [ENTER_KEY]
+        self._rendered = None
+
+    def exit_cal_display(self):
+        self.target = None
+
+    def record_abort_hide(self):
+        pass
+
+    def clear_cal_display(self):
+        self.target = None
+
+    def erase_cal_target(self):
+        self.target = None
+
+    def draw_cal_target(self, x, y):
+        self.target = (x, y)
+
+    def play_beep(self, beepid):
+        pass
+
+    def get_input_key(self):
+        keys = self._keys + [k for k in map(pylink_key, self.poll()) if k is not None]
+        self._keys = []
+        self._render_if_changed()
+        return [pylink.KeyInput(k, 0) for k in keys] if keys else None
+
+    def get_mouse_state(self):
+        return ((0, 0), 0)
+
+    def alert_printf(self, msg):
+        print(f"WARNING (EyeLinkConnector): {msg}")
+
+    def setup_image_display(self, width, height):
+        self.image.resize(width, height)
+        self.image_shown = True
+        return 1
+
+    def image_title(self, text):
+        self.title = text
+
+    def draw_image_line(self, width, line, totlines, buff):
+        if self.image.add_line(width, line, totlines, buff):
+            self._render_if_changed()
+
+    def set_image_palette(self, r, g, b):
+        self.image.set_palette(r, g, b)
+
+    def exit_image_display(self):
+        self.image_shown = False
+
+    def draw_line(self, x1, y1, x2, y2, colorindex):
+        # crosshairs are drawn on the Host PC
+        pass
+
+    def draw_lozenge(self, x, y, width, height, colorindex):
+        pass
@@ -0,0 +1,111 @@
+import argparse
+import subprocess
+import time
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from .asc import read_asc
+from .session import save_session, session_path
+from .cache import ConversionCache
+
+
+def edf_to_asc(path:str, edf2asc:str="edf2asc") -> str:
+    """Converts an edf file with SR Research's edf2asc. The asc file is written next to the edf file.
+    Returns:
+        str: Path of the asc file.
+    """
+    result = subprocess.run([edf2asc, "-y", path], capture_output=True, text=True)
+    asc = os.path.splitext(path)[0] + ".asc"
+    if not os.path.exists(asc):
+        raise RuntimeError(f"{edf2asc} failed with exit code {result.returncode}: {result.stdout.strip()[-500:]}")
+    return asc
+
+
+def convert_file(path:str, output_directory:str|None=None, chunk_size:int=16 * 2**20, edf2asc:str="edf2asc",
+                 cache_directory:str|None=None) -> tuple:
+    """Converts an edf or asc file into a session, see session.save_session.
+    Args:
+        path (str): edf or asc file.
+        output_directory (str|None, optional): Directory for the session. Defaults to None, i.e. next to the file.
+        chunk_size (int, optional): Bytes of the asc file parsed at once. Defaults to 16 MiB.
+        edf2asc (str, optional): edf2asc executable. Defaults to "edf2asc".
+        cache_directory (str|None, optional): Store the session in a cache.ConversionCache instead of output_directory.
+            Files that are cached already are skipped. Defaults to None.
+    Returns:
+        tuple: (path, size of the source file in bytes, seconds, session directory)
+    """
+    t0 = time.perf_counter()
+    if cache_directory is not None:
+        # eviction is done once by the main process
+        session = ConversionCache(cache_directory, max_bytes=None).load(path, chunk_size, edf2asc)
+        return path, os.path.getsize(path), time.perf_counter() - t0, session.path
+
+    asc = edf_to_asc(path, edf2asc) if path.lower().endswith(".edf") else path
+    out = session_path(output_directory if output_directory is not None else os.path.dirname(path), path)
+    save_session(read_asc(asc, chunk_size), out, source=os.path.basename(path))
+    return path, os.path.getsize(path), time.perf_counter() - t0, out
+
+
+def find_files(paths:list) -> list:
+    """Returns the edf and asc files in the given files and directories. If both exist, the asc file is used."""
+    files = []
+    for p in paths:
+        if os.path.isdir(p):
+            files += sorted(os.path.join(p, f) for f in os.listdir(p) if f.lower().endswith((".edf", ".asc")))
+        else:
+            files.append(p)
+
+    stems = {os.path.splitext(f)[0] for f in files if f.lower().endswith(".asc")}
+    return [f for f in files if not (f.lower().endswith(".edf") and os.path.splitext(f)[0] in stems)]
+
+
+def main(argv:list|None=None) -> int:
+    parser = argparse.ArgumentParser(prog="pyelink-convert",
+                                     description="Convert EyeLink edf/asc files into memory-mapped sessions in parallel.")
+    parser.add_argument("paths", nargs="*", default=["./eye_tracking/"],
+                        help="edf/asc files or directories containing them. Defaults to ./eye_tracking/")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="number of worker processes")
+    parser.add_argument("-o", "--output", default=None, help="directory for the sessions. Defaults to next to each file")
+    parser.add_argument("--chunk-size", type=int, default=16, help="MiB of asc text parsed at once per worker")
+    parser.add_argument("--edf2asc", default="edf2asc", help="path of SR Research's edf2asc executable")
+    parser.add_argument("--cache", default=None, metavar="DIR",
+                        help="store the sessions in a conversion cache, e.g. ./eye_tracking/.pyelink_cache")
+    parser.add_argument("--cache-size", type=float, default=4, help="GiB the cache may use")
+    args = parser.parse_args(argv)
+
+    files = find_files(args.paths)
+    if not files:
+        print("pyelink-convert: no edf or asc files found.")
+        return 0
+
+    t0 = time.perf_counter()
+    total_bytes = 0
+    failed = []
+    with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        futures = {pool.submit(convert_file, f, args.output, args.chunk_size * 2**20, args.edf2asc, args.cache): f for f in files}
+        for i, future in enumerate(as_completed(futures), start=1):
+            f = futures[future]
+            try:
+                _, size, seconds, out = future.result()
+            except Exception as e:
+                failed.append(f)
+                print(f"[{i}/{len(files)}] ERROR {f}: {e}", file=sys.stderr)
+                continue
+
+            total_bytes += size
+            elapsed = time.perf_counter() - t0
+            print(f"[{i}/{len(files)}] {f} -> {out} ({size / 1e6:.1f} MB in {seconds:.1f} s) "
+                  f"| total {total_bytes / 1e6:.1f} MB at {total_bytes / 1e6 / elapsed:.1f} MB/s")
+
+    if args.cache is not None:
+        ConversionCache(args.cache, max_bytes=int(args.cache_size * 2**30)).evict()
+
+    print(f"pyelink-convert: converted {len(files) - len(failed)}/{len(files)} files in {time.perf_counter() - t0:.1f} s.")
+    for f in failed:
+        print(f"\tfailed: {f}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
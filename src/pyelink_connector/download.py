@@ -0,0 +1,188 @@
+import threading
+import time
+import os
+from concurrent.futures import Future
+
+PARTIAL_SUFFIX = ".part"
+EDF_MAGIC = b"SR_RESEARCH"
+
+
+class DownloadTask():
+    def __init__(self, eyelink, src:str, dest:str, retries:int=3, backoff:float=0.5) -> None:
+        """Receives an edf file from the Host PC in a background thread. See receive_verified.
+        The link must not be used otherwise until the task is done.
+
+        Progress callbacks are only called from poll(), i.e. in the thread that polls (usually the render loop),
+        so they may safely update the window.
+
+        Args:
+            eyelink (pylink.EyeLink): Connected tracker with the file closed.
+            src (str): File name on the Host PC.
+            dest (str): Local file path.
+            retries (int, optional): Number of retries after a failed transfer. Defaults to 3.
+            backoff (float, optional): Seconds to wait before the first retry. Doubled for every further retry. Defaults to 0.5.
+        """
+        self.eyelink = eyelink
+        self.src = src
+        self.dest = dest
+        self.retries = retries
+        self.backoff = backoff
+
+        self.future = Future()
+        self.bytes_received = 0
+        self.rate = 0. # bytes per second
+        self.start_time = None
+        self.end_time = None
+
+        self._progress_callbacks = []
+        self._cancel_requested = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self) -> "DownloadTask":
+        self.future.set_running_or_notify_cancel()
+        self.start_time = time.perf_counter()
+        self._thread.start()
+        return self
+
+    ### STATE
+    def done(self) -> bool:
+        return self.future.done()
+
+    def cancelled(self) -> bool:
+        return self._cancel_requested and self.done()
+
+    def result(self, timeout:float|None=None) -> int:
+        """Waits for the transfer and returns the number of bytes received.
+        Raises IOError if the transfer failed and InterruptedError if it was cancelled."""
+        return self.future.result(timeout)
+
+    def cancel(self) -> None:
+        """Requests to abort the transfer. The task is done as soon as the tracker stopped sending."""
+        self._cancel_requested = True
+        # same as pressing ESC during the transfer
+        self.eyelink.terminalBreak(1)
+
+    ### PROGRESS
+    def add_progress_callback(self, callback) -> None:
+        """Adds a callable that is called with the task from poll() whenever progress was made."""
+        self._progress_callbacks.append(callback)
+
+    def add_done_callback(self, callback) -> None:
+        """Adds a callable that is called with the task once the transfer ended. Called from the transfer thread."""
+        self.future.add_done_callback(lambda f: callback(self))
+
+    def poll(self) -> int:
+        """Updates bytes_received and rate and calls the progress callbacks.
+        Returns:
+            int: Bytes received so far.
+        """
+        path = self.dest + PARTIAL_SUFFIX if not self.done() else self.dest
+        try:
+            received = os.path.getsize(path)
+        except OSError:
+            received = 0
+        end = self.end_time if self.end_time is not None else time.perf_counter()
+        self.rate = received / max(end - self.start_time, 1e-6)
+
+        if received != self.bytes_received or self.done():
+            self.bytes_received = received
+            for callback in self._progress_callbacks:
+                callback(self)
+        return received
+
+    def progress_text(self) -> str:
+        """Human readable progress, e.g. for a progress screen."""
+        state = "cancelled" if self.cancelled() else ("done" if self.done() else "downloading")
+        return f"{self.src}: {state}\
+            \n\t> {self.bytes_received / 1e6:.1f} MB received at {self.rate / 1e6:.2f} MB/s"
+
+    ### TRANSFER
+    def _run(self):
+        try:
+            size = receive_verified(self.eyelink, self.src, self.dest, self.retries, self.backoff,
+                                    cancelled=lambda: self._cancel_requested)
+        except Exception as e:
+            self.end_time = time.perf_counter()
+            self.future.set_exception(e)
+            return
+        finally:
+            if self._cancel_requested:
+                self.eyelink.terminalBreak(0)
+
+        self.end_time = time.perf_counter()
+        self.future.set_result(size)
+
+
+def verify_edf(path:str, expected_size:int|None=None) -> str|None:
+    """Checks a received edf file for signs of an incomplete transfer.
+    Args:
+        path (str): Local file.
+        expected_size (int|None, optional): Size reported by the tracker. Defaults to None.
+    Returns:
+        str|None: None if the file looks complete, otherwise the reason why not.
+    """
+    size = os.path.getsize(path)
+    if size == 0:
+        return "file is empty"
+    if (expected_size is not None) and (size != expected_size):
+        return f"received {size} bytes, tracker sent {expected_size} bytes"
+
+    with open(path, "rb") as f:
+        head = f.read(1024)
+        f.seek(max(size - 512, 0))
+        tail = f.read()
+
+    # the edf header starts with the SR Research tag followed by the "** " preamble lines
+    if not (head.startswith(EDF_MAGIC) or b"** DATE:" in head):
+        return "edf header is missing"
+    # an interrupted transfer leaves the preallocated end of the file zero-filled
+    if tail.strip(b"\x00") == b"":
+        return "end of file is zero-filled"
+    return None
+
+
+def receive_verified(eyelink, src:str, dest:str, retries:int=3, backoff:float=0.5, cancelled=None) -> int:
+    """Receives an edf file, verifies it and retries failed transfers with exponential backoff.
+    The file is received to dest + ".part" and only renamed to dest once it was verified,
+    so dest is never a truncated file.
+
+    Args:
+        eyelink (pylink.EyeLink): Connected tracker with the file closed.
+        src (str): File name on the Host PC.
+        dest (str): Local file path.
+        retries (int, optional): Number of retries after a failed transfer. Defaults to 3.
+        backoff (float, optional): Seconds to wait before the first retry. Doubled for every further retry. Defaults to 0.5.
+        cancelled (function, optional): Callable returning True if no further attempts should be made. Defaults to None.
+
+    Returns:
+        int: Size of the received file in bytes. 0 if the tracker records no files, e.g. replay.ReplayEyeLink.
+    """
+    if not getattr(eyelink, "records_files", True):
+        print(f"INFO (EyeLinkConnector): {src} is not downloaded, the tracker records no files.")
+        return 0
+
+    tmp = dest + PARTIAL_SUFFIX
+    reason = ""
+    for attempt in range(retries + 1):
+        if attempt > 0:
+            print(f"WARNING (EyeLinkConnector): receiving {src} failed ({reason}). Retry {attempt}/{retries}.")
+            time.sleep(backoff * 2 ** (attempt - 1))
+
+        size = eyelink.receiveDataFile(src, tmp)
+        if (cancelled is not None) and cancelled():
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise InterruptedError(f"Receiving {src} was cancelled.")
+
+        if (size is None) or (size <= 0) or not os.path.exists(tmp):
+            reason = f"link error {size}"
+            continue
+
+        reason = verify_edf(tmp, size)
+        if reason is None:
+            os.replace(tmp, dest)
+            return size
+
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    raise IOError(f"Receiving {src} failed after {retries + 1} attempts: {reason}.")
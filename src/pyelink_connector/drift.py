@@ -0,0 +1,290 @@
+import re
+import numpy as np
+
+from .fixation import FixationDetector
+
+_MISSING = -32768. # pylink.MISSING_DATA
+EYES = ["left", "right"]
+
+
+class DriftEstimator():
+    def __init__(self, dispersion:float=40., duration:float=200., max_distance:float=150., smoothing:float=.5,
+                 apply:bool=False) -> None:
+        """Estimates the drift of the gaze during recording from fixations on known reference points,
+        e.g. the central fixation cross of each trial, so explicit drift checks can be skipped.
+        Declare a reference while it is shown with set_reference((x, y)) in window (tracker) coordinates.
+        Every fixation on it updates a running offset (gaze - reference) per eye.
+
+        Add it with EyeConnector.enableDriftEstimation. It is then fed by getEyeSample and, if apply is True,
+        the offset is subtracted from the gaze of getEyeSample and of SampleHistory queries.
+
+        Args:
+            dispersion (float, optional): Maximum dispersion of a reference fixation in px. Defaults to 40.
+            duration (float, optional): Minimum duration of a reference fixation in ms. Defaults to 200.
+            max_distance (float, optional): Maximum distance of a reference fixation to the reference in px.
+                Larger offsets are not treated as drift. Defaults to 150.
+            smoothing (float, optional): Weight of a new fixation in the running offset (1 = last fixation only). Defaults to .5.
+            apply (bool, optional): Correct the gaze returned by the connector. Defaults to False.
+        """
+        self.smoothing = smoothing
+        self.apply = apply
+        self.reference = None
+        self.offsets = {eye: (0., 0.) for eye in EYES} # current estimate in px
+        self.counts = {eye: 0 for eye in EYES} # number of reference fixations
+        # every estimate with the tracker time it is valid from, for time-resolved corrections
+        self.history = {eye: [] for eye in EYES} # (time, dx, dy)
+        self.residuals = [] # (time, eye, dx, dy) of every reference fixation, before smoothing
+
+        self._detectors = {eye: FixationDetector(dispersion, duration, max_distance) for eye in EYES}
+
+    def set_reference(self, point:tuple|None) -> None:
+        """Declares the reference point currently shown, None if it is hidden."""
+        self.reference = tuple(point) if point is not None else None
+        # a reference shown again is a new chance for a fixation
+        for detector in self._detectors.values():
+            detector.reset(self.reference)
+
+    def reset(self, time:float) -> None:
+        """Discards the estimate from tracker time on, e.g. after a calibration or drift correction."""
+        for eye in EYES:
+            self.offsets[eye] = (0., 0.)
+            self.counts[eye] = 0
+            if self.history[eye]:
+                self.history[eye].append((max(time, self.history[eye][-1][0]), 0., 0.))
+
+    ### ESTIMATION
+    def update(self, sample) -> list:
+        """Feeds a pylink sample (e.g. of getNewestSample).
+        Returns:
+            list: Eyes whose estimate changed.
+        """
+        if sample is None:
+            return []
+        changed = []
+        for eye, has_eye, get_eye in [("left", sample.isLeftSample(), sample.getLeftEye),
+                                      ("right", sample.isRightSample(), sample.getRightEye)]:
+            if not has_eye:
+                continue
+            x, y = get_eye().getGaze()
+            gaze = None if (x == _MISSING) or (y == _MISSING) else (sample.getTime(), x, y)
+            detector = self._detectors[eye]
+            if detector.update(gaze, self.reference):
+                t, cx, cy = detector.center
+                self.add_residual(t, eye, cx - self.reference[0], cy - self.reference[1])
+                changed.append(eye)
+        return changed
+
+    def add_residual(self, time:float, eye:str, dx:float, dy:float) -> None:
+        """Adds a measured offset (gaze - target in px), e.g. of a drift check, to the running estimate."""
+        time, dx, dy = float(time), float(dx), float(dy)
+        self.residuals.append((time, eye, dx, dy))
+        if self.counts[eye] == 0:
+            offset = (dx, dy)
+        else:
+            a = self.smoothing
+            ox, oy = self.offsets[eye]
+            offset = (ox + a * (dx - ox), oy + a * (dy - oy))
+        self.offsets[eye] = offset
+        self.counts[eye] += 1
+        self.history[eye].append((time, *offset))
+
+    ### CORRECTION
+    def correct(self, gaze:tuple, eye:str) -> tuple:
+        """Returns the gaze (x, y) minus the current offset of the eye. Missing data is returned as is."""
+        x, y = gaze
+        if (x == _MISSING) or (y == _MISSING):
+            return gaze
+        dx, dy = self.offsets[eye]
+        return (x - dx, y - dy)
+
+    def correct_columns(self, data:dict) -> dict:
+        """Returns sample columns (e.g. of SampleHistory.between) with corrected copies of x_l, y_l, x_r and y_r.
+        Each sample is corrected with the estimate valid at its time. Requires the time column.
+        """
+        data = dict(data)
+        times = np.asarray(data["time"])
+        for eye, e in [("left", "l"), ("right", "r")]:
+            if (not self.history[eye]) or (f"x_{e}" not in data):
+                continue
+            estimates = np.array(self.history[eye], dtype=np.float64)
+            i = np.searchsorted(estimates[:, 0], times, side="right") - 1
+            valid = i >= 0
+            i = np.maximum(i, 0)
+            data[f"x_{e}"] = data[f"x_{e}"] - np.where(valid, estimates[i, 1], 0.).astype(data[f"x_{e}"].dtype)
+            data[f"y_{e}"] = data[f"y_{e}"] - np.where(valid, estimates[i, 2], 0.).astype(data[f"y_{e}"].dtype)
+        return data
+
+    ### RECORDING LISTENER
+    def on_recording_start(self, connector, msg:str) -> None:
+        pass
+
+    def on_recording_stop(self, connector) -> None:
+        # references are declared per trial. The estimate of the trial goes to the edf file for offline corrections.
+        self.reference = None
+        text = " ".join(f"{eye[0].upper()} {self.offsets[eye][0]:.1f} {self.offsets[eye][1]:.1f}" for eye in EYES if self.counts[eye])
+        if text:
+            connector.eyelink.sendMessage(f"DRIFT_ESTIMATE {text}")
+
+
+# recommendations of DriftTrendMonitor
+NO_CORRECTION = "none"
+DRIFT_CORRECTION = "drift_correction"
+RECALIBRATION = "recalibration"
+
+# e.g. "DRIFTCORRECT R RIGHT at 960,540 OFFSET 0.37 deg. 12.5,3.2 pix."
+OFFSET_PATTERN = re.compile(r"OFFSET\s+(-?[\d.]+)\s+deg\.\s+(-?[\d.]+)\s*,\s*(-?[\d.]+)\s+pix")
+
+
+class DriftTrendMonitor():
+    def __init__(self, drift_threshold:float=.5, recalibration_threshold:float=1.5, horizon:float=60., window:int=10,
+                 max_age:float|None=None, pixels_per_degree:float|None=None) -> None:
+        """Collects residual offsets of the session and tells when a drift correction or recalibration is warranted,
+        so routine drift checks before every trial can be dropped:
+
+            if eyeConnector.recommendedCorrection() == "drift_correction":
+                eyeConnector.driftCorrect(...)
+
+        Sources are drift corrections of the setup, quick checks and fixations on the references of a DriftEstimator,
+        which the connector feeds in (see EyeConnector.enableDriftMonitor). Offsets since the last correction are fitted
+        by a linear trend per eye, which is extrapolated by horizon seconds.
+
+        Args:
+            drift_threshold (float, optional): Predicted offset in degrees that warrants a drift correction. Defaults to .5.
+            recalibration_threshold (float, optional): Predicted offset, or spread of the offsets of one quick check,
+                in degrees that warrants a recalibration. Defaults to 1.5.
+            horizon (float, optional): Time in s the trend is extrapolated, e.g. the duration of the next block. Defaults to 60.
+            window (int, optional): Number of latest offsets per eye used for the trend. Defaults to 10.
+            max_age (float|None, optional): Recommend a drift correction if the latest offset is older (s).
+                Defaults to None, i.e. no offsets needed.
+            pixels_per_degree (float|None, optional): Resolution to convert the thresholds to px. Defaults to None, i.e. taken
+                from the first drift check, quick check or link sample that reports it (see update_resolution).
+                No correction is recommended until it is known.
+        """
+        self.drift_threshold = drift_threshold
+        self.recalibration_threshold = recalibration_threshold
+        self.horizon = horizon
+        self.window = window
+        self.max_age = max_age
+        self.pixels_per_degree = pixels_per_degree
+        self.estimator = None # DriftEstimator whose residuals are added
+
+        self.offsets = [] # (time, eye, dx, dy, source) in px, tracker time in ms
+        self._since = -np.inf # time of the last correction
+        self._distorted = False # a quick check showed offsets that a drift correction does not fix
+        self._estimator_index = 0
+        self._warned = False
+
+    ### INPUT
+    def add(self, time:float, eye:str, dx:float, dy:float, source:str="") -> None:
+        """Adds a residual offset (gaze - target in px) at tracker time (ms)."""
+        self.offsets.append((float(time), eye, float(dx), float(dy), source))
+
+    def add_drift_check(self, time:float, lines:list, eye:str="", corrected:bool=True) -> None:
+        """Adds the offsets reported by the tracker for a drift check (calibration message or link messages).
+        Args:
+            corrected (bool, optional): The offset was applied, so the trend starts again. Defaults to True.
+        """
+        for line in lines:
+            m = OFFSET_PATTERN.search(line)
+            if m is None:
+                continue
+            line_eye = "left" if " LEFT " in f" {line} " else "right" if " RIGHT " in f" {line} " else eye
+            degrees, dx, dy = (float(v) for v in m.groups())
+            if degrees > 0:
+                # the tracker reports the offset in both units
+                self.set_resolution(np.hypot(dx, dy) / degrees)
+            self.add(time, line_eye, dx, dy, "drift_check")
+        if corrected:
+            self.corrected(time)
+
+    def add_quick_check(self, time:float, result) -> None:
+        """Adds the mean offset per eye of an accuracy.QuickCheckResult. Offsets that differ between the targets
+        (distortion instead of a shift) warrant a recalibration.
+        """
+        self.set_resolution(result.pixels_per_degree)
+        threshold = self._px(self.recalibration_threshold)
+        for eye in EYES:
+            offsets = np.array([t.offset for t in result.targets if t.eye == eye], dtype=np.float64).reshape(-1, 2)
+            if offsets.size == 0:
+                continue
+            mean = offsets.mean(axis=0)
+            self.add(time, eye, mean[0], mean[1], "quick_check")
+            spread = np.hypot(*(offsets - mean).T).max()
+            if (threshold is not None) and (spread > threshold):
+                self._distorted = True
+
+    def corrected(self, time:float) -> None:
+        """Marks a drift correction: offsets before time do not count anymore."""
+        self._since = float(time)
+
+    def recalibrated(self, time:float) -> None:
+        """Marks a recalibration: offsets before time and earlier distortions do not count anymore."""
+        self._since = float(time)
+        self._distorted = False
+
+    def _sync_estimator(self) -> None:
+        if self.estimator is None:
+            return
+        residuals = self.estimator.residuals
+        for time, eye, dx, dy in residuals[self._estimator_index:]:
+            self.add(time, eye, dx, dy, "reference")
+        self._estimator_index = len(residuals)
+
+    def set_resolution(self, pixels_per_degree:float|None) -> None:
+        """Sets the resolution if it is not known yet."""
+        if (self.pixels_per_degree is None) and pixels_per_degree and (pixels_per_degree > 0):
+            self.pixels_per_degree = float(pixels_per_degree)
+
+    def update_resolution(self, sample) -> None:
+        """Takes the resolution from a pylink sample (e.g. of getNewestSample) if it is not known yet."""
+        if (self.pixels_per_degree is None) and (sample is not None) and hasattr(sample, "getPPD"):
+            ppd = sample.getPPD()
+            self.set_resolution((ppd[0] + ppd[1]) / 2)
+
+    def _px(self, degrees:float) -> float|None:
+        return degrees * self.pixels_per_degree if self.pixels_per_degree else None
+
+    ### MODEL
+    def predicted_offset(self, now:float) -> dict:
+        """Returns the offset (dx, dy) in px per eye predicted for now + horizon from the offsets since the last correction.
+        The offset measured by a drift correction itself is not part of the trend, it was corrected.
+        """
+        self._sync_estimator()
+        predictions = {}
+        for eye in EYES:
+            data = np.array([(t, dx, dy) for t, e, dx, dy, _ in self.offsets if (e == eye) and (t > self._since)],
+                            dtype=np.float64).reshape(-1, 3)[-self.window:]
+            if data.shape[0] == 0:
+                continue
+            t = now + self.horizon * 1000
+            if (data.shape[0] < 2) or (np.ptp(data[:, 0]) == 0):
+                predictions[eye] = tuple(float(v) for v in data[:, 1:].mean(axis=0))
+                continue
+            # linear trend of both components at once
+            A = np.stack([data[:, 0] - data[-1, 0], np.ones(data.shape[0])], axis=1)
+            (slope, intercept), *_ = np.linalg.lstsq(A, data[:, 1:], rcond=None)
+            predictions[eye] = tuple(float(v) for v in intercept + slope * (t - data[-1, 0]))
+        return predictions
+
+    def recommend(self, now:float) -> str:
+        """Returns NO_CORRECTION, DRIFT_CORRECTION or RECALIBRATION for the tracker time now (ms)."""
+        if self._distorted:
+            return RECALIBRATION
+        predictions = self.predicted_offset(now)
+        if self.max_age is not None:
+            times = [t for t, *_ in self.offsets if t > self._since]
+            if (not times) or (now - max(times) > self.max_age * 1000):
+                return DRIFT_CORRECTION
+        if not predictions:
+            return NO_CORRECTION
+        if self.pixels_per_degree is None:
+            if not self._warned:
+                print("WARNING (EyeLinkConnector): the drift monitor does not know the resolution yet, pass pixels_per_degree.")
+                self._warned = True
+            return NO_CORRECTION
+        offset = max(np.hypot(*p) for p in predictions.values())
+        if offset >= self._px(self.recalibration_threshold):
+            return RECALIBRATION
+        if offset >= self._px(self.drift_threshold):
+            return DRIFT_CORRECTION
+        return NO_CORRECTION
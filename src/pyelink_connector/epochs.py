@@ -0,0 +1,117 @@
+import numpy as np
+import warnings
+
+from .asc import trial_table
+
+
+def _tables(data) -> tuple:
+    """Returns (samples, trials) of a session.Session, asc.AscData or a (samples, trials) tuple of column dicts."""
+    if hasattr(data, "samples") and hasattr(data, "trials"):
+        return data.samples, data.trials
+    return data
+
+
+def trials_from_messages(times:np.ndarray, texts) -> dict:
+    """Trial table from raw messages, e.g. messages logged locally during the session. See asc.trial_table."""
+    return trial_table(np.asarray(times, dtype=np.float64), texts)
+
+
+def trial_indices(times:np.ndarray, trials:dict, label:str|None=None) -> tuple:
+    """Finds the sample rows of every trial with a binary search on the (sorted) sample times.
+    Args:
+        times (np.ndarray): Sample times.
+        trials (dict): Trial table with "start", "end" and "label", see asc.trial_table.
+        label (str|None, optional): Only trials started with this startRecording message. Defaults to None, i.e. all.
+    Returns:
+        tuple: (trial numbers, first rows, end rows (exclusive)) as arrays.
+    """
+    starts = np.asarray(trials["start"], dtype=np.float64)
+    ends = np.asarray(trials["end"], dtype=np.float64)
+    selected = np.arange(starts.size)
+    if label is not None:
+        selected = selected[np.asarray(trials["label"]) == label]
+
+    i0 = np.searchsorted(times, starts[selected], side="left")
+    # a trial without END message lasts until the end of the data
+    i1 = np.where(np.isnan(ends[selected]), len(times), np.searchsorted(times, ends[selected], side="right"))
+    return selected, i0, i1
+
+
+def epoch_views(data, columns:list|None=None, label:str|None=None) -> list:
+    """Returns the samples of every trial as views of the columns, i.e. without copying.
+    Args:
+        data: session.Session, asc.AscData or (samples, trials) column dicts.
+        columns (list|None, optional): Sample columns. Defaults to None, i.e. all.
+        label (str|None, optional): Only trials started with this startRecording message. Defaults to None.
+    Returns:
+        list[dict]: Column name -> view, one dict per trial.
+    """
+    samples, trials = _tables(data)
+    columns = columns if columns is not None else list(samples.keys())
+    _, i0, i1 = trial_indices(samples["time"], trials, label)
+    cols = [samples[c] for c in columns]
+    return [dict(zip(columns, [c[a:b] for c in cols])) for a, b in zip(i0.tolist(), i1.tolist())]
+
+
+def epoch_array(data, columns:list, pre:float=0., post:float=0., length:float|None=None, baseline:tuple|None=None,
+                label:str|None=None) -> tuple:
+    """Cuts all trials into one array, padded with nan.
+    Args:
+        data: session.Session, asc.AscData or (samples, trials) column dicts.
+        columns (list): Sample columns, e.g. ["x_l", "y_l"].
+        pre (float, optional): ms before the start of the trial. Defaults to 0.
+        post (float, optional): ms after the end of the trial. Ignored if length is given. Defaults to 0.
+        length (float|None, optional): Fixed epoch length in ms from trial start. Defaults to None, i.e. the longest trial.
+        baseline (tuple|None, optional): (t0, t1) in ms relative to the trial start. The mean of every column in this
+            window is subtracted per trial. Defaults to None.
+        label (str|None, optional): Only trials started with this startRecording message. Defaults to None.
+    Returns:
+        tuple: (array (trials, samples, columns) as float32, sample times relative to the trial start in ms,
+            trial numbers)
+    """
+    samples, trials = _tables(data)
+    times = np.asarray(samples["time"], dtype=np.float64)
+    selected, _, _ = trial_indices(times, trials, label)
+    starts = np.asarray(trials["start"], dtype=np.float64)[selected]
+    ends = np.asarray(trials["end"], dtype=np.float64)[selected]
+
+    # the sample interval from the data, the tracker samples at a fixed rate
+    dt = float(np.median(np.diff(times[:10001]))) if len(times) > 1 else 1.
+    n_pre = int(round(pre / dt))
+
+    # window of every trial by time: recordings have gaps between trials, which must not be filled by other trials
+    w0 = np.searchsorted(times, starts - pre, side="left")
+    if length is not None:
+        w1 = np.searchsorted(times, starts + length, side="left")
+    else:
+        # a trial without END message lasts until the end of the data
+        w1 = np.where(np.isnan(ends), len(times), np.searchsorted(times, ends + post, side="right"))
+    w1 = np.maximum(w1, w0)
+
+    # rows of all windows at once and their position on the epoch time axis, so dropped samples stay nan
+    counts = w1 - w0
+    trial = np.repeat(np.arange(len(selected)), counts)
+    rows = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + np.repeat(w0, counts)
+    bins = np.rint((times[rows] - starts[trial]) / dt).astype(np.int64) + n_pre
+    if length is not None:
+        n = n_pre + int(round(length / dt))
+    elif len(selected) and len(times):
+        stops = np.where(np.isnan(ends), times[-1], ends + post)
+        n = n_pre + max(int(round(float(np.max(stops - starts)) / dt)) + 1, 0)
+    else:
+        n = n_pre
+    keep = (bins >= 0) & (bins < n)
+    trial, rows, bins = trial[keep], rows[keep], bins[keep]
+
+    out = np.full((len(selected), n, len(columns)), np.nan, dtype=np.float32)
+    for k, c in enumerate(columns):
+        out[trial, bins, k] = np.asarray(samples[c])[rows]
+
+    t = (np.arange(n) - n_pre) * dt
+    if baseline is not None:
+        window = (t >= baseline[0]) & (t < baseline[1])
+        with warnings.catch_warnings():
+            # trials without samples in the window stay nan
+            warnings.simplefilter("ignore", RuntimeWarning)
+            out -= np.nanmean(out[:, window, :], axis=1, keepdims=True)
+    return out, t, selected
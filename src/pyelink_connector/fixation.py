@@ -0,0 +1,93 @@
+import numpy as np
+
+_MISSING = -32768. # pylink.MISSING_DATA
+
+
+def newest_gaze(eyelink) -> tuple|None:
+    """Returns (time, x, y) of the newest link sample (right eye if binocular), or None if there is no valid gaze."""
+    s = eyelink.getNewestSample()
+    if s is None:
+        return None
+    if s.isRightSample():
+        eye = s.getRightEye()
+    elif s.isLeftSample():
+        eye = s.getLeftEye()
+    else:
+        return None
+    x, y = eye.getGaze()
+    if (x == _MISSING) or (y == _MISSING):
+        return None
+    return (s.getTime(), x, y)
+
+
+class FixationDetector():
+    def __init__(self, dispersion:float=40., duration:float=300., max_distance:float|None=120., capacity:int=512) -> None:
+        """Detects a stable fixation near a target from a gaze stream (dispersion threshold, I-DT).
+        Used by the setup to accept calibration, validation and drift correction targets without operator,
+        see EyeConnector.enableAutoAccept.
+
+        Args:
+            dispersion (float, optional): Maximum (max x - min x) + (max y - min y) of the fixation in px. Defaults to 40.
+            duration (float, optional): Minimum fixation duration in ms. Defaults to 300.
+            max_distance (float|None, optional): Maximum distance of the fixation center to the target in px.
+                None only checks the stability, e.g. for uncalibrated gaze. Defaults to 120.
+            capacity (int, optional): Samples kept, must cover the duration. Defaults to 512.
+        """
+        self.dispersion = dispersion
+        self.duration = duration
+        self.max_distance = max_distance
+
+        self._samples = np.zeros((capacity, 3), dtype=np.float64) # ring buffer of (time, x, y)
+        self._n = 0 # number of valid samples
+        self._i = 0 # next write position
+        self._target = None
+        self._accepted = False
+        self.center = None # (time, x, y) of the last detected fixation: time of its last sample, mean position
+
+    def reset(self, target:tuple|None=None) -> None:
+        self._n = 0
+        self._target = target
+        self._accepted = False
+
+    def update(self, gaze:tuple|None, target:tuple|None, check_distance:bool=True) -> bool:
+        """Adds a sample and returns True once per target when a fixation on it is detected.
+        Args:
+            gaze (tuple|None): (time, x, y) as returned by newest_gaze. None (e.g. a blink) restarts the fixation.
+            target (tuple|None): Current target position, None if hidden. A new position restarts the detection.
+            check_distance (bool, optional): Apply max_distance. Defaults to True.
+        """
+        if target != self._target:
+            self.reset(target)
+        if (target is None) or self._accepted:
+            return False
+        if gaze is None:
+            self._n = 0
+            return False
+        if self._n and (gaze[0] <= self._samples[(self._i - 1) % len(self._samples), 0]):
+            # same sample as in the last poll
+            return False
+
+        self._samples[self._i] = gaze
+        self._i = (self._i + 1) % len(self._samples)
+        self._n = min(self._n + 1, len(self._samples))
+
+        # samples in chronological order
+        window = np.roll(self._samples, -self._i, axis=0)[-self._n:]
+        t, x, y = window[:, 0], window[:, 1], window[:, 2]
+        # drop the samples before the dispersion exceeded the threshold, looking back from the newest
+        spread = (np.maximum.accumulate(x[::-1]) - np.minimum.accumulate(x[::-1])
+                  + np.maximum.accumulate(y[::-1]) - np.minimum.accumulate(y[::-1]))
+        stable = int(np.argmax(spread > self.dispersion)) if (spread > self.dispersion).any() else self._n
+        if stable < self._n:
+            # keep the stable tail only
+            self._n = stable
+        if t[-1] - t[-self._n] < self.duration:
+            return False
+
+        cx, cy = x[-self._n:].mean(), y[-self._n:].mean()
+        if check_distance and (self.max_distance is not None):
+            if np.hypot(cx - target[0], cy - target[1]) > self.max_distance:
+                return False
+        self.center = (t[-1], cx, cy)
+        self._accepted = True
+        return True
@@ -0,0 +1,80 @@
+import gc
+import time
+from typing import NamedTuple
+
+
+class GCStats(NamedTuple):
+    trial: str
+    collections: int # number of collections during recording
+    pause_total_ms: float # summed duration of these collections
+    pause_max_ms: float # longest single collection
+    iti_collect_ms: float # duration of the collection after the trial
+    iti_collected: int # objects freed by the collection after the trial
+
+
+class GCPolicy():
+    def __init__(self, mode:str="freeze", collect_after_trial:bool=True, log_to_edf:bool=True) -> None:
+        """Keeps Python's cyclic garbage collector out of recording windows.
+        Add it to EyeConnector.recording_listeners to apply it to every trial.
+
+        Args:
+            mode (str, optional): "freeze" moves all objects alive at the start of the trial to a permanent
+                generation, so collections during recording only scan new objects. "disable" turns the cyclic
+                collector off during recording. Defaults to "freeze".
+            collect_after_trial (bool, optional): Run a full collection after each trial. Defaults to True.
+            log_to_edf (bool, optional): Write a GC_STATS message per trial to the edf file. Defaults to True.
+        """
+        assert(mode in ["freeze", "disable"])
+        self.mode = mode
+        self.collect_after_trial = collect_after_trial
+        self.log_to_edf = log_to_edf
+
+        self.trial_stats = []
+
+        self._trial = ""
+        self._was_enabled = True
+        self._start = 0.
+        self._pauses = []
+
+    ### RECORDING LISTENER
+    def on_recording_start(self, connector, msg:str) -> None:
+        self._trial = msg
+        self._pauses = []
+
+        if self.mode == "freeze":
+            # clean up first, so garbage is not frozen along with the live objects
+            gc.collect()
+            gc.freeze()
+        elif self.mode == "disable":
+            self._was_enabled = gc.isenabled()
+            gc.disable()
+
+        gc.callbacks.append(self._on_gc)
+
+    def on_recording_stop(self, connector) -> None:
+        gc.callbacks.remove(self._on_gc)
+
+        if self.mode == "freeze":
+            gc.unfreeze()
+        elif self.mode == "disable" and self._was_enabled:
+            gc.enable()
+
+        iti_ms, collected = 0., 0
+        if self.collect_after_trial:
+            t0 = time.perf_counter()
+            collected = gc.collect()
+            iti_ms = (time.perf_counter() - t0) * 1000.
+
+        stats = GCStats(self._trial, len(self._pauses), sum(self._pauses), max(self._pauses, default=0.), iti_ms, collected)
+        self.trial_stats.append(stats)
+
+        if self.log_to_edf:
+            connector.eyelink.sendMessage(f"GC_STATS {stats.collections} collections, {stats.pause_total_ms:.3f} ms total, "
+                                          f"{stats.pause_max_ms:.3f} ms max, {stats.iti_collect_ms:.3f} ms after trial")
+
+    ### MEASUREMENT
+    def _on_gc(self, phase, info):
+        if phase == "start":
+            self._start = time.perf_counter()
+        elif phase == "stop":
+            self._pauses.append((time.perf_counter() - self._start) * 1000.)
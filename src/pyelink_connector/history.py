@@ -0,0 +1,173 @@
+import pylink
+import numpy as np
+import tempfile
+import shutil
+import os
+
+# compact storage. float32 is exact to far below a pixel and keeps the fractional pupil sizes of the link samples.
+HISTORY_COLUMNS = {
+    "time": np.float64, # tracker time in ms
+    "x_l": np.float32, "y_l": np.float32, "pupil_l": np.float32,
+    "x_r": np.float32, "y_r": np.float32, "pupil_r": np.float32,
+}
+PUPIL_COLUMNS = ["pupil_l", "pupil_r"]
+_MISSING = pylink.MISSING_DATA if hasattr(pylink, "MISSING_DATA") else -32768
+
+
+class SampleHistory():
+    def __init__(self, directory:str|None=None, capacity:int=2**20) -> None:
+        """Keeps every sample of a session in memory-mapped files, so long sessions do not fill the RAM.
+        Samples are stored by time, queries by time range are a binary search and return views.
+        Missing gaze is nan, missing pupil size is 0.
+
+        Add it as EyeConnector.sample_history and to EyeConnector.recording_listeners (see EyeConnector.enableSampleHistory).
+        Queued link samples are then read with every getEyeSample call and trial bounds are recorded.
+
+        Args:
+            directory (str|None, optional): Directory of the files. Defaults to None, i.e. a temporary directory.
+            capacity (int, optional): Initial number of samples. The files double in size when full. Defaults to 2**20.
+        """
+        self._temporary = directory is None
+        self.directory = tempfile.mkdtemp(prefix="pyelink_history_") if directory is None else directory
+        os.makedirs(self.directory, exist_ok=True)
+
+        self.size = 0
+        self.capacity = 0
+        self._columns = {}
+        self._generation = 0
+        self._stale = []
+        self._grow(capacity)
+
+        self._trials = {"start": [], "end": [], "label": []}
+        self.drift_estimator = None # drift.DriftEstimator correcting the gaze of queries if its apply is True
+
+    ### WRITING
+    def _grow(self, capacity:int) -> None:
+        # a new file per size: a mapped file cannot be resized on Windows, and views returned earlier keep the old one
+        self._generation += 1
+        for name, dtype in HISTORY_COLUMNS.items():
+            path = os.path.join(self.directory, f"{name}.{self._generation}.bin")
+            column = np.memmap(path, dtype=dtype, mode="w+", shape=(capacity,))
+            old = self._columns.get(name)
+            if old is not None:
+                column[:self.size] = old[:self.size]
+                old.flush()
+                self._stale.append(old.filename)
+            self._columns[name] = column
+        self.capacity = capacity
+        self._remove_stale()
+
+    def _remove_stale(self) -> None:
+        # files still mapped by views fail to be removed on Windows and are tried again later
+        stale = []
+        for path in self._stale:
+            try:
+                os.remove(path)
+            except OSError:
+                stale.append(path)
+        self._stale = stale
+
+    def append(self, rows:list) -> int:
+        """Appends samples as (time, x_l, y_l, pupil_l, x_r, y_r, pupil_r) rows. Samples not newer than the last one are skipped.
+        Returns:
+            int: Number of appended samples.
+        """
+        if not rows:
+            return 0
+        arr = np.array(rows, dtype=np.float64)
+        arr = arr[arr[:, 0] > self.latest_time]
+        n = len(arr)
+        if n == 0:
+            return 0
+        if self.size + n > self.capacity:
+            self._grow(max(self.capacity * 2, self.size + n))
+
+        arr[arr == _MISSING] = np.nan
+        for i, name in enumerate(HISTORY_COLUMNS):
+            values = arr[:, i]
+            if name in PUPIL_COLUMNS:
+                values = np.nan_to_num(values)
+            self._columns[name][self.size:self.size + n] = values
+        self.size += n
+        return n
+
+    def poll(self, link) -> int:
+        """Reads the samples queued on the link. Messages stay available to the other consumers of the link.
+        Args:
+            link (link.LinkReader): Reader of the connector (EyeConnector.link).
+        Returns:
+            int: Number of appended samples.
+        """
+        return self.append([sample_row(s) for s in link.samples("history")])
+
+    ### RECORDING LISTENER
+    def on_recording_start(self, connector, msg:str) -> None:
+        self._trials["start"].append(connector.eyelink.trackerTime())
+        self._trials["end"].append(np.nan)
+        self._trials["label"].append(msg)
+
+    def on_recording_stop(self, connector) -> None:
+        # the samples up to the end of the recording are still queued
+        self.poll(connector.link)
+        self._trials["end"][-1] = connector.eyelink.trackerTime()
+
+    ### QUERIES
+    @property
+    def latest_time(self) -> float:
+        return float(self._columns["time"][self.size - 1]) if self.size else -np.inf
+
+    def column(self, name:str) -> np.ndarray:
+        return self._columns[name][:self.size]
+
+    @property
+    def samples(self) -> dict:
+        return {name: self.column(name) for name in HISTORY_COLUMNS}
+
+    @property
+    def trials(self) -> dict:
+        """Trial table in the format of asc.trial_table, e.g. for epochs.epoch_views(history)."""
+        return {"start": np.array(self._trials["start"], dtype=np.float64), "end": np.array(self._trials["end"], dtype=np.float64),
+                "label": np.array(self._trials["label"], dtype=object)}
+
+    def between(self, t0:float, t1:float, columns:list|None=None) -> dict:
+        """Returns views of the samples with t0 <= time < t1 (tracker time in ms). The gaze is a drift corrected copy
+        if a drift estimator is applied."""
+        times = self.column("time")
+        i0, i1 = np.searchsorted(times, [t0, t1], side="left")
+        columns = columns if columns is not None else list(HISTORY_COLUMNS)
+        if (self.drift_estimator is not None) and self.drift_estimator.apply:
+            # corrected copies instead of views
+            data = self.drift_estimator.correct_columns({c: self._columns[c][i0:i1] for c in set(columns) | {"time"}})
+            return {c: data[c] for c in columns}
+        return {c: self._columns[c][i0:i1] for c in columns}
+
+    def last(self, ms:float, columns:list|None=None) -> dict:
+        """Returns the samples of the last ms milliseconds, e.g. last(3000)."""
+        return self.between(self.latest_time - ms, np.inf, columns)
+
+    def trial(self, i:int, columns:list|None=None) -> dict:
+        """Returns the samples of trial i (negative i counts from the latest trial)."""
+        end = self._trials["end"][i]
+        return self.between(self._trials["start"][i], np.inf if np.isnan(end) else end, columns)
+
+    def close(self) -> None:
+        """Releases the files. A temporary directory is removed."""
+        for column in self._columns.values():
+            column.flush()
+        self._columns = {}
+        self.size = self.capacity = 0
+        self._remove_stale()
+        if self._temporary:
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def sample_row(s) -> tuple:
+    """Returns (time, x_l, y_l, pupil_l, x_r, y_r, pupil_r) of a pylink sample. A missing eye is nan with pupil 0."""
+    row = [s.getTime()]
+    for has_eye, get_eye in [(s.isLeftSample(), s.getLeftEye), (s.isRightSample(), s.getRightEye)]:
+        if has_eye:
+            e = get_eye()
+            row += [*e.getGaze(), e.getPupilSize()]
+        else:
+            row += [np.nan, np.nan, 0]
+    return tuple(row)
@@ -0,0 +1,86 @@
+import re
+from typing import NamedTuple, Iterable
+
+
+class InterestArea(NamedTuple):
+    left: float
+    top: float
+    right: float
+    bottom: float
+    label: str
+
+
+class TextLine(NamedTuple):
+    """Geometry of one rendered line of text in tracker coordinates.
+    edges[i] is the left edge of character i, edges[len(text)] the right edge of the last character.
+    """
+    text: str
+    edges: list
+    top: float
+    bottom: float
+
+
+_WORD = re.compile(r"\S+")
+
+
+def boxes_from_lines(lines:Iterable[TextLine], level:str="word") -> list:
+    """Builds one interest area per word or per character of the given lines.
+    Args:
+        lines (Iterable[TextLine]): Rendered lines of text.
+        level (str, optional): "word" or "character". Defaults to "word".
+    Returns:
+        list[InterestArea]: Interest areas in reading order.
+    """
+    assert(level in ["word", "character"])
+
+    areas = []
+    for line in lines:
+        if level == "word":
+            spans = [(m.start(), m.end()) for m in _WORD.finditer(line.text)]
+        else:
+            spans = [(i, i + 1) for i, c in enumerate(line.text) if not c.isspace()]
+
+        for start, end in spans:
+            areas.append(InterestArea(line.edges[start], line.top, line.edges[end], line.bottom, line.text[start:end]))
+    return areas
+
+
+def format_interest_areas(areas:Iterable[InterestArea], start_id:int=1, skip:set|None=None) -> list:
+    """Formats interest areas as `!V IAREA RECTANGLE` messages.
+    Boxes are rounded to full pixels and duplicates (same box and label) are dropped.
+    Args:
+        areas (Iterable[InterestArea]): Interest areas to format.
+        start_id (int, optional): Id of the first interest area. Defaults to 1.
+        skip (set|None, optional): Keys of areas that were already sent. New keys are added to it. Defaults to None.
+    Returns:
+        list[str]: Messages, one per unique interest area.
+    """
+    seen = skip if skip is not None else set()
+    msgs = []
+    for a in areas:
+        # Data Viewer expects left < right and top < bottom regardless of the display coordinate system
+        left, right = sorted((round(a.left), round(a.right)))
+        top, bottom = sorted((round(a.top), round(a.bottom)))
+        # labels must not contain whitespace
+        label = "_".join(a.label.split())
+        key = (left, top, right, bottom, label)
+        if key in seen:
+            continue
+        seen.add(key)
+        msgs.append(f"!V IAREA RECTANGLE {start_id + len(msgs)} {left} {top} {right} {bottom} {label}")
+    return msgs
+
+
+def send_interest_areas(eyelink, areas:Iterable[InterestArea], sent:set) -> int:
+    """Sends all new interest areas back to back as one block of messages.
+    Args:
+        eyelink (pylink.EyeLink): Connected tracker.
+        areas (Iterable[InterestArea]): Interest areas to send.
+        sent (set): Keys of the areas already sent in this trial. Updated in place.
+    Returns:
+        int: Number of messages sent.
+    """
+    msgs = format_interest_areas(areas, start_id=len(sent) + 1, skip=sent)
+    for msg in msgs:
+        eyelink.sendMessage(msg)
+    return len(msgs)
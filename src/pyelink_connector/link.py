@@ -0,0 +1,55 @@
+import pylink
+import itertools
+from collections import deque
+
+MESSAGE_EVENT = 24 # pylink.MESSAGEEVENT
+SAMPLES = "samples"
+MESSAGES = "messages"
+
+
+class LinkReader():
+    def __init__(self, eyelink, max_samples:int=20000, max_messages:int=1000) -> None:
+        """Single reader of the link data queue of a connector (EyeConnector.link).
+        getNextData hands every item to one caller only, so consumers that drain the queue themselves take each other's data,
+        e.g. the sample history the validation messages. Read through this instead: every consumer gets the samples and
+        message texts that arrived since its own last read.
+
+        Args:
+            eyelink: pylink.EyeLink or replay.ReplayEyeLink.
+            max_samples (int, optional): Samples kept for consumers that did not read them yet. Defaults to 20000.
+            max_messages (int, optional): Message texts kept for consumers that did not read them yet. Defaults to 1000.
+        """
+        self.eyelink = eyelink
+        self._buffers = {SAMPLES: deque(maxlen=max_samples), MESSAGES: deque(maxlen=max_messages)}
+        self._counts = {SAMPLES: 0, MESSAGES: 0} # items ever read per kind
+        self._cursors = {} # (consumer, kind) -> count at its last read
+
+    def poll(self) -> None:
+        """Drains the link queue into the buffers. Other events are dropped."""
+        while True:
+            data_type = self.eyelink.getNextData()
+            if not data_type:
+                break
+            if data_type == pylink.SAMPLE_TYPE:
+                self._buffers[SAMPLES].append(self.eyelink.getFloatData())
+                self._counts[SAMPLES] += 1
+            elif data_type == MESSAGE_EVENT:
+                self._buffers[MESSAGES].append(self.eyelink.getFloatData().getText())
+                self._counts[MESSAGES] += 1
+
+    def read(self, consumer:str, kind:str) -> list:
+        """Returns the pylink samples (SAMPLES) or message texts (MESSAGES) that arrived since the last read of consumer.
+        The first read of a consumer returns everything still buffered.
+        """
+        self.poll()
+        buffer, count = self._buffers[kind], self._counts[kind]
+        first = count - len(buffer) # count of the oldest buffered item
+        start = max(self._cursors.get((consumer, kind), 0), first)
+        self._cursors[(consumer, kind)] = count
+        return list(itertools.islice(buffer, start - first, None))
+
+    def samples(self, consumer:str) -> list:
+        return self.read(consumer, SAMPLES)
+
+    def messages(self, consumer:str) -> list:
+        return self.read(consumer, MESSAGES)
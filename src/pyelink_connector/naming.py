@@ -0,0 +1,76 @@
+import json
+import re
+import os
+
+NAME_MAP_FILE = "edf_names.json"
+HOST_NAME_LENGTH = 8 # the Host PC only accepts 8 character file names (without .edf)
+_DIGITS = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+
+def _base36(n:int, width:int) -> str:
+    s = ""
+    for _ in range(width):
+        n, r = divmod(n, 36)
+        s = _DIGITS[r] + s
+    return s
+
+
+class EdfNameAllocator():
+    def __init__(self, download_directory:str, suffix_length:int=3) -> None:
+        """Derives unique 8 character Host PC file names for longer local edf file names.
+        The mapping is stored in download_directory/edf_names.json and used to name the downloaded files.
+        Args:
+            download_directory (str): Local directory the edf files are downloaded to.
+            suffix_length (int, optional): Number of base 36 counter characters appended to the shortened name,
+                i.e. 36**3 distinct names per shortened name. Defaults to 3.
+        """
+        self.path = os.path.join(download_directory, NAME_MAP_FILE)
+        self.download_directory = download_directory
+        self.suffix_length = suffix_length
+        self.names = self._load() # host file name -> local file name
+
+    def allocate(self, local_name:str) -> str:
+        """Returns the Host PC file name for a local edf file name, e.g. "EXP1_P042_block2.edf" -> "EXP1P000.edf".
+        Names that fit are used unchanged. A local name that was allocated before gets the same host name again.
+        Every host name is recorded, so a shortened name never collides with a name used as is.
+        """
+        for host, local in self.names.items():
+            if local == local_name:
+                return host
+
+        stem = os.path.splitext(local_name)[0]
+        if (len(stem) <= HOST_NAME_LENGTH) and re.fullmatch(r"\w+", stem) and (stem + ".edf" not in self.names):
+            self.names[stem + ".edf"] = local_name
+            self._save()
+            return stem + ".edf"
+
+        # shortened name: letters and digits of the local name plus a counter
+        short = re.sub(r"[^A-Za-z0-9]", "", stem).upper()[:HOST_NAME_LENGTH - self.suffix_length]
+        for n in range(36 ** self.suffix_length):
+            host = short + _base36(n, self.suffix_length) + ".edf"
+            # downloads are saved under the local name, so only the host names tell which are taken
+            if host not in self.names:
+                break
+        else:
+            raise ValueError(f"No unused host file name left for {local_name}.")
+
+        self.names[host] = local_name
+        self._save()
+        return host
+
+    def local_name(self, host_name:str) -> str:
+        """Returns the local file name of a host file name."""
+        return self.names.get(host_name, host_name)
+
+    def _load(self) -> dict:
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self) -> None:
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.names, f, indent=1)
+        os.replace(tmp, self.path)
@@ -8,8 +8,20 @@ import os
 
 from typing import Tuple
 
-from .utils import Target, MultiLineText
+from .utils import Target, MultiLineText, CameraDisplay, PSYCHOPY_KEYS
 from ..utils import *
+from ..interest_areas import send_interest_areas
+from ..realtime import apply_realtime
+from ..backdrop import BackdropManager
+from ..download import DownloadTask, receive_verified
+from ..session import session_path
+from ..naming import EdfNameAllocator
+from ..history import SampleHistory
+from ..link import LinkReader
+from ..setup import SetupStateMachine
+from ..fixation import FixationDetector
+from ..drift import DriftEstimator, DriftTrendMonitor
+from ..accuracy import QuickCheck, QuickCheckResult, check_targets
 
 
 class EyeConnector():
@@ -18,7 +30,7 @@ class EyeConnector():
         """Create connector object to communicate with an EyeLink 1000+.
         Args:
             win (pygame.Surface): Surface to draw to during setup.
-            host (str, optional): IP of the EyeLink Host PC. Defaults to "100.1.1.1".
+            host (str, optional): IP of the EyeLink Host PC, or a replay.ReplayEyeLink to run without tracker. Defaults to "100.1.1.1".
             eye (str, optional): Choose which eye to track. Options: ["both", "right", "left"]. Defaults to "both".
             prefix (str, optional): Session prefix. Will be added to all files handled by this connection. 
                                     Could, e.g., combine experiment and participant ID. Defaults to "".
@@ -29,6 +41,10 @@ class EyeConnector():
         self.kb = keyboard.Keyboard()
         self.host = host
         self.eyelink = self.connect(host)
+        self.link = LinkReader(self.eyelink) # shared reader of the link data queue
+        self.backdrop = BackdropManager(self.eyelink) # backdrop and feedback graphics on the Host PC
+        self.setup = SetupStateMachine(self) # backend independent setup, drawn by this connector
+        self.camera = None # CameraDisplay, created by showCameraImage
 
         assert(eye.lower() in ["both", "right", "left"])
         self.eye = eye.lower()
@@ -48,20 +64,32 @@ class EyeConnector():
         self.v_status = 1000 # validation status: success = 0
         self.d_status = 1000 # drift correction status: success = 0
         self.callback = None
+        self.recording_listeners = [] # objects with on_recording_start(connector, msg) and on_recording_stop(connector)
+        self.sample_history = None # SampleHistory filled by getEyeSample, see enableSampleHistory
+        self.drift_estimator = None # DriftEstimator fed by getEyeSample, see enableDriftEstimation
+        self.drift_monitor = None # DriftTrendMonitor, see enableDriftMonitor
 
         # for the more fanciful interface
         self.v_error = None
+        self.v_result = None # validation.ValidationResult of the last accepted validation
         self._v_msg = ""
         self._drift_correct_direct_return = True
 
         # housekeeping
         self.prefix = prefix
         self.download_directory = download_directory
-        self.edf_file_name = ""
+        self.edf_file_name = "" # local file name
+        self.host_file_name = "" # file name on the Host PC, see naming.EdfNameAllocator
+        self.file_block = 0 # number of files opened by openFile and rotateFile
+        self._file_base = ""
         self.isFileOpen = False
+        self._setup_text = None
         self.sample_rate = sample_rate
+        self._iarea_sent = set() # interest areas sent in the current trial
+        self.realtime = [] # reports of setRealtimeMode
 
         os.makedirs(self.download_directory, exist_ok=True)
+        self.edf_names = EdfNameAllocator(self.download_directory)
 
         # assume the whole monitor is used. Get resolution from system.
         self._w, self._h = win.size
@@ -87,8 +115,11 @@ class EyeConnector():
 
 
     ### CONNECTION
-    def connect(self, host:str):
-        """opens a connection to the EyeLink 100+ Host PC. Make sure to close an open connection."""
+    def connect(self, host):
+        """opens a connection to the EyeLink 100+ Host PC. Make sure to close an open connection.
+        host can also be an object implementing the pylink.EyeLink API, e.g. replay.ReplayEyeLink, which is used as is."""
+        if not isinstance(host, str):
+            return host
         return pylink.EyeLink(host)
 
     def close(self):
@@ -96,33 +127,66 @@ class EyeConnector():
         Returns:
             int: 0 on success. Oterhwise link error returned by device.
         """
+        self.backdrop.close()
+        if self.sample_history is not None:
+            if self.sample_history in self.recording_listeners:
+                self.recording_listeners.remove(self.sample_history)
+            self.sample_history.close()
+            self.sample_history = None
         if self.eyelink.isConnected():
             self.closeFile()
             self.eyelink.setOfflineMode()
             return self.eyelink.close()
         else:
             return 0
+
+    def setRealtimeMode(self, cores:list|None=None, priority:int|None=50, whole_process:bool=False,
+                        render_thread_id:int|None=None, render_cores:list|None=None) -> list:
+        """Pins the thread reading samples (the calling thread) to the given cores and requests SCHED_FIFO scheduling.
+        Falls back to a raised priority if real-time scheduling is not permitted. Linux only.
+        Args:
+            cores (list|None, optional): CPU cores for sample reading. Defaults to None, i.e. affinity is not changed.
+            priority (int|None, optional): SCHED_FIFO priority (1-99). Defaults to 50. None keeps the scheduling policy.
+            whole_process (bool, optional): Apply to all threads of the process instead. Defaults to False.
+            render_thread_id (int|None, optional): Native id of a separate render thread. Defaults to None.
+            render_cores (list|None, optional): CPU cores for the render thread. Defaults to None.
+        Returns:
+            list[RealtimeReport]: What was actually applied. Also stored in self.realtime.
+        """
+        self.realtime = apply_realtime(cores, priority, whole_process=whole_process)
+        if render_thread_id is not None:
+            self.realtime += apply_realtime(render_cores, priority, thread_id=render_thread_id)
+        return self.realtime
     
 
     ### FILE HANDLING
-    def openFile(self, file_name:str) -> None:
+    def openFile(self, file_name:str) -> bool:
         """Opens an edf file on the EyeLink. 
         Args:
             file_name (str): The edf file name is self.prefix + "_" + file_name, if self.prefix is specified. 
-                Otherwise it is just file_name. Total fil name length must not exceed 8 characters.
+                Otherwise it is just file_name. Names longer than 8 characters are shortened on the Host PC
+                and restored on download, see naming.EdfNameAllocator.
+        Returns:
+            bool: False if no Host PC file name is left.
         """
         _pf = self.prefix + "_" if self.prefix != "" else ""
         self.edf_file_name = _pf + file_name
         if not self.edf_file_name.endswith(".edf"):
             self.edf_file_name += ".edf"
-        if len(self.edf_file_name.split(".")[0]) > 8:
-            print("ERROR (EyeLinkConnector): edf file name is too long. Must be shorter or equal 8 characters.")
+        # the Host PC only accepts 8 characters. Longer names are mapped to a short name for the transfer.
+        try:
+            self.host_file_name = self.edf_names.allocate(self.edf_file_name)
+        except ValueError as e:
+            print(f"ERROR (EyeLinkConnector): {e}")
             return False
+        self._file_base = file_name[:-4] if file_name.endswith(".edf") else file_name
+        self.file_block = 1
 
-        self.eyelink.openDataFile(self.edf_file_name)
+        self.eyelink.openDataFile(self.host_file_name)
 
         # set header information
         self.eyelink.sendCommand(f"add_file_preamble_text 'RECORDED BY Pylink-Pygame Connector tagged {self.prefix}'")
+        self.eyelink.sendMessage(f"EDF_FILE_NAME {self.edf_file_name} HOST {self.host_file_name}")
 
         # define coordinate system [LEFT, TOP, RIGHT, BOTTOM]
         self.eyelink.sendMessage(f"DISPLAY_COORDS {-self._w/2} {self._h/2} {self._w/2} {-self._h/2}") # DISPLAY_COORDS msg is used by the DATA VIEWER
@@ -145,7 +209,7 @@ class EyeConnector():
         self.eyelink.setFileSampleFilter(file_sample_flags) # command file_sample_data
 
         # ... and make them available via link
-        link_event_flags = _eye_identifier + 'FIXATION,SACCADE,BLINK,BUTTON,FIXUPDATE,INPUT'
+        link_event_flags = _eye_identifier + 'FIXATION,SACCADE,BLINK,MESSAGE,BUTTON,FIXUPDATE,INPUT'
         link_sample_flags = _eye_identifier + 'GAZE,GAZERES,AREA,HTARGET,STATUS,INPUT'
         self.eyelink.sendCommand(f"link_event_filter = {link_event_flags}")
         self.eyelink.sendCommand(f"link_sample_data = {link_sample_flags}")
@@ -154,6 +218,7 @@ class EyeConnector():
 
         # switch flag for housekeeping
         self.isFileOpen = True
+        return True
 
     def closeFile(self) -> None:
         """Sets the tracker to offline mode and closes the currently opened edf file"""
@@ -163,10 +228,99 @@ class EyeConnector():
         # switch flag for housekeeping
         self.isFileOpen = False
 
-    def downloadFile(self) -> None:
-        """Closes open file and downloads it to self.download_directory."""
+    def downloadFile(self, retries:int=3) -> int:
+        """Closes open file and downloads it to self.download_directory.
+        The received file is verified and the transfer is retried if it is incomplete.
+        Args:
+            retries (int, optional): Number of retries after a failed transfer. Defaults to 3.
+        Returns:
+            int: Size of the downloaded file in bytes. Raises IOError if all attempts failed.
+        """
+        self.closeFile()
+        return receive_verified(self.eyelink, self.host_file_name, self.download_directory + self.edf_file_name, retries)
+
+    def rotateFile(self, file_name:str|None=None, download:bool=True, retries:int=3) -> int:
+        """Closes the current edf file and continues in a new one, e.g. at the start of every block.
+        Smaller files can be downloaded during breaks instead of one large transfer at the end.
+        Args:
+            file_name (str|None, optional): Name of the new file, see openFile.
+                Defaults to None, i.e. the name passed to openFile with the block number appended, e.g. "exp_2".
+            download (bool, optional): Download the closed file with a progress screen before opening the new one.
+                Defaults to True.
+            retries (int, optional): Number of retries after a failed transfer. Defaults to 3.
+        Returns:
+            int: Size of the downloaded file in bytes. 0 if it was not downloaded.
+                Raises IOError if the transfer failed or the new file could not be opened,
+                InterruptedError if the transfer was cancelled.
+        """
+        base, block = self._file_base, self.file_block + 1
+        try:
+            if download:
+                # the window stays responsive during the transfer
+                return self.showDownloadProgress(self.downloadFileAsync(retries)).result()
+            self.closeFile()
+            return 0
+        finally:
+            # the next block is recorded even if the transfer failed
+            self._openNextFile(file_name, base, block)
+
+    def _openNextFile(self, file_name:str|None, base:str, block:int) -> None:
+        """Opens the file following a rotated one. Should not be called directly."""
+        name = f"{base}_{block}" if file_name is None else file_name
+        if not self.openFile(name):
+            raise IOError(f"Could not open {name} on the Host PC.")
+        if file_name is None:
+            self._file_base, self.file_block = base, block
+
+    def sessionPath(self) -> str:
+        """Returns the directory a converted session of the current edf file is stored in, see session.save_session."""
+        return session_path(self.download_directory, self.edf_file_name)
+
+    def downloadFileAsync(self, retries:int=3) -> DownloadTask:
+        """Closes open file and starts downloading it to self.download_directory in a background thread.
+        Keep rendering and call task.poll() to update its progress, or use showDownloadProgress.
+        Do not use the connector until the download is done.
+        Args:
+            retries (int, optional): Number of retries after a failed transfer. Defaults to 3.
+        Returns:
+            DownloadTask: The running transfer.
+        """
         self.closeFile()
-        self.eyelink.receiveDataFile(self.edf_file_name, self.download_directory + self.edf_file_name)
+        return DownloadTask(self.eyelink, self.host_file_name, self.download_directory + self.edf_file_name, retries).start()
+
+    def showDownloadProgress(self, task:DownloadTask) -> DownloadTask:
+        """Shows a progress screen until the download is done. Q/ESC cancels the download.
+        Args:
+            task (DownloadTask): Transfer started with downloadFileAsync.
+        Returns:
+            DownloadTask: The finished transfer.
+        """
+        mlText = None
+        received = -1
+        while True:
+            # handle events
+            for key in self.kb.getKeys():
+                if key == 'q' or key == 'escape':
+                    task.cancel()
+
+            # only re-render the text if the progress changed
+            if (task.poll() != received) or (mlText is None):
+                received = task.bytes_received
+                text = f"DOWNLOAD:\
+                    \n\t> {task.progress_text()}\
+                    \n\nPress Q/ESC to cancel."
+                mlText = MultiLineText(self.win, text)
+
+            if task.done():
+                break
+
+            # render text
+            mlText.render()
+
+            # update window
+            self.win.flip()
+
+        return task
 
 
     ### TRACKING
@@ -181,6 +335,10 @@ class EyeConnector():
 
         timestamp = datetime.datetime.now()
         self.eyelink.sendMessage(f"TIMESTAMP {timestamp} - START OF TRIAL {msg}")
+        # notify listeners before recording, so their setup does not delay the first samples
+        for listener in self.recording_listeners:
+            listener.on_recording_start(self, msg)
+
         # arguments: sample_to_file, events_to_file, sample_over_link, event_over_link 
         self.eyelink.startRecording(1, 1, 1, 1)
 
@@ -191,9 +349,87 @@ class EyeConnector():
         timestamp = datetime.datetime.now()
         self.eyelink.sendMessage(f"TIMESTAMP {timestamp} - END OF TRIAL {self.trial_msg}")
         self.eyelink.stopRecording()
+        self._iarea_sent = set()
+
+        for listener in self.recording_listeners:
+            listener.on_recording_stop(self)
+
+    def sendInterestAreas(self, areas:list) -> int:
+        """Sends interest areas to the edf file as one block of `!V IAREA RECTANGLE` messages.
+        Duplicates and areas already sent in the current trial are skipped.
+        Args:
+            areas (list[InterestArea]): Interest areas in tracker coordinates, e.g. from MultiLineText.interest_areas().
+        Returns:
+            int: Number of interest areas sent.
+        """
+        return send_interest_areas(self.eyelink, areas, self._iarea_sent)
 
 
     ### COMMUNICATION
+    def enableSampleHistory(self, directory:str|None=None) -> SampleHistory:
+        """Keeps all samples of the session in a memory-mapped SampleHistory, e.g. for history.last(3000) or history.trial(-1).
+        Samples queued on the link are stored with every getEyeSample call and at the end of every trial.
+        Args:
+            directory (str|None, optional): Directory of the history files. Defaults to None, i.e. a temporary directory.
+        Returns:
+            SampleHistory: The history, also stored in self.sample_history.
+        """
+        self.sample_history = SampleHistory(directory)
+        self.sample_history.drift_estimator = self.drift_estimator
+        self.recording_listeners.append(self.sample_history)
+        return self.sample_history
+
+    def enableDriftEstimation(self, apply:bool=False, **kwargs) -> DriftEstimator:
+        """Estimates the drift from fixations on reference points during recording, e.g. a central fixation cross:
+        call self.drift_estimator.set_reference((x, y)) while it is shown. The estimate is written to the edf file
+        at the end of each trial.
+        Args:
+            apply (bool, optional): Correct the gaze of getEyeSample and of the sample history by the estimate. Defaults to False.
+            **kwargs: Thresholds of the reference fixations, see DriftEstimator.
+        Returns:
+            DriftEstimator: The estimator, also stored in self.drift_estimator.
+        """
+        self.drift_estimator = DriftEstimator(apply=apply, **kwargs)
+        self.recording_listeners.append(self.drift_estimator)
+        if self.sample_history is not None:
+            self.sample_history.drift_estimator = self.drift_estimator
+        if self.drift_monitor is not None:
+            self.drift_monitor.estimator = self.drift_estimator
+        return self.drift_estimator
+
+    def enableDriftMonitor(self, **kwargs) -> DriftTrendMonitor:
+        """Collects the offsets of drift corrections, quick checks and the drift estimator (if enabled) to tell
+        when a correction is actually needed, see recommendedCorrection.
+        Args:
+            **kwargs: Thresholds in degrees and trend settings, see DriftTrendMonitor. Without pixels_per_degree the resolution
+                is taken from the first drift check, quick check or sample that reports it.
+        Returns:
+            DriftTrendMonitor: The monitor, also stored in self.drift_monitor.
+        """
+        self.drift_monitor = DriftTrendMonitor(**kwargs)
+        self.drift_monitor.estimator = self.drift_estimator
+        return self.drift_monitor
+
+    def recommendedCorrection(self) -> str:
+        """Returns "none", "drift_correction" or "recalibration" according to the drift monitor,
+        e.g. to only drift correct before a trial when needed. "none" if no monitor is enabled."""
+        if self.drift_monitor is None:
+            return "none"
+        return self.drift_monitor.recommend(self.eyelink.trackerTime())
+
+    def enableAutoAccept(self, dispersion:float=40., duration:float=300., max_distance:float|None=120.) -> FixationDetector:
+        """Accepts calibration, validation and drift correction targets when the gaze rests on them, e.g. for setups without operator.
+        SPACE still works. Set self.setup.auto_accept = None to disable it again.
+        Args:
+            dispersion (float, optional): Maximum dispersion of the fixation in px. Defaults to 40.
+            duration (float, optional): Minimum fixation duration in ms. Defaults to 300.
+            max_distance (float|None, optional): Maximum distance to the target in px. Not applied during the calibration. Defaults to 120.
+        Returns:
+            FixationDetector: The detector, also stored in self.setup.auto_accept.
+        """
+        self.setup.auto_accept = FixationDetector(dispersion, duration, max_distance)
+        return self.setup.auto_accept
+
     def getEyeSample(self) -> Tuple[Sample, Sample] | Sample:
         """Return the latest eye sample. A sample contains 
             Gaze position as (x, y) in px
@@ -207,17 +443,23 @@ class EyeConnector():
             Tuple[Sample, Sample]: Sample of the Left and Sample of the Right eye.
         """
         s = self.eyelink.getNewestSample()
+        if self.sample_history is not None:
+            self.sample_history.poll(self.link)
+        if self.drift_estimator is not None:
+            self.drift_estimator.update(s)
+        if self.drift_monitor is not None:
+            self.drift_monitor.update_resolution(s)
 
         if self.eye == "both":
             if s.isLeftSample():
                 l = s.getLeftEye()
-                ls = Sample(l.getGaze(), l.getHREF(), l.getRawPupil(), l.getPupilSize())
+                ls = self._eyeSample(l, "left")
             else:
                 ls = self.dummy_sample
 
             if s.isRightSample():
                 r = s.getRightEye()
-                rs = Sample(r.getGaze(), r.getHREF(), r.getRawPupil(), r.getPupilSize())
+                rs = self._eyeSample(r, "right")
             else:
                 rs = self.dummy_sample
 
@@ -226,13 +468,13 @@ class EyeConnector():
             if s.isLeftSample():
                 if self.eye == "left":
                     l = s.getLeftEye()
-                    return Sample(l.getGaze(), l.getHREF(), l.getRawPupil(), l.getPupilSize())
+                    return self._eyeSample(l, "left")
                 else:
                     raise(ValueError, "Expected left eye sample but received right eye sample.")
             elif s.isRightSample():
                 if self.eye == "right":
                     r = s.getRightEye()
-                    return Sample(r.getGaze(), r.getHREF(), r.getRawPupil(), r.getPupilSize())
+                    return self._eyeSample(r, "right")
                 else:
                     raise(ValueError, "Expected right eye sample but received left eye sample.")
             else:
@@ -240,191 +482,50 @@ class EyeConnector():
                 # return self.dummy_sample
 
 
-    ####################### PYGAME specific
-    ### GENERAL SETUP ENTRY
-    def runSetup(self) -> None:
-        """Possible entry point. Requires an opened edf file on the host PC.
-        Show the steup screen from which calibration, validation and drift-correction can be started.
-        """
-        assert(self.isFileOpen)
-
-        # enter setup mode
-        self.eyelink.startSetup()
-
-        # hide mouse if shown
-        _mousWasVisible = self.win.mouseVisible
-        self.win.setMouseVisible(False)
-
-        # show calibration info screen
-        done = False
-        text = f"STATUS:\
-            \n\nCalibration: {STATUS_MSGS[self.c_status]}\
-            \nValidation: {STATUS_MSGS[self.v_status]}{f' - avg. error: {self.v_error} °' if self.v_error is not None else ''}\
-            \n\n\tPress C to {'(re)' if self.c_status != 1000 else ''}calibrate.\
-            \n\tPress V to {'(re)' if self.v_status != 1000 else ''}validate.\
-            \n\tPress D to drift correct.\
-            \n\tPress Q/ENTER to quit setup and continue.\
-            \n\nUse SPACE to manually accept a fixation."
-        mlText = MultiLineText(self.win, text)
-
-        # clear key events
-        self.kb.clearEvents()
-
-        while not done:
-            # handle events
-            for key in self.kb.getKeys():
-                if key == 'c':
-                    msg = self.calibrate()
-                    # Update the status text
-                    text = f"STATUS:\
-                        \n\t>{msg}\
-                        \n\nCalibration: {STATUS_MSGS[self.c_status]}\
-                        \nValidation: {STATUS_MSGS[self.v_status]}{f' - avg. error: {self.v_error} °' if self.v_error is not None else ''}\
-                        \n\n\tPress C to {'(re)' if self.c_status != 1000 else ''}calibrate.\
-                        \n\tPress V to {'(re)' if self.v_status != 1000 else ''}validate.\
-                        \n\tPress D to drift correct.\
-                        \n\tPress Q/ENTER to quit setup and continue.\
-                        \n\nUse SPACE to manually accept a fixation."
-                    mlText = MultiLineText(self.win, text)
-                elif key == 'v':
-                    msg = self.validate()
-                    # Update the status text
-                    text = f"STATUS:\
-                        \n\t>{msg}\
-                        \n\nCalibration: {STATUS_MSGS[self.c_status]}\
-                        \nValidation: {STATUS_MSGS[self.v_status]}{f' - avg. error: {self.v_error} °' if self.v_error is not None else ''}\
-                        \n\n\tPress C to {'(re)' if self.c_status != 1000 else ''}calibrate.\
-                        \n\tPress V to {'(re)' if self.v_status != 1000 else ''}validate.\
-                        \n\tPress D to drift correct.\
-                        \n\tPress Q/ENTER to quit setup and continue.\
-                        \n\nUse SPACE to manually accept a fixation."
-                    mlText = MultiLineText(self.win, text)
-                elif key == 'd':
-                    msg = self.driftCorrect()
-                    # Update the status text
-                    text = f"STATUS:\
-                        \n\t>{msg}\
-                        \n\nCalibration: {STATUS_MSGS[self.c_status]}\
-                        \nValidation: {STATUS_MSGS[self.v_status]}{f' - avg. error: {self.v_error} °' if self.v_error is not None else ''}\
-                        \n\n\tPress C to {'(re)' if self.c_status != 1000 else ''}calibrate.\
-                        \n\tPress V to {'(re)' if self.v_status != 1000 else ''}validate.\
-                        \n\tPress D to drift correct.\
-                        \n\tPress Q/ENTER to quit setup and continue.\
-                        \n\nUse SPACE to manually accept a fixation."
-                    mlText = MultiLineText(self.win, text)
-                elif key == 'q' or key == "return":
-                    done = True
-
-            # render text
-            mlText.render()
-
-            # update window
-            self.win.flip()
-
-
-        self.eyelink.setOfflineMode()
+    def _eyeSample(self, e, eye:str) -> Sample:
+        gaze = e.getGaze()
+        if (self.drift_estimator is not None) and self.drift_estimator.apply:
+            gaze = self.drift_estimator.correct(gaze, eye)
+        return Sample(gaze, e.getHREF(), e.getRawPupil(), e.getPupilSize())
 
-        # show mouse if it was shown
-        self.win.setMouseVisible(_mousWasVisible)
 
-        return
-            
-    ### CALIBRATION 
-    def calibrate(self) -> None:
-        """Possible entry point. Requires an opened edf file on the host PC.
-        Performs the calibration. Shows a status screen when done.
-        Upon exiting the status screen, a status message is returned.
+    ####################### PSYCHOPY specific
+    ### SETUP
+    def stepSetup(self, keys:list, redraw_unchanged:bool=True) -> bool:
+        """Advances the setup by one frame and draws it without flipping the window,
+        so the setup can run inside your own frame loop. Start it with self.setup.start(...).
+        Args:
+            keys (list): Keys of this frame, e.g. from self.kb.getKeys().
+            redraw_unchanged (bool, optional): Also draw if nothing changed (self.setup.frame.changed).
+                Needed if the window is flipped every frame. Defaults to True.
+        Returns:
+            bool: True while the setup is running.
         """
-        assert(self.isFileOpen)
-
-        # enter setup mode
-        self.eyelink.startSetup()
-
-        # hide mouse if shown
-        _mousWasVisible = self.win.mouseVisible
-        self.win.setMouseVisible(False)
-
-        # configure calibration
-        self.eyelink.setCalibrationType("HV9")
-        self.eyelink.sendCommand("calibration_area_proportion = 0.5 0.5")
-        self.eyelink.sendCommand("validation_area_proportion = 0.5 0.5")
-
-        # start calibration on host
-        self.eyelink.sendKeybutton(C_KEY, 0, pylink.KB_PRESS)
-        self.eyelink.sendKeybutton(C_KEY, 0, pylink.KB_RELEASE)
-        self.eyelink.setAcceptTargetFixationButton(SPACE_KEY)
-
-        # clear key events
-        self.kb.clearEvents()
-
-        # DO calibration
-        msg = ""
-        done = False
+        keys = [PSYCHOPY_KEYS[k] for k in (getattr(k, "name", k) for k in keys) if k in PSYCHOPY_KEYS]
+        frame = self.setup.step(keys)
+        if frame.mode == "done":
+            return False
+        if not (frame.changed or redraw_unchanged):
+            return True
 
-        while not done:
-            # handle events
-            for key in self.kb.getKeys():
-                if key == 'space':
-                    # (manually) accept target fixation
-                    self.eyelink.sendKeybutton(SPACE_KEY, 0, pylink.KB_PRESS)
-                    self.eyelink.sendKeybutton(SPACE_KEY, 0, pylink.KB_RELEASE)
-                if key == 'backspace':
-                    # repeat previous target
-                    self.eyelink.sendKeybutton(BACKSPACE_KEY, 0, pylink.KB_PRESS)
-                    self.eyelink.sendKeybutton(BACKSPACE_KEY, 0, pylink.KB_RELEASE)
-                elif key == 'q' or key == "escape":
-                    self.eyelink.sendKeybutton(ESC_KEY, 0, pylink.KB_PRESS)
-                    self.eyelink.sendKeybutton(ESC_KEY, 0, pylink.KB_RELEASE)
-                    self.c_status = 27
-                    msg = "Calibration was aborted."
-                    done = True
-
-            # get calibration target position
-            p = self.eyelink.getTargetPositionAndState()
-            if p[0]:
-                self.target.set_x(p[1])
-                self.target.set_y(p[2])
+        if frame.mode == "text":
+            if frame.changed or (self._setup_text is None):
+                self._setup_text = MultiLineText(self.win, frame.text)
+            self._setup_text.render()
+        else:
+            if frame.target is not None:
+                self.target.set_pos(frame.target)
                 self.target.show()
             else:
                 self.target.hide()
-
-            # check if calibration ended
-            c = self.eyelink.getCalibrationResult()
-            if c != 1000:
-                self.c_status = c
-                msg = self.eyelink.getCalibrationMessage()
-                done = True
-
-            # render target
             self.target.render()
+        return True
 
-            # update
-            self.win.flip()
-
-        # show mouse if it was shown
-        self.win.setMouseVisible(_mousWasVisible)
-
-        self._showCalibrationDoneScreen(msg=f"Calibration status: {STATUS_MSGS[self.c_status]}. Result: {msg}")
-
-    def _showCalibrationDoneScreen(self, msg:str="") -> str:
-        """Shows calibration results. Should not be called directly.
-            May call calibrate (again) or validate from here.
-            Upon exit, a status message is returend
-
-        Args:
-            msg (str, optional): Message to display. Defaults to "".
-
+    def _runSetupLoop(self) -> str:
+        """Runs the started setup until it ended. Should not be called directly.
         Returns:
             str: Last actions status message.
-        """    
-        text = f"Calibration {STATUS_MSGS[self.c_status]}\
-            \n\t> {msg}\
-            \nPress ENTER to accept the calibration and continue.\
-            \nPress C to calibrate again.\
-            \nPress V to validate.\
-            \nPress BACKSPACE/ DELETE to discard the calibration and return."
-        mlText = MultiLineText(self.win, text)
-
+        """
         # hide mouse if shown
         _mousWasVisible = self.win.mouseVisible
         self.win.setMouseVisible(False)
@@ -432,193 +533,110 @@ class EyeConnector():
         # clear key events
         self.kb.clearEvents()
 
-        callback = None
-        msg = ""
-        done = False
-        while not done:
-            # handle events
-            for key in self.kb.getKeys():
-                if key == 'return':
-                    # accept calibration.
-                    self.eyelink.sendKeybutton(ENTER_KEY, 0, pylink.KB_PRESS)
-                    self.eyelink.sendKeybutton(ENTER_KEY, 0, pylink.KB_RELEASE)
-                    callback = None
-                    msg = "Calibration accepted."
-                    done = True
-                if key == 'c':
-                    # restart calibration on tracker
-                    self.eyelink.sendKeybutton(DELETE_KEY, 0, pylink.KB_PRESS)
-                    self.eyelink.sendKeybutton(DELETE_KEY, 0, pylink.KB_RELEASE)
-                    callback = self.calibrate
-                    done = True
-                if key == 'v':
-                    callback = self.validate
-                    done = True
-                if key == 'backspace' or key == 'delete':
-                    # Discard calibration without repeating
-                    self.eyelink.sendKeybutton(ESC_KEY, 0, pylink.KB_PRESS)
-                    self.eyelink.sendKeybutton(ESC_KEY, 0, pylink.KB_RELEASE)
-                    self.c_status = 1000
-                    callback = None
-                    msg = "Calibration discarded."
-                    done = True
+        self._setup_text = None
+        keys = self.kb.getKeys()
+        while self.stepSetup(keys, redraw_unchanged=False):
+            # update window only if the screen changed
+            if self.setup.frame.changed:
+                self.win.flip()
 
-            # render text
-            mlText.render()
-
-            # update
-            self.win.flip()
+            if self.setup.idle:
+                # static screen: wait for keys instead of flipping
+                keys = self.kb.waitKeys(maxWait=self.setup.idle_timeout) or []
+            else:
+                if not self.setup.frame.changed:
+                    # wait for the next poll
+                    core.wait(self.setup.poll_interval, hogCPUperiod=0)
+                keys = self.kb.getKeys()
 
-        # show mouse if it was visible
+        # show mouse if it was shown
         self.win.setMouseVisible(_mousWasVisible)
 
-        if callback is not None:
-            return callback()
-        else:
-            return msg
-
+        return self.setup.message
 
-    ### VALIDATION
-    def validate(self) -> None:
-        """Possible entry point. Requires an opened edf file and successfull calibration on the host PC.
-        Performs the validation. Shows a status screen when done.
-        Should be called from the calibration-done-screen or the setup-screen.
-        Calling from the experiment directly may cause problems.
-        Upon exiting the status screen, a status message is returned.
+    def showCameraImage(self) -> None:
+        """Shows the eye camera image. Keys are forwarded to the tracker, e.g. arrow keys to switch the camera view.
+        The tracker only sends the image within pylink's tracker setup, so this blocks until it is left with ESC.
+        Also available with E on the setup status screen.
         """
-        assert(self.isFileOpen)
-
-        # start validation process
-        self.eyelink.sendKeybutton(V_KEY, 0, pylink.KB_PRESS)
-        self.eyelink.sendKeybutton(V_KEY, 0, pylink.KB_RELEASE)
-        self.eyelink.setAcceptTargetFixationButton(SPACE_KEY)
+        if self.camera is None:
+            self.camera = CameraDisplay(self.win, self.target, self.kb)
+            pylink.openGraphicsEx(self.camera)
+        self.eyelink.doTrackerSetup()
+
+    def quickCheck(self, n_targets:int=5, duration:float=1., max_error:float=1., area:float=.5, **kwargs) -> QuickCheckResult:
+        """Fast accuracy check, e.g. between blocks: shows the targets one after another while recording over the link only
+        and evaluates accuracy and precision locally. Takes n_targets * duration seconds and does not enter setup mode.
+        Call it while not recording.
+        Args:
+            n_targets (int, optional): 1 to 5 targets: center, then corners. Defaults to 5.
+            duration (float, optional): Time each target is shown in s. Defaults to 1.
+            max_error (float, optional): Largest accepted error of any target in degrees. Defaults to 1.
+            area (float, optional): Proportion of the screen covered by the targets. Defaults to .5.
+            **kwargs: Further arguments of accuracy.QuickCheck, e.g. pixels_per_degree. Without it and without the
+                resolution reported by the tracker, the results are in px and passed is None.
+        Returns:
+            QuickCheckResult: passed, accuracy, max_error and precision in degrees and the results per target.
+                passed is None if the resolution is unknown.
+        """
+        targets = check_targets(n_targets, (0, 0), (self._w, self._h), area)
+        check = QuickCheck(self.eyelink, targets, duration, max_error=max_error, link=self.link, **kwargs)
 
         # hide mouse if shown
         _mousWasVisible = self.win.mouseVisible
         self.win.setMouseVisible(False)
 
-        # clear key events
-        self.kb.clearEvents()
-
-        # DO validation
-        msg = ""
-        done = False
-        while not done:
-            # handle events
-            keys = self.kb.getKeys()
-            for key in keys:
-                if key == 'space':
-                    # (manually) accept target fixation
-                    self.eyelink.sendKeybutton(SPACE_KEY, 0, pylink.KB_PRESS)
-                    self.eyelink.sendKeybutton(SPACE_KEY, 0, pylink.KB_RELEASE)
-                if key == 'backspace':
-                    # repeat previous target
-                    self.eyelink.sendKeybutton(BACKSPACE_KEY, 0, pylink.KB_PRESS)
-                    self.eyelink.sendKeybutton(BACKSPACE_KEY, 0, pylink.KB_RELEASE)
-
-                if key == 'q' or key == 'escape':
-                    self.eyelink.sendKeybutton(ESC_KEY, 0, pylink.KB_PRESS)
-                    self.eyelink.sendKeybutton(ESC_KEY, 0, pylink.KB_RELEASE)
-                    self.v_status = 27
-                    msg = "Validation was aborted."
-                    done = True
-
-            # get validation target position
-            p = self.eyelink.getTargetPositionAndState()
-            if p[0]:
-                self.target.set_x(p[1])
-                self.target.set_y(p[2])
+        check.start()
+        while check.running:
+            target = check.step()
+            if target is not None:
+                self.target.set_pos(target)
                 self.target.show()
-            else:
-                self.target.hide()
-
-            # check if validation ended
-            v = self.eyelink.getCalibrationResult()
-            if v != 1000:
-                self.v_status = v
-                msg = self.eyelink.getCalibrationMessage()
-                done = True
-
-            # render target
-            self.target.render()
-
-            # update
+                self.target.render()
             self.win.flip()
 
-        # show mouse if it was visible
+        # show mouse if it was shown
         self.win.setMouseVisible(_mousWasVisible)
+        if self.drift_monitor is not None:
+            self.drift_monitor.add_quick_check(self.eyelink.trackerTime(), check.result)
+        return check.result
 
-        self._showValidationDoneScreen(msg=f"Validation status: {STATUS_MSGS[self.v_status]}. Result: {msg}")
-
-    def _showValidationDoneScreen(self, msg:str="") -> str:
-        """Shows validation results. Should not be called directly.
-            May call validate again from here.
-            Upon exit, a status message is returend
+    ### GENERAL SETUP ENTRY
+    def runSetup(self) -> str:
+        """Possible entry point. Requires an opened edf file on the host PC.
+        Show the steup screen from which calibration, validation and drift-correction can be started.
 
-        Args:
-            msg (str, optional): Message to display. Defaults to "".
-            
         Returns:
             str: Last actions status message.
-        """    
-        text = f"Validation {STATUS_MSGS[self.v_status]}\
-            \n\t> {msg}\
-            \nPress ENTER to accept the validation and continue.\
-            \nPress V to validate again.\
-            \nPress BACKSPACE/ DELETE to discard the validation."
-        mlText = MultiLineText(self.win, text)
-
-        # hide mouse if shown
-        _mousWasVisible = self.win.mouseVisible
-        self.win.setMouseVisible(False)
-
-        # clear key events
-        self.kb.clearEvents()
-
-        callback = None
-        msg = None
-        done = False
-        while not done:
-            # handle events
-            for key in self.kb.getKeys():
-                if key == 'return':
-                    # accept validation.
-                    self.eyelink.sendKeybutton(ENTER_KEY, 0, pylink.KB_PRESS)
-                    self.eyelink.sendKeybutton(ENTER_KEY, 0, pylink.KB_RELEASE)
-                    callback = None
-                    msg = "Validation accepted."
-                    done = True
-
-                if key == 'v':
-                    # restart validation on tracker
-                    self.eyelink.sendKeybutton(DELETE_KEY, 0, pylink.KB_PRESS)
-                    self.eyelink.sendKeybutton(DELETE_KEY, 0, pylink.KB_RELEASE)
-                    callback = self.validate
-                    done = True
-
-                if key == 'backspace' or key == 'delete':
-                    # Discard validation without repeating
-                    self.eyelink.sendKeybutton(ESC_KEY, 0, pylink.KB_PRESS)
-                    self.eyelink.sendKeybutton(ESC_KEY, 0, pylink.KB_RELEASE)
-                    self.v_status = 1000
-                    callback = None
-                    msg = "Validation discarded."
-                    done = True
-
-            # render text
-            mlText.render()
-
-            # update
-            self.win.flip()
+        """
+        assert(self.isFileOpen)
+        self.setup.start("status")
+        return self._runSetupLoop()
 
-        # show mouse if it was visible
-        self.win.setMouseVisible(_mousWasVisible)
+    ### CALIBRATION 
+    def calibrate(self) -> str:
+        """Possible entry point. Requires an opened edf file on the host PC.
+        Performs the calibration. Shows a status screen when done.
+        Upon exiting the status screen, a status message is returned.
+        """
+        assert(self.isFileOpen)
+        self.setup.start("calibration", return_to_status=False)
+        return self._runSetupLoop()
 
-        if callback is not None:
-            return callback()
-        else:
-            return msg
+    ### VALIDATION
+    def validate(self, failed_only:bool=False) -> str:
+        """Possible entry point. Requires an opened edf file and successfull calibration on the host PC.
+        Performs the validation. Shows a status screen when done.
+        Calling from the experiment directly may cause problems.
+        Upon exiting the status screen, a status message is returned.
 
+        Args:
+            failed_only (bool, optional): Only repeat the points of the last validation with an error above
+                self.setup.revalidation_threshold. Defaults to False.
+        """
+        assert(self.isFileOpen)
+        self.setup.start("validation", return_to_status=False, failed_only=failed_only)
+        return self._runSetupLoop()
 
     ### DRIFT CORRECTION
     def driftCorrect(self) -> str:
@@ -629,57 +647,6 @@ class EyeConnector():
         Returns:
             str: drift correction result
         """
-        # position target and make visible
-        self.target.set_pos([0,0])
-        self.target.show()
-
-        # hide mouse if shown
-        _mousWasVisible = self.win.mouseVisible
-        self.win.setMouseVisible(False)
-
-        self.eyelink.startDriftCorrect(self._w, self._h)
-        # make sure "Apply correction" is active
-        # ... TODO
-
-        # clear key events
-        self.kb.clearEvents()
-
-        done = False
-        while not done:
-            # handle events
-            for key in self.kb.getKeys():
-                if key == 'space':
-                    self.eyelink.sendKeybutton(SPACE_KEY, 0, pylink.KB_PRESS)
-                    self.eyelink.sendKeybutton(SPACE_KEY, 0, pylink.KB_RELEASE)
-
-                if key == 'q' or key == 'escape':
-                    # leave drift correct mode on tracker
-                    self.eyelink.sendKeybutton(ESC_KEY, 0, pylink.KB_PRESS)
-                    self.eyelink.sendKeybutton(ESC_KEY, 0, pylink.KB_RELEASE)
-                    self.d_status = 27
-                    done = True
-
-            # get drift correct status
-            d = self.eyelink.getCalibrationResult()
-            if d != 1000:
-                self.d_status = d
-                d_msg = self.eyelink.getCalibrationMessage()
-                # print(f"> d_msg: {d_msg}")
-
-                r = self.eyelink.applyDriftCorrect()
-                # print(f"> drift res: {r}")
-
-                # enter setup mode
-                self.eyelink.startSetup()
-                done = True
-
-            # render target
-            self.target.render()
-
-            # update
-            self.win.flip()
-
-        # show mouse if it was visible
-        self.win.setMouseVisible(_mousWasVisible)
-
-        return f"Drift correction: {STATUS_MSGS[self.d_status]}"
+        # the window center is (0, 0) in the tracker coordinates set by openFile
+        self.setup.start("drift", return_to_status=False, drift_pos=(0, 0))
+        return self._runSetupLoop()
@@ -1,12 +1,23 @@
 import psychopy
-from psychopy.visual import Circle, TextStim, Window
+from psychopy.visual import Circle, TextStim, ImageStim, Window
+import numpy as np
 from ..utils import *
+from ..interest_areas import InterestArea
+from ..pyglet.utils import interest_areas_from_layout
+from .. import camera
 
 # Need to overwrite colors for psychopy
 BLACK = (-1, -1, -1)
 WHITE = (1, 1, 1)
 GREY = (0, 0, 0)
 
+# psychopy key name -> key name of setup.SetupStateMachine
+PSYCHOPY_KEYS = {
+    "c": "c", "v": "v", "d": "d", "e": "e", "r": "r", "q": "q",
+    "return": "enter", "num_enter": "enter", "escape": "escape", "space": "space",
+    "backspace": "backspace", "delete": "delete",
+}
+
 class Target():
     def __init__(self, win:Window, x=0, y=0, outer_color=WHITE, inner_color=BLACK):
         self.inner = Circle(win, pos=[x, y], radius=5, fillColor=inner_color, fillColorSpace="rgb")
@@ -67,3 +78,70 @@ class MultiLineText(TextStim):
         
     def render(self):
         self.draw()
+
+    def interest_areas(self, level:str="word") -> list:
+        """Returns interest areas of the text in pixels relative to the window centre (= tracker coordinates),
+        see interest_areas_from_stim.
+        Args:
+            level (str, optional): "word" or "character". Defaults to "word".
+        Returns:
+            list[InterestArea]: Interest areas in reading order.
+        """
+        return interest_areas_from_stim(self, level)
+
+
+def interest_areas_from_stim(stim:TextStim, level:str="word") -> list:
+    """Returns interest areas of a TextStim in pixels relative to the window centre (= tracker coordinates).
+    The boxes are taken from the pyglet label PsychoPy renders the text with, which is drawn at stim.posPix.
+    Requires a pyglet or glfw window. Rotation (ori) and flipped text are not supported. Lines are taken from explicit
+    line breaks, so wrapWidth must fit the longest line.
+    Args:
+        stim (TextStim): The text stimulus, e.g. a MultiLineText.
+        level (str, optional): "word" or "character". Defaults to "word".
+    Returns:
+        list[InterestArea]: Interest areas in reading order.
+    """
+    if getattr(stim, "_needSetText", False):
+        # the label is only rebuilt when the stimulus is drawn
+        stim.setText(stim.text, log=False)
+    if getattr(stim, "_pygletTextObj", None) is None:
+        raise AssertionError("Interest areas need a TextStim rendered by pyglet (winType 'pyglet' or 'glfw').")
+
+    x, y = stim.posPix
+    return [InterestArea(a.left + x, a.top + y, a.right + x, a.bottom + y, a.label)
+            for a in interest_areas_from_layout(stim._pygletTextObj, level)]
+
+
+class CameraDisplay(camera.CameraDisplay):
+    def __init__(self, win:Window, target:Target, kb, scale:int=2) -> None:
+        """Shows the eye camera image during EyeLink.doTrackerSetup, see camera.CameraDisplay.
+        Frames are written into one reused ImageStim.
+        """
+        super().__init__()
+        self.win = win
+        self.target_stim = target
+        self.kb = kb
+        self.scale = scale
+
+        self._stim = None
+        self._float = None
+
+    def poll(self) -> list:
+        return [getattr(k, "name", k) for k in self.kb.getKeys()]
+
+    def render(self) -> None:
+        if self.image_shown and self.image.frame > 0:
+            h, w = self.image.rgb.shape[:2]
+            if (self._stim is None) or (self._float.shape[:2] != (h, w)):
+                self._float = np.zeros((h, w, 3), dtype=np.float32)
+                self._stim = ImageStim(self.win, image=self._float, units="pix", size=(w * self.scale, h * self.scale))
+            # psychopy colors range from -1 to 1
+            np.multiply(self.image.rgb, 2. / 255., out=self._float)
+            self._float -= 1.
+            self._stim.image = self._float
+            self._stim.draw()
+        elif self.target is not None:
+            self.target_stim.set_pos(self.target)
+            self.target_stim.show()
+            self.target_stim.render()
+        self.win.flip()
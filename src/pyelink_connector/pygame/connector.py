@@ -5,8 +5,20 @@ import os
 
 from typing import Tuple
 
-from .utils import Target, MultiLineText
+from .utils import Target, MultiLineText, CameraDisplay, PYGAME_KEYS
 from ..utils import *
+from ..interest_areas import send_interest_areas
+from ..realtime import apply_realtime
+from ..backdrop import BackdropManager
+from ..download import DownloadTask, receive_verified
+from ..session import session_path
+from ..naming import EdfNameAllocator
+from ..history import SampleHistory
+from ..link import LinkReader
+from ..setup import SetupStateMachine
+from ..fixation import FixationDetector
+from ..drift import DriftEstimator, DriftTrendMonitor
+from ..accuracy import QuickCheck, QuickCheckResult, check_targets
 
 
 class EyeConnector():
@@ -15,7 +27,7 @@ class EyeConnector():
         """Create connector object to communicate with an EyeLink 1000+.
         Args:
             win (pygame.Surface): Surface to draw to during setup.
-            host (str, optional): IP of the EyeLink Host PC. Defaults to "100.1.1.1".
+            host (str, optional): IP of the EyeLink Host PC, or a replay.ReplayEyeLink to run without tracker. Defaults to "100.1.1.1".
             eye (str, optional): Choose which eye to track. Options: ["both", "right", "left"]. Defaults to "both".
             prefix (str, optional): Session prefix. Will be added to all files handled by this connection. 
                                     Could, e.g., combine experiment and participant ID. Defaults to "".
@@ -26,6 +38,10 @@ class EyeConnector():
         self.win = win
         self.host = host
         self.eyelink = self.connect(host)
+        self.link = LinkReader(self.eyelink) # shared reader of the link data queue
+        self.backdrop = BackdropManager(self.eyelink) # backdrop and feedback graphics on the Host PC
+        self.setup = SetupStateMachine(self) # backend independent setup, drawn by this connector
+        self.camera = None # CameraDisplay, created by showCameraImage
         self.clock = clock if clock is not None else pygame.time.Clock()
 
         assert(eye.lower() in ["both", "right", "left"])
@@ -46,20 +62,32 @@ class EyeConnector():
         self.v_status = 1000 # validation status: success = 0
         self.d_status = 1000 # drift correction status: success = 0
         self.callback = None
+        self.recording_listeners = [] # objects with on_recording_start(connector, msg) and on_recording_stop(connector)
+        self.sample_history = None # SampleHistory filled by getEyeSample, see enableSampleHistory
+        self.drift_estimator = None # DriftEstimator fed by getEyeSample, see enableDriftEstimation
+        self.drift_monitor = None # DriftTrendMonitor, see enableDriftMonitor
 
         # for the more fanciful interface
         self.v_error = None
+        self.v_result = None # validation.ValidationResult of the last accepted validation
         self._v_msg = ""
         self._drift_correct_direct_return = True
 
         # housekeeping
         self.prefix = prefix
         self.download_directory = download_directory
-        self.edf_file_name = ""
+        self.edf_file_name = "" # local file name
+        self.host_file_name = "" # file name on the Host PC, see naming.EdfNameAllocator
+        self.file_block = 0 # number of files opened by openFile and rotateFile
+        self._file_base = ""
         self.isFileOpen = False
+        self._setup_text = None
         self.sample_rate = sample_rate
+        self._iarea_sent = set() # interest areas sent in the current trial
+        self.realtime = [] # reports of setRealtimeMode
 
         os.makedirs(self.download_directory, exist_ok=True)
+        self.edf_names = EdfNameAllocator(self.download_directory)
 
         # assume the whole monitor is used. Get resolution from system.
         _dispInfo = pygame.display.Info()
@@ -87,8 +115,11 @@ class EyeConnector():
 
 
     ### CONNECTION
-    def connect(self, host:str):
-        """opens a connection to the EyeLink 100+ Host PC. Make sure to close an open connection."""
+    def connect(self, host):
+        """opens a connection to the EyeLink 100+ Host PC. Make sure to close an open connection.
+        host can also be an object implementing the pylink.EyeLink API, e.g. replay.ReplayEyeLink, which is used as is."""
+        if not isinstance(host, str):
+            return host
         return pylink.EyeLink(host)
 
     def close(self):
@@ -96,33 +127,66 @@ class EyeConnector():
         Returns:
             int: 0 on success. Oterhwise link error returned by device.
         """
+        self.backdrop.close()
+        if self.sample_history is not None:
+            if self.sample_history in self.recording_listeners:
+                self.recording_listeners.remove(self.sample_history)
+            self.sample_history.close()
+            self.sample_history = None
         if self.eyelink.isConnected():
             self.closeFile()
             self.eyelink.setOfflineMode()
             return self.eyelink.close()
         else:
             return 0
+
+    def setRealtimeMode(self, cores:list|None=None, priority:int|None=50, whole_process:bool=False,
+                        render_thread_id:int|None=None, render_cores:list|None=None) -> list:
+        """Pins the thread reading samples (the calling thread) to the given cores and requests SCHED_FIFO scheduling.
+        Falls back to a raised priority if real-time scheduling is not permitted. Linux only.
+        Args:
+            cores (list|None, optional): CPU cores for sample reading. Defaults to None, i.e. affinity is not changed.
+            priority (int|None, optional): SCHED_FIFO priority (1-99). Defaults to 50. None keeps the scheduling policy.
+            whole_process (bool, optional): Apply to all threads of the process instead. Defaults to False.
+            render_thread_id (int|None, optional): Native id of a separate render thread. Defaults to None.
+            render_cores (list|None, optional): CPU cores for the render thread. Defaults to None.
+        Returns:
+            list[RealtimeReport]: What was actually applied. Also stored in self.realtime.
+        """
+        self.realtime = apply_realtime(cores, priority, whole_process=whole_process)
+        if render_thread_id is not None:
+            self.realtime += apply_realtime(render_cores, priority, thread_id=render_thread_id)
+        return self.realtime
     
 
     ### FILE HANDLING
-    def openFile(self, file_name:str) -> None:
+    def openFile(self, file_name:str) -> bool:
         """Opens an edf file on the EyeLink. 
         Args:
             file_name (str): The edf file name is self.prefix + "_" + file_name, if self.prefix is specified. 
-                Otherwise it is just file_name. Total fil name length must not exceed 8 characters.
+                Otherwise it is just file_name. Names longer than 8 characters are shortened on the Host PC
+                and restored on download, see naming.EdfNameAllocator.
+        Returns:
+            bool: False if no Host PC file name is left.
         """
         _pf = self.prefix + "_" if self.prefix != "" else ""
         self.edf_file_name = _pf + file_name
         if not self.edf_file_name.endswith(".edf"):
             self.edf_file_name += ".edf"
-        if len(self.edf_file_name.split(".")[0]) > 8:
-            print("ERROR (EyeLinkConnector): edf file name is too long. Must be shorter or equal 8 characters.")
+        # the Host PC only accepts 8 characters. Longer names are mapped to a short name for the transfer.
+        try:
+            self.host_file_name = self.edf_names.allocate(self.edf_file_name)
+        except ValueError as e:
+            print(f"ERROR (EyeLinkConnector): {e}")
             return False
+        self._file_base = file_name[:-4] if file_name.endswith(".edf") else file_name
+        self.file_block = 1
 
-        self.eyelink.openDataFile(self.edf_file_name)
+        self.eyelink.openDataFile(self.host_file_name)
 
         # set header information
         self.eyelink.sendCommand(f"add_file_preamble_text 'RECORDED BY Pylink-Pygame Connector tagged {self.prefix}'")
+        self.eyelink.sendMessage(f"EDF_FILE_NAME {self.edf_file_name} HOST {self.host_file_name}")
 
         # define coordinate system
         self.eyelink.sendMessage(f"DISPLAY_COORDS 0 0 {self._w - 1} {self._h - 1}") # DISPLAY_COORDS msg is used by the DATA VIEWER
@@ -145,7 +209,7 @@ class EyeConnector():
         self.eyelink.setFileSampleFilter(file_sample_flags) # command file_sample_data
 
         # ... and make them available via link
-        link_event_flags = _eye_identifier + 'FIXATION,SACCADE,BLINK,BUTTON,FIXUPDATE,INPUT'
+        link_event_flags = _eye_identifier + 'FIXATION,SACCADE,BLINK,MESSAGE,BUTTON,FIXUPDATE,INPUT'
         link_sample_flags = _eye_identifier + 'GAZE,GAZERES,AREA,HTARGET,STATUS,INPUT'
         self.eyelink.sendCommand(f"link_event_filter = {link_event_flags}")
         self.eyelink.sendCommand(f"link_sample_data = {link_sample_flags}")
@@ -154,6 +218,7 @@ class EyeConnector():
 
         # switch flag for housekeeping
         self.isFileOpen = True
+        return True
 
     def closeFile(self) -> None:
         """Sets the tracker to offline mode and closes the currently opened edf file"""
@@ -163,10 +228,105 @@ class EyeConnector():
         # switch flag for housekeeping
         self.isFileOpen = False
 
-    def downloadFile(self) -> None:
-        """Closes open file and downloads it to self.download_directory."""
+    def downloadFile(self, retries:int=3) -> int:
+        """Closes open file and downloads it to self.download_directory.
+        The received file is verified and the transfer is retried if it is incomplete.
+        Args:
+            retries (int, optional): Number of retries after a failed transfer. Defaults to 3.
+        Returns:
+            int: Size of the downloaded file in bytes. Raises IOError if all attempts failed.
+        """
+        self.closeFile()
+        return receive_verified(self.eyelink, self.host_file_name, self.download_directory + self.edf_file_name, retries)
+
+    def rotateFile(self, file_name:str|None=None, download:bool=True, retries:int=3, settings:dict|None=None) -> int:
+        """Closes the current edf file and continues in a new one, e.g. at the start of every block.
+        Smaller files can be downloaded during breaks instead of one large transfer at the end.
+        Args:
+            file_name (str|None, optional): Name of the new file, see openFile.
+                Defaults to None, i.e. the name passed to openFile with the block number appended, e.g. "exp_2".
+            download (bool, optional): Download the closed file with a progress screen before opening the new one.
+                Defaults to True.
+            retries (int, optional): Number of retries after a failed transfer. Defaults to 3.
+            settings (dict|None, optional): required keys: render_fps. Required if download is True.
+        Returns:
+            int: Size of the downloaded file in bytes. 0 if it was not downloaded.
+                Raises IOError if the transfer failed or the new file could not be opened,
+                InterruptedError if the transfer was cancelled.
+        """
+        base, block = self._file_base, self.file_block + 1
+        try:
+            if download:
+                # the window stays responsive during the transfer
+                return self.showDownloadProgress(self.downloadFileAsync(retries), settings).result()
+            self.closeFile()
+            return 0
+        finally:
+            # the next block is recorded even if the transfer failed
+            self._openNextFile(file_name, base, block)
+
+    def _openNextFile(self, file_name:str|None, base:str, block:int) -> None:
+        """Opens the file following a rotated one. Should not be called directly."""
+        name = f"{base}_{block}" if file_name is None else file_name
+        if not self.openFile(name):
+            raise IOError(f"Could not open {name} on the Host PC.")
+        if file_name is None:
+            self._file_base, self.file_block = base, block
+
+    def sessionPath(self) -> str:
+        """Returns the directory a converted session of the current edf file is stored in, see session.save_session."""
+        return session_path(self.download_directory, self.edf_file_name)
+
+    def downloadFileAsync(self, retries:int=3) -> DownloadTask:
+        """Closes open file and starts downloading it to self.download_directory in a background thread.
+        Keep rendering and call task.poll() to update its progress, or use showDownloadProgress.
+        Do not use the connector until the download is done.
+        Args:
+            retries (int, optional): Number of retries after a failed transfer. Defaults to 3.
+        Returns:
+            DownloadTask: The running transfer.
+        """
         self.closeFile()
-        self.eyelink.receiveDataFile(self.edf_file_name, self.download_directory + self.edf_file_name)
+        return DownloadTask(self.eyelink, self.host_file_name, self.download_directory + self.edf_file_name, retries).start()
+
+    def showDownloadProgress(self, task:DownloadTask, settings:dict) -> DownloadTask:
+        """Shows a progress screen until the download is done. Q/ESC cancels the download.
+        Args:
+            task (DownloadTask): Transfer started with downloadFileAsync.
+            settings (dict): required keys: render_fps
+        Returns:
+            DownloadTask: The finished transfer.
+        """
+        mlText = None
+        received = -1
+        while True:
+            # handle events
+            for event in pygame.event.get():
+                if event.type == pygame.KEYDOWN:
+                    if (event.key == pygame.K_q) or (event.key == pygame.K_ESCAPE):
+                        task.cancel()
+
+            # only re-render the text if the progress changed
+            if (task.poll() != received) or (mlText is None):
+                received = task.bytes_received
+                text = f"DOWNLOAD:\
+                    \n\t> {task.progress_text()}\
+                    \n\nPress Q/ESC to cancel."
+                mlText = MultiLineText(text, screen_size=(self._w, self._h), placement="center", settings=settings)
+
+            if task.done():
+                break
+
+            # render text
+            self.win.fill(self.bg_color)
+            mlText.render(self.win)
+
+            # update
+            pygame.event.pump()
+            pygame.display.update()
+            self.clock.tick(settings["render_fps"])
+
+        return task
 
 
     ### TRACKING
@@ -181,6 +341,10 @@ class EyeConnector():
 
         timestamp = datetime.datetime.now()
         self.eyelink.sendMessage(f"TIMESTAMP {timestamp} - START OF TRIAL {msg}")
+        # notify listeners before recording, so their setup does not delay the first samples
+        for listener in self.recording_listeners:
+            listener.on_recording_start(self, msg)
+
         # arguments: sample_to_file, events_to_file, sample_over_link, event_over_link 
         self.eyelink.startRecording(1, 1, 1, 1)
 
@@ -191,9 +355,87 @@ class EyeConnector():
         timestamp = datetime.datetime.now()
         self.eyelink.sendMessage(f"TIMESTAMP {timestamp} - END OF TRIAL {self.trial_msg}")
         self.eyelink.stopRecording()
+        self._iarea_sent = set()
+
+        for listener in self.recording_listeners:
+            listener.on_recording_stop(self)
+
+    def sendInterestAreas(self, areas:list) -> int:
+        """Sends interest areas to the edf file as one block of `!V IAREA RECTANGLE` messages.
+        Duplicates and areas already sent in the current trial are skipped.
+        Args:
+            areas (list[InterestArea]): Interest areas in tracker coordinates, e.g. from MultiLineText.interest_areas().
+        Returns:
+            int: Number of interest areas sent.
+        """
+        return send_interest_areas(self.eyelink, areas, self._iarea_sent)
 
 
     ### COMMUNICATION
+    def enableSampleHistory(self, directory:str|None=None) -> SampleHistory:
+        """Keeps all samples of the session in a memory-mapped SampleHistory, e.g. for history.last(3000) or history.trial(-1).
+        Samples queued on the link are stored with every getEyeSample call and at the end of every trial.
+        Args:
+            directory (str|None, optional): Directory of the history files. Defaults to None, i.e. a temporary directory.
+        Returns:
+            SampleHistory: The history, also stored in self.sample_history.
+        """
+        self.sample_history = SampleHistory(directory)
+        self.sample_history.drift_estimator = self.drift_estimator
+        self.recording_listeners.append(self.sample_history)
+        return self.sample_history
+
+    def enableDriftEstimation(self, apply:bool=False, **kwargs) -> DriftEstimator:
+        """Estimates the drift from fixations on reference points during recording, e.g. a central fixation cross:
+        call self.drift_estimator.set_reference((x, y)) while it is shown. The estimate is written to the edf file
+        at the end of each trial.
+        Args:
+            apply (bool, optional): Correct the gaze of getEyeSample and of the sample history by the estimate. Defaults to False.
+            **kwargs: Thresholds of the reference fixations, see DriftEstimator.
+        Returns:
+            DriftEstimator: The estimator, also stored in self.drift_estimator.
+        """
+        self.drift_estimator = DriftEstimator(apply=apply, **kwargs)
+        self.recording_listeners.append(self.drift_estimator)
+        if self.sample_history is not None:
+            self.sample_history.drift_estimator = self.drift_estimator
+        if self.drift_monitor is not None:
+            self.drift_monitor.estimator = self.drift_estimator
+        return self.drift_estimator
+
+    def enableDriftMonitor(self, **kwargs) -> DriftTrendMonitor:
+        """Collects the offsets of drift corrections, quick checks and the drift estimator (if enabled) to tell
+        when a correction is actually needed, see recommendedCorrection.
+        Args:
+            **kwargs: Thresholds in degrees and trend settings, see DriftTrendMonitor. Without pixels_per_degree the resolution
+                is taken from the first drift check, quick check or sample that reports it.
+        Returns:
+            DriftTrendMonitor: The monitor, also stored in self.drift_monitor.
+        """
+        self.drift_monitor = DriftTrendMonitor(**kwargs)
+        self.drift_monitor.estimator = self.drift_estimator
+        return self.drift_monitor
+
+    def recommendedCorrection(self) -> str:
+        """Returns "none", "drift_correction" or "recalibration" according to the drift monitor,
+        e.g. to only drift correct before a trial when needed. "none" if no monitor is enabled."""
+        if self.drift_monitor is None:
+            return "none"
+        return self.drift_monitor.recommend(self.eyelink.trackerTime())
+
+    def enableAutoAccept(self, dispersion:float=40., duration:float=300., max_distance:float|None=120.) -> FixationDetector:
+        """Accepts calibration, validation and drift correction targets when the gaze rests on them, e.g. for setups without operator.
+        SPACE still works. Set self.setup.auto_accept = None to disable it again.
+        Args:
+            dispersion (float, optional): Maximum dispersion of the fixation in px. Defaults to 40.
+            duration (float, optional): Minimum fixation duration in ms. Defaults to 300.
+            max_distance (float|None, optional): Maximum distance to the target in px. Not applied during the calibration. Defaults to 120.
+        Returns:
+            FixationDetector: The detector, also stored in self.setup.auto_accept.
+        """
+        self.setup.auto_accept = FixationDetector(dispersion, duration, max_distance)
+        return self.setup.auto_accept
+
     def getEyeSample(self) -> Tuple[Sample, Sample] | Sample:
         """Return the latest eye sample. A sample contains 
             Gaze position as (x, y) in px
@@ -207,17 +449,23 @@ class EyeConnector():
             Tuple[Sample, Sample]: Sample of the Left and Sample of the Right eye.
         """
         s = self.eyelink.getNewestSample()
+        if self.sample_history is not None:
+            self.sample_history.poll(self.link)
+        if self.drift_estimator is not None:
+            self.drift_estimator.update(s)
+        if self.drift_monitor is not None:
+            self.drift_monitor.update_resolution(s)
 
         if self.eye == "both":
             if s.isLeftSample():
                 l = s.getLeftEye()
-                ls = Sample(l.getGaze(), l.getHREF(), l.getRawPupil(), l.getPupilSize())
+                ls = self._eyeSample(l, "left")
             else:
                 ls = self.dummy_sample
 
             if s.isRightSample():
                 r = s.getRightEye()
-                rs = Sample(r.getGaze(), r.getHREF(), r.getRawPupil(), r.getPupilSize())
+                rs = self._eyeSample(r, "right")
             else:
                 rs = self.dummy_sample
 
@@ -226,13 +474,13 @@ class EyeConnector():
             if s.isLeftSample():
                 if self.eye == "left":
                     l = s.getLeftEye()
-                    return Sample(l.getGaze(), l.getHREF(), l.getRawPupil(), l.getPupilSize())
+                    return self._eyeSample(l, "left")
                 else:
                     raise(ValueError, "Expected left eye sample but received right eye sample.")
             elif s.isRightSample():
                 if self.eye == "right":
                     r = s.getRightEye()
-                    return Sample(r.getGaze(), r.getHREF(), r.getRawPupil(), r.getPupilSize())
+                    return self._eyeSample(r, "right")
                 else:
                     raise(ValueError, "Expected right eye sample but received left eye sample.")
             else:
@@ -240,404 +488,175 @@ class EyeConnector():
                 # return self.dummy_sample
 
 
-    ####################### PYGAME specific
-    ### GENERAL SETUP ENTRY
-    def runSetup(self, settings:dict) -> None:
-        """Possible entry point. Requires an opened edf file on the host PC.
-        Show the steup screen from which calibration, validation and drift-correction can be started.
+    def _eyeSample(self, e, eye:str) -> Sample:
+        gaze = e.getGaze()
+        if (self.drift_estimator is not None) and self.drift_estimator.apply:
+            gaze = self.drift_estimator.correct(gaze, eye)
+        return Sample(gaze, e.getHREF(), e.getRawPupil(), e.getPupilSize())
+
 
+    ####################### PYGAME specific
+    ### SETUP
+    def stepSetup(self, events:list, settings:dict, redraw_unchanged:bool=True) -> bool:
+        """Advances the setup by one frame and renders it without updating the display,
+        so the setup can run inside your own frame loop. Start it with self.setup.start(...).
         Args:
+            events (list): pygame events of this frame.
             settings (dict): required keys: render_fps
+            redraw_unchanged (bool, optional): Also render if nothing changed (self.setup.frame.changed),
+                e.g. if you draw over it. Defaults to True.
+        Returns:
+            bool: True while the setup is running.
         """
-        assert(self.isFileOpen)
-
-        # enter setup mode
-        self.eyelink.startSetup()
+        keys = [PYGAME_KEYS[e.key] for e in events if (e.type == pygame.KEYDOWN) and (e.key in PYGAME_KEYS)]
+        frame = self.setup.step(keys)
+        if frame.mode == "done":
+            return False
+        if not (frame.changed or redraw_unchanged):
+            return True
+
+        self.win.fill(self.bg_color)
+        if frame.mode == "text":
+            if frame.changed or (self._setup_text is None):
+                self._setup_text = MultiLineText(frame.text, screen_size=(self._w, self._h), placement="center", settings=settings)
+            self._setup_text.render(self.win)
+        else:
+            if frame.target is not None:
+                self.target.set_x(frame.target[0])
+                self.target.set_y(frame.target[1])
+                self.target.show()
+            else:
+                self.target.hide()
+            self.target.render(self.win)
+        return True
 
+    def _runSetupLoop(self, settings:dict) -> str:
+        """Runs the started setup until it ended. Should not be called directly.
+        Returns:
+            str: Last actions status message.
+        """
         # hide mouse if shown
         _mousWasVisible = pygame.mouse.get_visible()
         pygame.mouse.set_visible(False)
 
-        # start loop
-        done = False
-        text = f"STATUS:\
-            \n\nCalibration: {STATUS_MSGS[self.c_status]}\
-            \nValidation: {STATUS_MSGS[self.v_status]}{f' - avg. error: {self.v_error} °' if self.v_error is not None else ''}\
-            \n\n\tPress C to {'(re)' if self.c_status != 1000 else ''}calibrate.\
-            \n\tPress V to {'(re)' if self.v_status != 1000 else ''}validate.\
-            \n\tPress D to drift correct.\
-            \n\tPress Q/ENTER to quit setup and continue.\
-            \n\nUse SPACE to manually accept a fixation."
-        mlText = MultiLineText(text, screen_size=(self._w, self._h), placement="center", settings=settings)
-        while not done:
-            # handle events
-            for event in pygame.event.get():
-                if event.type == pygame.KEYDOWN:
-                    if event.key == pygame.K_c:
-                        msg = self.calibrate(settings)
-                        # Update the status text
-                        text = f"STATUS:\
-                            \n\t>{msg}\
-                            \n\nCalibration: {STATUS_MSGS[self.c_status]}\
-                            \nValidation: {STATUS_MSGS[self.v_status]}{f' - avg. error: {self.v_error} °' if self.v_error is not None else ''}\
-                            \n\n\tPress C to {'(re)' if self.c_status != 1000 else ''}calibrate.\
-                            \n\tPress V to {'(re)' if self.v_status != 1000 else ''}validate.\
-                            \n\tPress D to drift correct.\
-                            \n\tPress Q/ENTER to quit setup and continue.\
-                            \n\nUse SPACE to manually accept a fixation."
-                        mlText = MultiLineText(text, screen_size=(self._w, self._h), placement="center", settings=settings)
-
-                    if event.key == pygame.K_v:
-                        msg = self.validate(settings)
-                        # Update the status text
-                        text = f"STATUS:\
-                            \n\t>{msg}\
-                            \n\nCalibration: {STATUS_MSGS[self.c_status]}\
-                            \nValidation: {STATUS_MSGS[self.v_status]}{f' - avg. error: {self.v_error} °' if self.v_error is not None else ''}\
-                            \n\n\tPress C to {'(re)' if self.c_status != 1000 else ''}calibrate.\
-                            \n\tPress V to {'(re)' if self.v_status != 1000 else ''}validate.\
-                            \n\tPress D to drift correct.\
-                            \n\tPress Q/ENTER to quit setup and continue.\
-                            \n\nUse SPACE to manually accept a fixation."
-                        mlText = MultiLineText(text, screen_size=(self._w, self._h), placement="center", settings=settings)
-
-                    if event.key == pygame.K_d:
-                        msg = self.driftCorrect(settings)
-                        # Update the status text
-                        text = f"STATUS:\
-                            \n\t>{msg}\
-                            \n\nCalibration: {STATUS_MSGS[self.c_status]}\
-                            \nValidation: {STATUS_MSGS[self.v_status]}{f' - avg. error: {self.v_error} °' if self.v_error is not None else ''}\
-                            \n\n\tPress C to {'(re)' if self.c_status != 1000 else ''}calibrate.\
-                            \n\tPress V to {'(re)' if self.v_status != 1000 else ''}validate.\
-                            \n\tPress D to drift correct.\
-                            \n\tPress Q/ENTER to quit setup and continue.\
-                            \n\nUse SPACE to manually accept a fixation."
-                        mlText = MultiLineText(text, screen_size=(self._w, self._h), placement="center", settings=settings)
-
-                    if event.key == pygame.K_q or event.key == pygame.K_RETURN:
-                        done = True
-
-            # render text
-            self.win.fill(self.bg_color)
-            mlText.render(self.win)
-
-            # update
-            pygame.event.pump()
-            pygame.display.update()
-            self.clock.tick(settings["render_fps"])
-            
-        self.eyelink.setOfflineMode()
+        self._setup_text = None
+        events = pygame.event.get()
+        while self.stepSetup(events, settings, redraw_unchanged=False):
+            # update only if the screen changed
+            if self.setup.frame.changed:
+                pygame.display.update()
+
+            if self.setup.idle:
+                # static screen: sleep until the next event
+                event = pygame.event.wait(int(self.setup.idle_timeout * 1000))
+                events = ([event] if event.type != pygame.NOEVENT else []) + pygame.event.get()
+            else:
+                self.clock.tick(settings["render_fps"])
+                events = pygame.event.get()
 
         # show mouse if it was shown
         pygame.mouse.set_visible(_mousWasVisible)
 
-        return
-            
-    ### CALIBRATION 
-    def calibrate(self, settings:dict) -> None:
-        """Possible entry point. Requires an opened edf file on the host PC.
-        Performs the calibration. Shows a status screen when done.
-        Upon exiting the status screen, a status message is returned.
+        return self.setup.message
 
+    def showCameraImage(self) -> None:
+        """Shows the eye camera image. Keys are forwarded to the tracker, e.g. arrow keys to switch the camera view.
+        The tracker only sends the image within pylink's tracker setup, so this blocks until it is left with ESC.
+        Also available with E on the setup status screen.
+        """
+        if self.camera is None:
+            self.camera = CameraDisplay(self.win, self.target, self.bg_color)
+            pylink.openGraphicsEx(self.camera)
+        self.eyelink.doTrackerSetup()
+
+    def quickCheck(self, settings:dict, n_targets:int=5, duration:float=1., max_error:float=1., area:float=.5, **kwargs) -> QuickCheckResult:
+        """Fast accuracy check, e.g. between blocks: shows the targets one after another while recording over the link only
+        and evaluates accuracy and precision locally. Takes n_targets * duration seconds and does not enter setup mode.
+        Call it while not recording.
         Args:
             settings (dict): required keys: render_fps
+            n_targets (int, optional): 1 to 5 targets: center, then corners. Defaults to 5.
+            duration (float, optional): Time each target is shown in s. Defaults to 1.
+            max_error (float, optional): Largest accepted error of any target in degrees. Defaults to 1.
+            area (float, optional): Proportion of the screen covered by the targets. Defaults to .5.
+            **kwargs: Further arguments of accuracy.QuickCheck, e.g. pixels_per_degree. Without it and without the
+                resolution reported by the tracker, the results are in px and passed is None.
+        Returns:
+            QuickCheckResult: passed, accuracy, max_error and precision in degrees and the results per target.
+                passed is None if the resolution is unknown.
         """
-        assert(self.isFileOpen)
-
-        # enter setup mode
-        self.eyelink.startSetup()
+        targets = check_targets(n_targets, (self._w / 2, self._h / 2), (self._w, self._h), area)
+        check = QuickCheck(self.eyelink, targets, duration, max_error=max_error, link=self.link, **kwargs)
 
         # hide mouse if shown
         _mousWasVisible = pygame.mouse.get_visible()
         pygame.mouse.set_visible(False)
 
-        # configure calibration
-        self.eyelink.setCalibrationType("HV9")
-        self.eyelink.sendCommand("calibration_area_proportion = 0.5 0.5")
-        self.eyelink.sendCommand("validation_area_proportion = 0.5 0.5")
-
-        # start calibration on host
-        self.eyelink.sendKeybutton(C_KEY, 0, pylink.KB_PRESS)
-        self.eyelink.sendKeybutton(C_KEY, 0, pylink.KB_RELEASE)
-        self.eyelink.setAcceptTargetFixationButton(SPACE_KEY)
-
-        # DO calibration
-        msg = ""
-        done = False
-        while not done:
-            # handle events
-            for event in pygame.event.get():
-                if event.type == pygame.KEYDOWN:
-                    if event.key == pygame.K_SPACE:
-                        # (manually) accept target fixation
-                        self.eyelink.sendKeybutton(SPACE_KEY, 0, pylink.KB_PRESS)
-                        self.eyelink.sendKeybutton(SPACE_KEY, 0, pylink.KB_RELEASE)
-                    if event.key == pygame.K_BACKSPACE:
-                        # repeat previous target
-                        self.eyelink.sendKeybutton(BACKSPACE_KEY, 0, pylink.KB_PRESS)
-                        self.eyelink.sendKeybutton(BACKSPACE_KEY, 0, pylink.KB_RELEASE)
-
-                    if event.key == pygame.K_q or event.key == pygame.K_ESCAPE:
-                        self.eyelink.sendKeybutton(ESC_KEY, 0, pylink.KB_PRESS)
-                        self.eyelink.sendKeybutton(ESC_KEY, 0, pylink.KB_RELEASE)
-                        self.c_status = 27
-                        msg = "Calibration was aborted."
-                        done = True
-
-            # get calibration target position
-            p = self.eyelink.getTargetPositionAndState()
-            if p[0]:
-                self.target.set_x(p[1])
-                self.target.set_y(p[2])
-                self.target.show()
-            else:
-                self.target.hide()
-
-            # check if calibration ended
-            c = self.eyelink.getCalibrationResult()
-            if c != 1000:
-                self.c_status = c
-                msg = self.eyelink.getCalibrationMessage()
-                done = True
-
-            # render target
-            self.win.fill(self.bg_color)
-            self.target.render(self.win)
-
-            # update
+        check.start()
+        shown = None
+        while check.running:
             pygame.event.pump()
-            pygame.display.update()
+            target = check.step()
+            if (target is not None) and (target != shown):
+                # only redraw when the target moves
+                shown = target
+                self.win.fill(self.bg_color)
+                self.target.set_x(target[0])
+                self.target.set_y(target[1])
+                self.target.show()
+                self.target.render(self.win)
+                pygame.display.update()
             self.clock.tick(settings["render_fps"])
 
-        # show mouse if it was visible
+        # show mouse if it was shown
         pygame.mouse.set_visible(_mousWasVisible)
+        if self.drift_monitor is not None:
+            self.drift_monitor.add_quick_check(self.eyelink.trackerTime(), check.result)
+        return check.result
 
-        self._showCalibrationDoneScreen(settings, msg=f"Calibration status: {STATUS_MSGS[self.c_status]}. Result: {msg}")
-
-    def _showCalibrationDoneScreen(self, settings:dict, msg:str="") -> str:
-        """Shows calibration results. Should not be called directly.
-            May call calibrate (again) or validate from here.
-            Upon exit, a status message is returend
+    ### GENERAL SETUP ENTRY
+    def runSetup(self, settings:dict) -> str:
+        """Possible entry point. Requires an opened edf file on the host PC.
+        Show the steup screen from which calibration, validation and drift-correction can be started.
 
         Args:
             settings (dict): required keys: render_fps
-            msg (str, optional): Message to display. Defaults to "".
 
         Returns:
             str: Last actions status message.
-        """    
-        text = f"Calibration {STATUS_MSGS[self.c_status]}\
-            \n\t> {msg}\
-            \nPress ENTER to accept the calibration and continue.\
-            \nPress C to calibrate again.\
-            \nPress V to validate.\
-            \nPress BACKSPACE/ DELETE to discard the calibration and return."
-        mlText = MultiLineText(text=text, screen_size=(self._w, self._h), placement="center", settings=settings)
-
-        # hide mouse if shown
-        _mousWasVisible = pygame.mouse.get_visible()
-        pygame.mouse.set_visible(False)
-
-        callback = None
-        msg = ""
-        done = False
-        while not done:
-            # handle events
-            for event in pygame.event.get():
-                if event.type == pygame.KEYDOWN:
-                    if event.key == pygame.K_RETURN:
-                        # accept calibration.
-                        self.eyelink.sendKeybutton(ENTER_KEY, 0, pylink.KB_PRESS)
-                        self.eyelink.sendKeybutton(ENTER_KEY, 0, pylink.KB_RELEASE)
-                        callback = None
-                        msg = "Calibration accepted."
-                        done = True
-
-                    if event.key == pygame.K_c:
-                        # restart calibration on tracker
-                        self.eyelink.sendKeybutton(DELETE_KEY, 0, pylink.KB_PRESS)
-                        self.eyelink.sendKeybutton(DELETE_KEY, 0, pylink.KB_RELEASE)
-                        callback = self.calibrate
-                        done = True
-
-                    if event.key == pygame.K_v:
-                        callback = self.validate
-                        done = True
-
-                    if event.key == pygame.K_BACKSPACE or event.key == pygame.K_DELETE:
-                        # Discard calibration without repeating
-                        self.eyelink.sendKeybutton(ESC_KEY, 0, pylink.KB_PRESS)
-                        self.eyelink.sendKeybutton(ESC_KEY, 0, pylink.KB_RELEASE)
-                        self.c_status = 1000
-                        callback = None
-                        msg = "Calibration discarded."
-                        done = True
-
-            # render text
-            self.win.fill(self.bg_color)
-            mlText.render(self.win)
-
-            # update
-            pygame.event.pump()
-            pygame.display.update()
-            self.clock.tick(settings["render_fps"])
-
-        # show mouse if it was visible
-        pygame.mouse.set_visible(_mousWasVisible)
+        """
+        assert(self.isFileOpen)
+        self.setup.start("status")
+        return self._runSetupLoop(settings)
 
-        if callback is not None:
-            return callback(settings)
-        else:
-            return msg
+    ### CALIBRATION 
+    def calibrate(self, settings:dict) -> str:
+        """Possible entry point. Requires an opened edf file on the host PC.
+        Performs the calibration. Shows a status screen when done.
+        Upon exiting the status screen, a status message is returned.
 
+        Args:
+            settings (dict): required keys: render_fps
+        """
+        assert(self.isFileOpen)
+        self.setup.start("calibration", return_to_status=False)
+        return self._runSetupLoop(settings)
 
     ### VALIDATION
-    def validate(self, settings:dict) -> None:
+    def validate(self, settings:dict, failed_only:bool=False) -> str:
         """Possible entry point. Requires an opened edf file and successfull calibration on the host PC.
         Performs the validation. Shows a status screen when done.
-        Should be called from the calibration-done-screen or the setup-screen.
         Calling from the experiment directly may cause problems.
         Upon exiting the status screen, a status message is returned.
 
         Args:
             settings (dict): required keys: render_fps
+            failed_only (bool, optional): Only repeat the points of the last validation with an error above
+                self.setup.revalidation_threshold. Defaults to False.
         """
         assert(self.isFileOpen)
-
-        # start validation process
-        self.eyelink.sendKeybutton(V_KEY, 0, pylink.KB_PRESS)
-        self.eyelink.sendKeybutton(V_KEY, 0, pylink.KB_RELEASE)
-        self.eyelink.setAcceptTargetFixationButton(SPACE_KEY)
-
-        # hide mouse if shown
-        _mousWasVisible = pygame.mouse.get_visible()
-        pygame.mouse.set_visible(False)
-
-        # DO validation
-        msg = ""
-        done = False
-        while not done:
-            # handle events
-            for event in pygame.event.get():
-                if event.type == pygame.KEYDOWN:
-                    if event.key == pygame.K_SPACE:
-                        # (manually) accept target fixation
-                        self.eyelink.sendKeybutton(SPACE_KEY, 0, pylink.KB_PRESS)
-                        self.eyelink.sendKeybutton(SPACE_KEY, 0, pylink.KB_RELEASE)
-                    if event.key == pygame.K_BACKSPACE:
-                        # repeat previous target
-                        self.eyelink.sendKeybutton(BACKSPACE_KEY, 0, pylink.KB_PRESS)
-                        self.eyelink.sendKeybutton(BACKSPACE_KEY, 0, pylink.KB_RELEASE)
-
-                    if event.key == pygame.K_q or event.key == pygame.K_ESCAPE:
-                        self.eyelink.sendKeybutton(ESC_KEY, 0, pylink.KB_PRESS)
-                        self.eyelink.sendKeybutton(ESC_KEY, 0, pylink.KB_RELEASE)
-                        self.v_status = 27
-                        msg = "Validation was aborted."
-                        done = True
-
-            # get validation target position
-            p = self.eyelink.getTargetPositionAndState()
-            if p[0]:
-                self.target.set_x(p[1])
-                self.target.set_y(p[2])
-                self.target.show()
-            else:
-                self.target.hide()
-
-            # check if validation ended
-            v = self.eyelink.getCalibrationResult()
-            if v != 1000:
-                self.v_status = v
-                msg = self.eyelink.getCalibrationMessage()
-                done = True
-
-            # render target
-            self.win.fill(self.bg_color)
-            self.target.render(self.win)
-
-            # update
-            pygame.event.pump()
-            pygame.display.update()
-            self.clock.tick(settings["render_fps"])
-
-        # show mouse if it was visible
-        pygame.mouse.set_visible(_mousWasVisible)
-
-        self._showValidationDoneScreen(settings, msg=f"Validation status: {STATUS_MSGS[self.v_status]}. Result: {msg}")
-
-    def _showValidationDoneScreen(self, settings:dict, msg:str="") -> str:
-        """Shows validation results. Should not be called directly.
-            May call validate again from here.
-            Upon exit, a status message is returend
-
-        Args:
-            settings (dict): required keys: render_fps
-            msg (str, optional): Message to display. Defaults to "".
-            
-        Returns:
-            str: Last actions status message.
-        """    
-        text = f"Validation {STATUS_MSGS[self.v_status]}\
-            \n\t> {msg}\
-            \nPress ENTER to accept the validation and continue.\
-            \nPress V to validate again.\
-            \nPress BACKSPACE/ DELETE to discard the validation."
-        mlText = MultiLineText(text=text, screen_size=(self._w, self._h), placement="center", settings=settings)
-
-        # hide mouse if shown
-        _mousWasVisible = pygame.mouse.get_visible()
-        pygame.mouse.set_visible(False)
-
-        callback = None
-        msg = None
-        done = False
-        while not done:
-            # handle events
-            for event in pygame.event.get():
-                if event.type == pygame.KEYDOWN:
-                    if event.key == pygame.K_RETURN:
-                        # accept validation.
-                        self.eyelink.sendKeybutton(ENTER_KEY, 0, pylink.KB_PRESS)
-                        self.eyelink.sendKeybutton(ENTER_KEY, 0, pylink.KB_RELEASE)
-                        callback = None
-                        msg = "Validation accepted."
-                        done = True
-
-                    if event.key == pygame.K_v:
-                        # restart validation on tracker
-                        self.eyelink.sendKeybutton(DELETE_KEY, 0, pylink.KB_PRESS)
-                        self.eyelink.sendKeybutton(DELETE_KEY, 0, pylink.KB_RELEASE)
-                        callback = self.validate
-                        done = True
-
-                    if event.key == pygame.K_BACKSPACE or event.key == pygame.K_DELETE:
-                        # Discard validation without repeating
-                        self.eyelink.sendKeybutton(ESC_KEY, 0, pylink.KB_PRESS)
-                        self.eyelink.sendKeybutton(ESC_KEY, 0, pylink.KB_RELEASE)
-                        self.v_status = 1000
-                        callback = None
-                        msg = "Validation discarded."
-                        done = True
-
-            # render text
-            self.win.fill(self.bg_color)
-            mlText.render(self.win)
-
-            # update
-            pygame.event.pump()
-            pygame.display.update()
-            self.clock.tick(settings["render_fps"])
-
-        # show mouse if it was visible
-        pygame.mouse.set_visible(_mousWasVisible)
-
-        if callback is not None:
-            return callback(settings)
-        else:
-            return msg
-
+        self.setup.start("validation", return_to_status=False, failed_only=failed_only)
+        return self._runSetupLoop(settings)
 
     ### DRIFT CORRECTION
     def driftCorrect(self, settings:dict) -> str:
@@ -651,59 +670,5 @@ class EyeConnector():
         Returns:
             str: drift correction result
         """
-        # position target
-        self.target.set_x(self._w/2)
-        self.target.set_y(self._h/2)
-        self.target.show()
-
-        # hide mouse if shown
-        _mousWasVisible = pygame.mouse.get_visible()
-        pygame.mouse.set_visible(False)
-
-        self.eyelink.startDriftCorrect(self.win.width//2, self.win.height//2)
-        # make sure "Apply correction" is active
-        # ... TODO
-
-        done = False
-        while not done:
-            # handle events
-            for event in pygame.event.get():
-                if event.type == pygame.KEYDOWN:
-                    if event.key == pygame.K_SPACE:
-                        self.eyelink.sendKeybutton(SPACE_KEY, 0, pylink.KB_PRESS)
-                        self.eyelink.sendKeybutton(SPACE_KEY, 0, pylink.KB_RELEASE)
-
-                    if (event.key == pygame.K_q) or (event.key == pygame.K_ESCAPE):
-                        # leave drift correct mode on tracker
-                        self.eyelink.sendKeybutton(ESC_KEY, 0, pylink.KB_PRESS)
-                        self.eyelink.sendKeybutton(ESC_KEY, 0, pylink.KB_RELEASE)
-                        self.d_status = 27
-                        done = True
-
-            # get drift correct status
-            d = self.eyelink.getCalibrationResult()
-            if d != 1000:
-                self.d_status = d
-                d_msg = self.eyelink.getCalibrationMessage()
-                # print(f"> d_msg: {d_msg}")
-
-                r = self.eyelink.applyDriftCorrect()
-                # print(f"> drift res: {r}")
-
-                # enter setup mode
-                self.eyelink.startSetup()
-                done = True
-
-            # render target
-            self.win.fill(self.bg_color)
-            self.target.render(self.win)
-
-            # update
-            pygame.event.pump()
-            pygame.display.update()
-            self.clock.tick(settings["render_fps"])
-
-        # show mouse if it was visible
-        pygame.mouse.set_visible(_mousWasVisible)
-
-        return f"Drift correction: {STATUS_MSGS[self.d_status]}"
+        self.setup.start("drift", return_to_status=False, drift_pos=(self._w//2, self._h//2))
+        return self._runSetupLoop(settings)
@@ -1,5 +1,14 @@
 import pygame
 from ..utils import *
+from ..interest_areas import TextLine, boxes_from_lines
+from .. import camera
+
+# pygame key -> key name of setup.SetupStateMachine
+PYGAME_KEYS = {
+    pygame.K_c: "c", pygame.K_v: "v", pygame.K_d: "d", pygame.K_e: "e", pygame.K_r: "r", pygame.K_q: "q",
+    pygame.K_RETURN: "enter", pygame.K_KP_ENTER: "enter", pygame.K_ESCAPE: "escape", pygame.K_SPACE: "space",
+    pygame.K_BACKSPACE: "backspace", pygame.K_DELETE: "delete",
+}
 
 class MultiLineText():
     def __init__(self, text:str, 
@@ -30,9 +39,11 @@ class MultiLineText():
         self.font = pygame.font.SysFont(fn, size=fs)
         self.images = []
         self.rects = []
+        self.lines = []
         for i, line in enumerate(text.split("\n")):
             lineImage = self.font.render(line.strip(), antialias=True, color=fc)
             self.images.append(lineImage)
+            self.lines.append(line.strip())
 
         # If screen_size is set, overwrite pos parameter according to placement
         if screen_size is not None:
@@ -62,6 +73,20 @@ class MultiLineText():
         for image, rect in zip(self.images, self.rects):
             canvas.blit(image, rect)
 
+    def interest_areas(self, level:str="word") -> list:
+        """Returns interest areas of the rendered text in screen (= tracker) coordinates.
+        Args:
+            level (str, optional): "word" or "character". Defaults to "word".
+        Returns:
+            list[InterestArea]: Interest areas in reading order.
+        """
+        lines = []
+        for line, rect in zip(self.lines, self.rects):
+            # prefix widths include kerning, so they match the rendered surface
+            edges = [rect.x + self.font.size(line[:i])[0] for i in range(len(line) + 1)]
+            lines.append(TextLine(line, edges, rect.top, rect.bottom))
+        return boxes_from_lines(lines, level)
+
 
 class Target():
     def __init__(self, x=0, y=0, outer_color=WHITE, inner_color=BLACK) -> None:
@@ -117,4 +142,40 @@ class Target():
             canvas.blit(self.image, self.rect)
 
     def update(self, dt):
-        pass
\ No newline at end of file
+        pass
+
+
+class CameraDisplay(camera.CameraDisplay):
+    def __init__(self, win:pygame.Surface, target:Target, bg_color:tuple=GREY, scale:int=2) -> None:
+        """Shows the eye camera image during EyeLink.doTrackerSetup, see camera.CameraDisplay.
+        The image is scaled by an integer factor into one reused surface.
+        """
+        super().__init__()
+        self.win = win
+        self.target_stim = target
+        self.bg_color = bg_color
+        self.scale = scale
+
+        self._surface = None
+        self._scaled = None
+
+    def poll(self) -> list:
+        return [pygame.key.name(e.key) for e in pygame.event.get() if e.type == pygame.KEYDOWN]
+
+    def render(self) -> None:
+        self.win.fill(self.bg_color)
+        if self.image_shown and self.image.frame > 0:
+            h, w = self.image.rgb.shape[:2]
+            if (self._surface is None) or (self._surface.get_size() != (w, h)):
+                self._surface = pygame.Surface((w, h))
+                self._scaled = pygame.Surface((w * self.scale, h * self.scale))
+            # surfarray is indexed [x, y]
+            pygame.surfarray.blit_array(self._surface, self.image.rgb.swapaxes(0, 1))
+            pygame.transform.scale(self._surface, self._scaled.get_size(), self._scaled)
+            self.win.blit(self._scaled, self._scaled.get_rect(center=self.win.get_rect().center))
+        elif self.target is not None:
+            self.target_stim.set_x(self.target[0])
+            self.target_stim.set_y(self.target[1])
+            self.target_stim.show()
+            self.target_stim.render(self.win)
+        pygame.display.update()
@@ -7,8 +7,20 @@ import os
 
 from typing import Tuple
 
-from .utils import Target
+from .utils import Target, CameraDisplay, PYGLET_KEYS
 from ..utils import *
+from ..interest_areas import send_interest_areas
+from ..realtime import apply_realtime
+from ..backdrop import BackdropManager
+from ..download import DownloadTask, receive_verified
+from ..session import session_path
+from ..naming import EdfNameAllocator
+from ..history import SampleHistory
+from ..link import LinkReader
+from ..setup import SetupStateMachine
+from ..fixation import FixationDetector
+from ..drift import DriftEstimator, DriftTrendMonitor
+from ..accuracy import QuickCheck, QuickCheckResult, check_targets
 
 
 class EyeConnector():
@@ -17,7 +29,7 @@ class EyeConnector():
         """Create connector object to communicate with an EyeLink 1000+.
         Args:
             win (pyglet.window.Window): window to draw to during setup.
-            host (str, optional): IP of the EyeLink Host PC. Defaults to "100.1.1.1".
+            host (str, optional): IP of the EyeLink Host PC, or a replay.ReplayEyeLink to run without tracker. Defaults to "100.1.1.1".
             eye (str, optional): Choose which eye to track. Options: ["both", "right", "left"]. Defaults to "both".
             prefix (str, optional): Session prefix. Will be added to all files handled by this connection. 
                                     Could, e.g., combine experiment and participant ID. Defaults to "".
@@ -26,6 +38,10 @@ class EyeConnector():
         """
         self.host = host
         self.eyelink = self.connect(host)
+        self.link = LinkReader(self.eyelink) # shared reader of the link data queue
+        self.backdrop = BackdropManager(self.eyelink) # backdrop and feedback graphics on the Host PC
+        self.setup = SetupStateMachine(self) # backend independent setup, drawn by this connector
+        self.camera = None # CameraDisplay, created by showCameraImage
         self.win = win
 
         assert(eye.lower() in ["both", "right", "left"])
@@ -46,19 +62,36 @@ class EyeConnector():
         self.v_status = 1000 # validation status: success = 0
         self.d_status = 1000 # drift correction status: success = 0
         self.callback = None
+        self.recording_listeners = [] # objects with on_recording_start(connector, msg) and on_recording_stop(connector)
+        self.sample_history = None # SampleHistory filled by getEyeSample, see enableSampleHistory
+        self.drift_estimator = None # DriftEstimator fed by getEyeSample, see enableDriftEstimation
+        self.drift_monitor = None # DriftTrendMonitor, see enableDriftMonitor
 
         # for the more fanciful interface
         self.v_error = None
+        self.v_result = None # validation.ValidationResult of the last accepted validation
         self._v_msg = ""
         self._drift_correct_direct_return = True
+        self._setup_active = False
+        self._setup_idle = False # update unscheduled on a static screen until a key is pressed
+        self._check = None # running accuracy.QuickCheck
+        self._check_callback = None
+        self._setup_keys = [] # key names pressed since the last setup step
+        self._setup_mode = "text"
 
         # housekeeping
         self.prefix = prefix
         self.download_directory = download_directory
-        self.edf_file_name = ""
+        self.edf_file_name = "" # local file name
+        self.host_file_name = "" # file name on the Host PC, see naming.EdfNameAllocator
+        self.file_block = 0 # number of files opened by openFile and rotateFile
+        self._file_base = ""
         self.sample_rate = sample_rate
+        self._iarea_sent = set() # interest areas sent in the current trial
+        self.realtime = [] # reports of setRealtimeMode
 
         os.makedirs(self.download_directory, exist_ok=True)
+        self.edf_names = EdfNameAllocator(self.download_directory)
 
         # assume the whole monitor is used. Get resolution from system.
         _monitor = screeninfo.get_monitors()[0]
@@ -89,8 +122,11 @@ class EyeConnector():
 
 
     ### CONNECTION
-    def connect(self, host:str):
-        """opens a connection to the EyeLink 100+ Host PC. Make sure to close an open connection."""
+    def connect(self, host):
+        """opens a connection to the EyeLink 100+ Host PC. Make sure to close an open connection.
+        host can also be an object implementing the pylink.EyeLink API, e.g. replay.ReplayEyeLink, which is used as is."""
+        if not isinstance(host, str):
+            return host
         return pylink.EyeLink(host)
 
     def close(self):
@@ -98,32 +134,65 @@ class EyeConnector():
         Returns:
             int: 0 on success. Oterhwise link error returned by device.
         """
+        self.backdrop.close()
+        if self.sample_history is not None:
+            if self.sample_history in self.recording_listeners:
+                self.recording_listeners.remove(self.sample_history)
+            self.sample_history.close()
+            self.sample_history = None
         if self.eyelink.isConnected():
             self.closeFile()
             self.eyelink.setOfflineMode()
             return self.eyelink.close()
         else:
             return 0
+
+    def setRealtimeMode(self, cores:list|None=None, priority:int|None=50, whole_process:bool=False,
+                        render_thread_id:int|None=None, render_cores:list|None=None) -> list:
+        """Pins the thread reading samples (the calling thread) to the given cores and requests SCHED_FIFO scheduling.
+        Falls back to a raised priority if real-time scheduling is not permitted. Linux only.
+        Args:
+            cores (list|None, optional): CPU cores for sample reading. Defaults to None, i.e. affinity is not changed.
+            priority (int|None, optional): SCHED_FIFO priority (1-99). Defaults to 50. None keeps the scheduling policy.
+            whole_process (bool, optional): Apply to all threads of the process instead. Defaults to False.
+            render_thread_id (int|None, optional): Native id of a separate render thread. Defaults to None.
+            render_cores (list|None, optional): CPU cores for the render thread. Defaults to None.
+        Returns:
+            list[RealtimeReport]: What was actually applied. Also stored in self.realtime.
+        """
+        self.realtime = apply_realtime(cores, priority, whole_process=whole_process)
+        if render_thread_id is not None:
+            self.realtime += apply_realtime(render_cores, priority, thread_id=render_thread_id)
+        return self.realtime
     
 
     ### FILE HANDLING
-    def openFile(self, file_name:str) -> None:
+    def openFile(self, file_name:str) -> bool:
         """Opens an edf file on the EyeLink. 
         Args:
             file_name (str): The edf file name is self.prefix + "_" + file_name, if self.prefix is specified. Otherwise it is just file_name.
+                Names longer than 8 characters are shortened on the Host PC and restored on download.
+        Returns:
+            bool: False if no Host PC file name is left.
         """
         _pf = self.prefix + "_" if self.prefix != "" else ""
         self.edf_file_name = _pf + file_name
         if not self.edf_file_name.endswith(".edf"):
             self.edf_file_name += ".edf"
-        if len(self.edf_file_name.split(".")[0]) > 8:
-            print("ERROR (EyeLinkConnector): edf file name is too long. Must be shorter or equal 8 characters.")
+        # the Host PC only accepts 8 characters. Longer names are mapped to a short name for the transfer.
+        try:
+            self.host_file_name = self.edf_names.allocate(self.edf_file_name)
+        except ValueError as e:
+            print(f"ERROR (EyeLinkConnector): {e}")
             return False
+        self._file_base = file_name[:-4] if file_name.endswith(".edf") else file_name
+        self.file_block = 1
 
-        self.eyelink.openDataFile(self.edf_file_name)
+        self.eyelink.openDataFile(self.host_file_name)
 
         # set header information
         self.eyelink.sendCommand(f"add_file_preamble_text 'RECORDED BY Pylink-Pyglet Connector tagged {self.prefix}'")
+        self.eyelink.sendMessage(f"EDF_FILE_NAME {self.edf_file_name} HOST {self.host_file_name}")
 
         # define coordinate system. Inverted for pyglet!
         self.eyelink.sendMessage(f"DISPLAY_COORDS 0 {self._h - 1} {self._w - 1} 0")
@@ -147,390 +216,285 @@ class EyeConnector():
         self.eyelink.setFileSampleFilter(file_sample_flags) # command file_sample_data
 
         # ... and make them available via link
-        link_event_flags = _eye_identifier + 'FIXATION,SACCADE,BLINK,BUTTON,FIXUPDATE,INPUT'
+        link_event_flags = _eye_identifier + 'FIXATION,SACCADE,BLINK,MESSAGE,BUTTON,FIXUPDATE,INPUT'
         link_sample_flags = _eye_identifier + 'GAZE,GAZERES,AREA,HTARGET,STATUS,INPUT'
         self.eyelink.sendCommand(f"link_event_filter = {link_event_flags}")
         self.eyelink.sendCommand(f"link_sample_data = {link_sample_flags}")
         
         self.eyelink.sendCommand(f"sample_rate {self.sample_rate}")
+        return True
 
     def closeFile(self) -> None:
         """Sets the tracker to offline mode and closes the currently opened edf file"""
         self.eyelink.setOfflineMode()
         self.eyelink.closeDataFile()
 
-    def downloadFile(self) -> None:
-        """Closes open file and downloads it to self.download_directory."""
+    def downloadFile(self, retries:int=3) -> int:
+        """Closes open file and downloads it to self.download_directory.
+        The received file is verified and the transfer is retried if it is incomplete.
+        Args:
+            retries (int, optional): Number of retries after a failed transfer. Defaults to 3.
+        Returns:
+            int: Size of the downloaded file in bytes. Raises IOError if all attempts failed.
+        """
         self.closeFile()
-        self.eyelink.receiveDataFile(self.edf_file_name, self.download_directory + self.edf_file_name)
-
+        return receive_verified(self.eyelink, self.host_file_name, self.download_directory + self.edf_file_name, retries)
 
-    ### GENERAL SETUP ENTRY
-    def startSetup(self, callback) -> None:
-        """Possible entry point. Shows the status screen from which other functions can be called.
+    def rotateFile(self, file_name:str|None=None, download:bool=True, retries:int=3, callback=None,
+                   show_progress:bool=True) -> DownloadTask|None:
+        """Closes the current edf file and continues in a new one, e.g. at the start of every block.
+        Smaller files can be downloaded during breaks instead of one large transfer at the end.
         Args:
-            callback (function): Callable that is called when setup is completed.
+            file_name (str|None, optional): Name of the new file, see openFile.
+                Defaults to None, i.e. the name passed to openFile with the block number appended, e.g. "exp_2".
+            download (bool, optional): Download the closed file in the background and open the new one when
+                the transfer ended. Defaults to True.
+            retries (int, optional): Number of retries after a failed transfer. Defaults to 3.
+            callback (function, optional): Callable that is called with the DownloadTask once the transfer ended
+                and the new file is open. Defaults to None.
+            show_progress (bool, optional): Show a progress screen during the transfer. Q/ESC cancels. Defaults to True.
+        Returns:
+            DownloadTask|None: The running transfer, see downloadFileAsync. None if the file is not downloaded.
+                Raises IOError if the new file could not be opened.
         """
-        self.callback = callback
-
-        # enter setup mode
-        self.eyelink.startSetup()
-
-        self._showStatusScreen()
-
-
-    ### CALIBRATION
-    def calibrate(self, callback):
-        """Possible entry point. Immediately starts the calibration. Shows the stastus screen afterwards.
+        base, block = self._file_base, self.file_block + 1
+        if not download:
+            self.closeFile()
+            self._openNextFile(file_name, base, block)
+            return None
+
+        def _on_done(task):
+            # the next block is recorded even if the transfer failed
+            self._openNextFile(file_name, base, block)
+            if callback is not None:
+                callback(task)
+        return self.downloadFileAsync(callback=_on_done, show_progress=show_progress, retries=retries)
+
+    def _openNextFile(self, file_name:str|None, base:str, block:int) -> None:
+        """Opens the file following a rotated one. Should not be called directly."""
+        name = f"{base}_{block}" if file_name is None else file_name
+        if not self.openFile(name):
+            raise IOError(f"Could not open {name} on the Host PC.")
+        if file_name is None:
+            self._file_base, self.file_block = base, block
+
+    def sessionPath(self) -> str:
+        """Returns the directory a converted session of the current edf file is stored in, see session.save_session."""
+        return session_path(self.download_directory, self.edf_file_name)
+
+    def downloadFileAsync(self, callback=None, show_progress:bool=True, retries:int=3) -> DownloadTask:
+        """Closes open file and downloads it to self.download_directory in a background thread.
+        Do not use the connector until the download is done.
         Args:
-            callback (function): Callable that is called when setup is completed.
+            callback (function, optional): Callable that is called with the DownloadTask when the transfer ended. Defaults to None.
+            show_progress (bool, optional): Show a progress screen during the transfer. Q/ESC cancels. Defaults to True.
+            retries (int, optional): Number of retries after a failed transfer. Defaults to 3.
+        Returns:
+            DownloadTask: The running transfer.
         """
-        # store callback and behaviour
-        self.callback = callback
-
-        # enter setup mode
-        self.eyelink.startSetup()
-
-        # configure calibration
-        self.eyelink.setCalibrationType("HV9")
-        self.eyelink.sendCommand("calibration_area_proportion = 0.5 0.5")
-        self.eyelink.sendCommand("validation_area_proportion = 0.5 0.5")
-
-        # start calibration on host
-        self.eyelink.sendKeybutton(C_KEY, 0, pylink.KB_PRESS)
-        self.eyelink.sendKeybutton(C_KEY, 0, pylink.KB_RELEASE)
-        self.eyelink.setAcceptTargetFixationButton(SPACE_KEY)
-
-        # push calibration draw and key_press handlers to window
-        self.win.push_handlers(on_draw=self._on_draw_target, on_key_press=self._on_key_press_calibration)
-
-        # schedule calibration update
-        pyglet.clock.schedule(self._update_calibration)
+        self.closeFile()
+        self._download = DownloadTask(self.eyelink, self.host_file_name, self.download_directory + self.edf_file_name, retries).start()
+        self._download_callback = callback
+        self._download_show_progress = show_progress
 
-    def _on_draw_target(self):
-        self.win.clear()
-        self.bg.draw()
-        self.target.draw()
+        if show_progress:
+            self.text.text = f"DOWNLOAD:\n\t> {self._download.progress_text()}"
+            self.win.push_handlers(on_draw=self._on_draw_text, on_key_press=self._on_key_press_download)
+        pyglet.clock.schedule_interval(self._update_download, 0.1)
 
-        return pyglet.event.EVENT_HANDLED # stop propagating down the on_draw handler stack
+        return self._download
 
-    def _on_key_press_calibration(self, symbol, modifiers):
-        if symbol == pyglet.window.key.SPACE:
-            # (manually) accept target fixation
-            self.eyelink.sendKeybutton(SPACE_KEY, 0, pylink.KB_PRESS)
-            self.eyelink.sendKeybutton(SPACE_KEY, 0, pylink.KB_RELEASE)
+    def _on_key_press_download(self, symbol, modifiers):
+        if (symbol == pyglet.window.key.Q) or (symbol == pyglet.window.key.ESCAPE):
+            self._download.cancel()
 
-        if symbol == pyglet.window.key.BACKSPACE:
-            # repeat previous target
-            self.eyelink.sendKeybutton(BACKSPACE_KEY, 0, pylink.KB_PRESS)
-            self.eyelink.sendKeybutton(BACKSPACE_KEY, 0, pylink.KB_RELEASE)
+        return pyglet.event.EVENT_HANDLED
 
-        if (symbol == pyglet.window.key.Q) or (symbol == pyglet.window.key.ESCAPE):
-            self.eyelink.sendKeybutton(ESC_KEY, 0, pylink.KB_PRESS)
-            self.eyelink.sendKeybutton(ESC_KEY, 0, pylink.KB_RELEASE)
-            self.eyelink.startSetup()
-            self.win.pop_handlers() # pop self._on_key_press_calibration
-            # self.win.pop_handlers() # pop self._on_draw_target
-            pyglet.clock.unschedule(self._update_calibration)
-            self.c_status = 27
-            self._showStatusScreen("Calibration was aborted.")
+    def _update_download(self, dt):
+        self._download.poll()
+        self.text.text = f"DOWNLOAD:\
+            \n\t> {self._download.progress_text()}\
+            \n\nPress Q/ESC to cancel."
+
+        if self._download.done():
+            pyglet.clock.unschedule(self._update_download)
+            if self._download_show_progress:
+                self.win.pop_handlers()
+            if self._download_callback is not None:
+                self._download_callback(self._download)
+
+
+    ### SETUP
+    def _startSetupStateMachine(self, entry:str, **kwargs) -> None:
+        """Starts the setup and drives it with the pyglet clock. Should not be called directly."""
+        self.setup.start(entry, **kwargs)
+        if not self._setup_active:
+            self._setup_active = True
+            self.win.push_handlers(on_draw=self._on_draw_setup, on_key_press=self._on_key_press_setup)
+            # link polls are rate limited, see self.setup.poll_interval
+            pyglet.clock.schedule_interval(self._update_setup, self.setup.poll_interval)
+        elif self._setup_idle:
+            self._wakeSetup()
+
+    def _wakeSetup(self) -> None:
+        self._setup_idle = False
+        pyglet.clock.schedule_interval(self._update_setup, self.setup.poll_interval)
+
+    def _on_key_press_setup(self, symbol, modifiers):
+        if symbol in PYGLET_KEYS:
+            self._setup_keys.append(PYGLET_KEYS[symbol])
+            if self._setup_idle:
+                self._wakeSetup()
 
         return pyglet.event.EVENT_HANDLED # stop propagating down the on_key_press handler stack
 
-    def _update_calibration(self, dt):
-        # get calibration target position
-        p = self.eyelink.getTargetPositionAndState()
-        if p[0]:
-            self.target.set_x(p[1])
-            self.target.set_y(p[2])
+    def _update_setup(self, dt):
+        keys, self._setup_keys = self._setup_keys, []
+        frame = self.setup.step(keys)
+
+        if frame.mode == "done":
+            pyglet.clock.unschedule(self._update_setup)
+            self.win.pop_handlers()
+            self._setup_active = False
+            self._setup_idle = False
+            # the experiment draws continuously again
+            self.win.invalid = True
+            if self.callback is not None:
+                self.callback(self.setup.result)
+            return
+
+        self._setup_mode = frame.mode
+        if self.setup.idle:
+            # static screen: no polling until a key is pressed
+            pyglet.clock.unschedule(self._update_setup)
+            self._setup_idle = True
+        if not frame.changed:
+            return
+        # redraw once, see _on_draw_setup
+        self.win.invalid = True
+        if frame.mode == "text":
+            self.text.text = frame.text
+        elif frame.target is not None:
+            self.target.set_x(frame.target[0])
+            self.target.set_y(frame.target[1])
             self.target.show()
         else:
             self.target.hide()
 
-        # check if calibration ended
-        c = self.eyelink.getCalibrationResult()
-        if c != 1000:
-            pyglet.clock.unschedule(self._update_calibration)
-            self.win.pop_handlers() # pop self._on_key_press_calibration
-
-            self.c_status = c
-            c_msg = self.eyelink.getCalibrationMessage()
-            self._showCalibrationDoneScreen(c_msg)
-
-
-    ## CALIBRATION DONE
-    def _showCalibrationDoneScreen(self, msg):
-        self.text.text = f"Calibration {STATUS_MSGS[self.c_status]}\
-            \n\t> {msg}\
-            \nPress ENTER to accept the calibration and continue.\
-            \nPress C to calibrate again.\
-            \nPress V to validate.\
-            \nPress BACKSPACE/ DELETE to discard the calibration."
-
-        # The drawing is the same as for the finished screen, so we can reuse that.
-        self.win.push_handlers(on_draw=self._on_draw_text, on_key_press=self._on_key_press_calibration_done)
+    def _on_draw_setup(self):
+        self.win.clear()
+        self.bg.draw()
+        if self._setup_mode == "text":
+            self.text.draw()
+        else:
+            self.target.draw()
+        # unchanged setup screens are not drawn again by a loop that checks win.invalid (see examplePyglet.py)
+        self.win.invalid = False
 
-    def _on_key_press_calibration_done(self, symbol, modifiers):
-        if symbol == pyglet.window.key.ENTER:
-            # accept calibration.
-            self.eyelink.sendKeybutton(ENTER_KEY, 0, pylink.KB_PRESS)
-            self.eyelink.sendKeybutton(ENTER_KEY, 0, pylink.KB_RELEASE)
+        return pyglet.event.EVENT_HANDLED # stop propagating down the on_draw handler stack
 
-            # return from calibration and continue/ call callback
-            self.win.pop_handlers()
-            self._showStatusScreen("Calibration accepted.")
+    def _on_draw_text(self):
+        self.win.clear()
+        self.bg.draw()
+        self.text.draw()
 
-        if symbol == pyglet.window.key.C:
-            # restart calibration on tracker
-            self.eyelink.sendKeybutton(DELETE_KEY, 0, pylink.KB_PRESS)
-            self.eyelink.sendKeybutton(DELETE_KEY, 0, pylink.KB_RELEASE)
+        return pyglet.event.EVENT_HANDLED
 
-            # start local handling
+    def showCameraImage(self) -> None:
+        """Shows the eye camera image. Keys are forwarded to the tracker, e.g. arrow keys to switch the camera view.
+        The tracker only sends the image within pylink's tracker setup, so this blocks until it is left with ESC.
+        Also available with E on the setup status screen.
+        """
+        if self.camera is None:
+            self.camera = CameraDisplay(self.win, self.target, self.bg)
+            pylink.openGraphicsEx(self.camera)
+        self.eyelink.doTrackerSetup()
+
+    def quickCheck(self, callback, n_targets:int=5, duration:float=1., max_error:float=1., area:float=.5, **kwargs) -> None:
+        """Fast accuracy check, e.g. between blocks: shows the targets one after another while recording over the link only
+        and evaluates accuracy and precision locally. Takes n_targets * duration seconds and does not enter setup mode.
+        Call it while not recording.
+        Args:
+            callback (function): Called with the QuickCheckResult when done.
+            n_targets (int, optional): 1 to 5 targets: center, then corners. Defaults to 5.
+            duration (float, optional): Time each target is shown in s. Defaults to 1.
+            max_error (float, optional): Largest accepted error of any target in degrees. Defaults to 1.
+            area (float, optional): Proportion of the screen covered by the targets. Defaults to .5.
+            **kwargs: Further arguments of accuracy.QuickCheck, e.g. pixels_per_degree. Without it and without the
+                resolution reported by the tracker, the results are in px and passed is None.
+        """
+        targets = check_targets(n_targets, (self._w / 2, self._h / 2), (self._w, self._h), area)
+        self._check = QuickCheck(self.eyelink, targets, duration, max_error=max_error, link=self.link, **kwargs)
+        self._check_callback = callback
+        self.win.push_handlers(on_draw=self._on_draw_check)
+        self._check.start()
+        pyglet.clock.schedule_interval(self._update_check, self.setup.poll_interval)
+
+    def _update_check(self, dt):
+        target = self._check.step()
+        if target is None:
+            pyglet.clock.unschedule(self._update_check)
             self.win.pop_handlers()
-            self.calibrate(self.callback)
+            if self.drift_monitor is not None:
+                self.drift_monitor.add_quick_check(self.eyelink.trackerTime(), self._check.result)
+            self._check_callback(self._check.result)
+            return
+        self.target.set_x(target[0])
+        self.target.set_y(target[1])
+        self.target.show()
 
-        if symbol == pyglet.window.key.V:
-            # restart calibration on tracker
-            self.eyelink.sendKeybutton(V_KEY, 0, pylink.KB_PRESS)
-            self.eyelink.sendKeybutton(V_KEY, 0, pylink.KB_RELEASE)
+    def _on_draw_check(self):
+        self.win.clear()
+        self.bg.draw()
+        self.target.draw()
 
-            # start local handling
-            self.win.pop_handlers()
-            self.validate()
+        return pyglet.event.EVENT_HANDLED
 
-        if (symbol == pyglet.window.key.BACKSPACE) or (symbol == pyglet.window.key.DELETE):
-            # Discard calibration without repeating
-            self.eyelink.sendKeybutton(ESC_KEY, 0, pylink.KB_PRESS)
-            self.eyelink.sendKeybutton(ESC_KEY, 0, pylink.KB_RELEASE)
+    ### GENERAL SETUP ENTRY
+    def startSetup(self, callback) -> None:
+        """Possible entry point. Shows the status screen from which other functions can be called.
+        Args:
+            callback (function): Callable that is called with the calibration status when setup is completed.
+        """
+        self.callback = callback
+        self._startSetupStateMachine("status")
 
-            # show status screen
-            self.win.pop_handlers()
-            self.c_status = 1000
-            self._showStatusScreen("Calibration discarded.")
 
-        return pyglet.event.EVENT_HANDLED
+    ### CALIBRATION
+    def calibrate(self, callback):
+        """Possible entry point. Immediately starts the calibration. Shows the stastus screen afterwards.
+        Args:
+            callback (function): Callable that is called with the calibration status when setup is completed.
+        """
+        self.callback = callback
+        self._startSetupStateMachine("calibration")
 
 
     ### VALIDATION
-    def validate(self):
+    def validate(self, failed_only:bool=False):
         """Starts the validation procedure. Shows the status screen afterwards. 
         This function provides NO entry point to the setup as a validation is usually done after a calibration.
+        Args:
+            failed_only (bool, optional): Only repeat the points of the last validation with an error above
+                self.setup.revalidation_threshold. Defaults to False.
         """
-        # start validation process
-        self.eyelink.sendKeybutton(V_KEY, 0, pylink.KB_PRESS)
-        self.eyelink.sendKeybutton(V_KEY, 0, pylink.KB_RELEASE)
-        self.eyelink.setAcceptTargetFixationButton(SPACE_KEY)
-
-        # The procedure is the same as for calibration, so we can use the same draw handler
-        self.win.push_handlers(on_draw=self._on_draw_target, on_key_press=self._on_key_press_validation)
-
-        # schedule validation update
-        pyglet.clock.schedule(self._update_validation)
-
-    def _on_key_press_validation(self, symbol, modifiers):
-        if symbol == pyglet.window.key.SPACE:
-            # (manually) accept target fixation
-            self.eyelink.sendKeybutton(SPACE_KEY, 0, pylink.KB_PRESS)
-            self.eyelink.sendKeybutton(SPACE_KEY, 0, pylink.KB_RELEASE)
-
-        if symbol == pyglet.window.key.BACKSPACE:
-            # repeat previous target
-            self.eyelink.sendKeybutton(BACKSPACE_KEY, 0, pylink.KB_PRESS)
-            self.eyelink.sendKeybutton(BACKSPACE_KEY, 0, pylink.KB_RELEASE)
-
-        if (symbol == pyglet.window.key.Q) or (symbol == pyglet.window.key.ESCAPE):
-            self.eyelink.sendKeybutton(ESC_KEY, 0, pylink.KB_PRESS)
-            self.eyelink.sendKeybutton(ESC_KEY, 0, pylink.KB_RELEASE)
-            self.eyelink.startSetup()
-            self.win.pop_handlers() # pop self._on_key_press_calibration
-            pyglet.clock.unschedule(self._update_validation)
-            self.v_status = 27
-            self._showStatusScreen("Validation was aborted.")
-
-        return pyglet.event.EVENT_HANDLED
-    
-    def _update_validation(self, dt):
-        # get validation target position
-        p = self.eyelink.getTargetPositionAndState()
-        if p[0]:
-            self.target.set_x(p[1])
-            self.target.set_y(p[2])
-            self.target.show()
-        else:
-            self.target.hide()
-
-        # check if  ended
-        v = self.eyelink.getCalibrationResult()
-        if v != 1000:
-            pyglet.clock.unschedule(self._update_validation)
-            self.win.pop_handlers() # pop self._on_key_press_calibration
-
-            self.v_status = v
-            v_msg = self.eyelink.getCalibrationMessage()
-            self._showValidationDoneScreen(v_msg)
-
-
-    ## VALIDATION DONE
-    def _showValidationDoneScreen(self, msg):
-        self._v_msg = msg
-        self.text.text = f"Validation {STATUS_MSGS[self.v_status]}\
-            \n\t> {msg}\
-            \nPress ENTER to accept the validation and continue.\
-            \nPress V to validate again.\
-            \nPress BACKSPACE/ DELETE to discard the validation."
+        self._startSetupStateMachine("validation", failed_only=failed_only)
 
-        # The drawing is the same as for the finished screen, so we can reuse that.
-        self.win.push_handlers(on_draw=self._on_draw_text, on_key_press=self._on_key_press_validation_done)
-
-    def _on_key_press_validation_done(self, symbol, modifiers):
-        if symbol == pyglet.window.key.V:
-            # restart validation on tracker
-            self.eyelink.sendKeybutton(DELETE_KEY, 0, pylink.KB_PRESS)
-            self.eyelink.sendKeybutton(DELETE_KEY, 0, pylink.KB_RELEASE)
-
-            # start local handling
-            self.win.pop_handlers()
-            self.validate()
-
-        if (symbol == pyglet.window.key.BACKSPACE) or (symbol == pyglet.window.key.DELETE):
-            # Discard validation without repeating
-            self.eyelink.sendKeybutton(ESC_KEY, 0, pylink.KB_PRESS)
-            self.eyelink.sendKeybutton(ESC_KEY, 0, pylink.KB_RELEASE)
-
-            # show status screen
-            self.win.pop_handlers()
-            self.v_status = 1000
-            self._showStatusScreen("Validation discarded.")
-
-        if symbol == pyglet.window.key.ENTER:
-            # accept calibration and validation.
-            self.eyelink.sendKeybutton(ENTER_KEY, 0, pylink.KB_PRESS)
-            self.eyelink.sendKeybutton(ENTER_KEY, 0, pylink.KB_RELEASE)
-
-            # store validation error
-            v_res = self._v_msg.split(":")[1].strip().split(" ")
-            self.v_error = (float(v_res[0]), float(v_res[4]))
-
-            # return from calibration and continue/ call callback
-            self.win.pop_handlers()
-            self._showStatusScreen("Validation accepted.")
-
-        return pyglet.event.EVENT_HANDLED
-        
 
     ### DRIFT CORRECTION
     def driftCorrect(self, callback, direct_return=True):
         """Possible entry point. Immediately starts the drift correction. Shows the stastus screen afterwards.
         Args:
             callback (function): Callable that is called when setup is completed.
+            direct_return (bool, optional): Call the callback with the drift correction status right after the
+                drift correction instead of showing the status screen. Defaults to True.
         """
         self.callback = callback
         self._drift_correct_direct_return = direct_return
 
-        
         # place target in the middle of the screen
-        self.target.set_x(self.win.width//2)
-        self.target.set_y(self.win.height//2)
-        self.target.show()
-
-        self.eyelink.startDriftCorrect(self.win.width//2, self.win.height//2)
-
-        # make sure "Apply correction" is active
-        # ... TODO
-
-        self.win.push_handlers(on_draw=self._on_draw_target, on_key_press=self._on_key_press_drift)
-        pyglet.clock.schedule(self._update_drift)
-
-        # same process as done before:
-        # # start drift correction process
-        # self.eyelink.sendKeybutton(D_KEY, 0, pylink.KB_PRESS)
-        # self.eyelink.sendKeybutton(D_KEY, 0, pylink.KB_RELEASE)
-        # self.eyelink.setAcceptTargetFixationButton(SPACE_KEY)
-
-
-    def _on_key_press_drift(self, symbol, modifiers):
-        if symbol == pyglet.window.key.SPACE:
-            self.eyelink.sendKeybutton(SPACE_KEY, 0, pylink.KB_PRESS)
-            self.eyelink.sendKeybutton(SPACE_KEY, 0, pylink.KB_RELEASE)
-
-        if (symbol == pyglet.window.key.Q) or (symbol == pyglet.window.key.ESCAPE):
-            self.win.pop_handlers()
-            pyglet.clock.unschedule(self._update_drift)
-
-            # leave drift correct mode on tracker
-            self.eyelink.sendKeybutton(ESC_KEY, 0, pylink.KB_PRESS)
-            self.eyelink.sendKeybutton(ESC_KEY, 0, pylink.KB_RELEASE)
-            # # enter setup mode
-            # self.eyelink.startSetup()
-
-            if self._drift_correct_direct_return:
-                self.callback(27)
-            else:
-                self._showStatusScreen("Drift correction aborted.")
-
-        return pyglet.event.EVENT_HANDLED
-            
-    def _update_drift(self, dt):
-        d = self.eyelink.getCalibrationResult()
-        if d != 1000:
-            d_msg = self.eyelink.getCalibrationMessage()
-            # print(f"> d_msg: {d_msg}")
-            r = self.eyelink.applyDriftCorrect()
-
-            self.win.pop_handlers()
-            pyglet.clock.unschedule(self._update_drift)
-
-            # enter setup mode
-            self.eyelink.startSetup()
-
-            self.d_status = d
-
-            if self._drift_correct_direct_return:
-                self.callback(d)
-            else:
-                self._showStatusScreen("Drift correction applied.")
-
-
-    ### STATUS SCREEN
-    def _showStatusScreen(self, msg = ""):
-        self.text.text = f"STATUS:\
-            \n\t> {msg}\
-            \n\nCalibration: {STATUS_MSGS[self.c_status]}\
-            \nValidation: {STATUS_MSGS[self.v_status]}{f' - avg. error: {self.v_error} °' if self.v_error is not None else ''}\
-            \n\n\tPress C to {'(re)' if self.c_status != 1000 else ''}calibrate.\
-            \n\tPress V to {'(re)' if self.v_status != 1000 else ''}validate.\
-            \n\tPress D to drift correct.\
-            \n\tPress Q/ENTER to quit setup and continue.\
-            \n\nUse SPACE to manually accept a fixation."
-
-        self.win.push_handlers(on_draw=self._on_draw_text, on_key_press=self._on_key_press_status)
-
-    def _on_draw_text(self):
-        self.win.clear()
-        self.bg.draw()
-        self.text.draw()
-
-        return pyglet.event.EVENT_HANDLED
-
-    def _on_key_press_status(self, symbol, modifiers):
-        if symbol == pyglet.window.key.C:
-            self.win.pop_handlers() # pop self._on_key_press_status and self._on_draw_text
-            self.calibrate(self.callback)
-
-        if symbol == pyglet.window.key.V:
-            self.win.pop_handlers()
-            self.validate()
-
-        if symbol == pyglet.window.key.D:
-            self.win.pop_handlers()
-            self.driftCorrect(self.callback)
-
-        if (symbol == pyglet.window.key.Q) or (symbol == pyglet.window.key.ENTER):
-            self.eyelink.setOfflineMode()
-            self.win.pop_handlers()
-            self.callback(self.c_status)
-
-        return pyglet.event.EVENT_HANDLED
+        self._startSetupStateMachine("drift", return_to_status=not direct_return,
+                                     drift_pos=(self.win.width//2, self.win.height//2))
 
 
     ### TRACKING
@@ -545,6 +509,10 @@ class EyeConnector():
 
         timestamp = datetime.datetime.now()
         self.eyelink.sendMessage(f"TIMESTAMP {timestamp} - START OF TRIAL {msg}")
+        # notify listeners before recording, so their setup does not delay the first samples
+        for listener in self.recording_listeners:
+            listener.on_recording_start(self, msg)
+
         # arguments: sample_to_file, events_to_file, sample_over_link, event_over_link 
         self.eyelink.startRecording(1, 1, 1, 1)
 
@@ -555,9 +523,87 @@ class EyeConnector():
         timestamp = datetime.datetime.now()
         self.eyelink.sendMessage(f"TIMESTAMP {timestamp} - END OF TRIAL {self.trial_msg}")
         self.eyelink.stopRecording()
+        self._iarea_sent = set()
+
+        for listener in self.recording_listeners:
+            listener.on_recording_stop(self)
+
+    def sendInterestAreas(self, areas:list) -> int:
+        """Sends interest areas to the edf file as one block of `!V IAREA RECTANGLE` messages.
+        Duplicates and areas already sent in the current trial are skipped.
+        Args:
+            areas (list[InterestArea]): Interest areas in tracker coordinates, e.g. from interest_areas_from_layout().
+        Returns:
+            int: Number of interest areas sent.
+        """
+        return send_interest_areas(self.eyelink, areas, self._iarea_sent)
 
 
     ### COMMUNICATION
+    def enableSampleHistory(self, directory:str|None=None) -> SampleHistory:
+        """Keeps all samples of the session in a memory-mapped SampleHistory, e.g. for history.last(3000) or history.trial(-1).
+        Samples queued on the link are stored with every getEyeSample call and at the end of every trial.
+        Args:
+            directory (str|None, optional): Directory of the history files. Defaults to None, i.e. a temporary directory.
+        Returns:
+            SampleHistory: The history, also stored in self.sample_history.
+        """
+        self.sample_history = SampleHistory(directory)
+        self.sample_history.drift_estimator = self.drift_estimator
+        self.recording_listeners.append(self.sample_history)
+        return self.sample_history
+
+    def enableDriftEstimation(self, apply:bool=False, **kwargs) -> DriftEstimator:
+        """Estimates the drift from fixations on reference points during recording, e.g. a central fixation cross:
+        call self.drift_estimator.set_reference((x, y)) while it is shown. The estimate is written to the edf file
+        at the end of each trial.
+        Args:
+            apply (bool, optional): Correct the gaze of getEyeSample and of the sample history by the estimate. Defaults to False.
+            **kwargs: Thresholds of the reference fixations, see DriftEstimator.
+        Returns:
+            DriftEstimator: The estimator, also stored in self.drift_estimator.
+        """
+        self.drift_estimator = DriftEstimator(apply=apply, **kwargs)
+        self.recording_listeners.append(self.drift_estimator)
+        if self.sample_history is not None:
+            self.sample_history.drift_estimator = self.drift_estimator
+        if self.drift_monitor is not None:
+            self.drift_monitor.estimator = self.drift_estimator
+        return self.drift_estimator
+
+    def enableDriftMonitor(self, **kwargs) -> DriftTrendMonitor:
+        """Collects the offsets of drift corrections, quick checks and the drift estimator (if enabled) to tell
+        when a correction is actually needed, see recommendedCorrection.
+        Args:
+            **kwargs: Thresholds in degrees and trend settings, see DriftTrendMonitor. Without pixels_per_degree the resolution
+                is taken from the first drift check, quick check or sample that reports it.
+        Returns:
+            DriftTrendMonitor: The monitor, also stored in self.drift_monitor.
+        """
+        self.drift_monitor = DriftTrendMonitor(**kwargs)
+        self.drift_monitor.estimator = self.drift_estimator
+        return self.drift_monitor
+
+    def recommendedCorrection(self) -> str:
+        """Returns "none", "drift_correction" or "recalibration" according to the drift monitor,
+        e.g. to only drift correct before a trial when needed. "none" if no monitor is enabled."""
+        if self.drift_monitor is None:
+            return "none"
+        return self.drift_monitor.recommend(self.eyelink.trackerTime())
+
+    def enableAutoAccept(self, dispersion:float=40., duration:float=300., max_distance:float|None=120.) -> FixationDetector:
+        """Accepts calibration, validation and drift correction targets when the gaze rests on them, e.g. for setups without operator.
+        SPACE still works. Set self.setup.auto_accept = None to disable it again.
+        Args:
+            dispersion (float, optional): Maximum dispersion of the fixation in px. Defaults to 40.
+            duration (float, optional): Minimum fixation duration in ms. Defaults to 300.
+            max_distance (float|None, optional): Maximum distance to the target in px. Not applied during the calibration. Defaults to 120.
+        Returns:
+            FixationDetector: The detector, also stored in self.setup.auto_accept.
+        """
+        self.setup.auto_accept = FixationDetector(dispersion, duration, max_distance)
+        return self.setup.auto_accept
+
     def getEyeSample(self) -> Tuple[Sample, Sample] | Sample:
         """Return the latest eye sample. A sample contains 
             Gaze position as (x, y) in px
@@ -571,17 +617,23 @@ class EyeConnector():
             Tuple[Sample, Sample]: Sample of the Left and Sample of the Right eye.
         """
         s = self.eyelink.getNewestSample()
+        if self.sample_history is not None:
+            self.sample_history.poll(self.link)
+        if self.drift_estimator is not None:
+            self.drift_estimator.update(s)
+        if self.drift_monitor is not None:
+            self.drift_monitor.update_resolution(s)
 
         if self.eye == "both":
             if s.isLeftSample():
                 l = s.getLeftEye()
-                ls = Sample(l.getGaze(), l.getHREF(), l.getRawPupil(), l.getPupilSize())
+                ls = self._eyeSample(l, "left")
             else:
                 ls = self.dummy_sample
 
             if s.isRightSample():
                 r = s.getRightEye()
-                rs = Sample(r.getGaze(), r.getHREF(), r.getRawPupil(), r.getPupilSize())
+                rs = self._eyeSample(r, "right")
             else:
                 rs = self.dummy_sample
 
@@ -590,15 +642,21 @@ class EyeConnector():
             if s.isLeftSample():
                 if self.eye == "left":
                     l = s.getLeftEye()
-                    return Sample(l.getGaze(), l.getHREF(), l.getRawPupil(), l.getPupilSize())
+                    return self._eyeSample(l, "left")
                 else:
                     raise(ValueError, "Expected left eye sample but received right eye sample.")
             elif s.isRightSample():
                 if self.eye == "right":
                     r = s.getRightEye()
-                    return Sample(r.getGaze(), r.getHREF(), r.getRawPupil(), r.getPupilSize())
+                    return self._eyeSample(r, "right")
                 else:
                     raise(ValueError, "Expected right eye sample but received left eye sample.")
             else:
                 raise(ValueError, "Received sample is neither left nor right.")
                 # return self.dummy_sample
+
+    def _eyeSample(self, e, eye:str) -> Sample:
+        gaze = e.getGaze()
+        if (self.drift_estimator is not None) and self.drift_estimator.apply:
+            gaze = self.drift_estimator.correct(gaze, eye)
+        return Sample(gaze, e.getHREF(), e.getRawPupil(), e.getPupilSize())
@@ -1,5 +1,15 @@
 import pyglet
+from itertools import accumulate
 from ..utils import *
+from ..interest_areas import TextLine, boxes_from_lines
+from .. import camera
+
+# pyglet key -> key name of setup.SetupStateMachine
+PYGLET_KEYS = {
+    pyglet.window.key.C: "c", pyglet.window.key.V: "v", pyglet.window.key.D: "d", pyglet.window.key.E: "e", pyglet.window.key.R: "r", pyglet.window.key.Q: "q",
+    pyglet.window.key.ENTER: "enter", pyglet.window.key.NUM_ENTER: "enter", pyglet.window.key.ESCAPE: "escape",
+    pyglet.window.key.SPACE: "space", pyglet.window.key.BACKSPACE: "backspace", pyglet.window.key.DELETE: "delete",
+}
 
 class Target():
     def __init__(self, x=0, y=0, outer_color=WHITE, inner_color=BLACK, batch=None) -> None:
@@ -40,4 +50,85 @@ class Target():
             self.inner.draw()
 
     def update(self, dt):
-        pass
\ No newline at end of file
+        pass
+
+def interest_areas_from_layout(layout:pyglet.text.layout.TextLayout, level:str="word") -> list:
+    """Returns interest areas of a pyglet Label or TextLayout in window (= tracker) coordinates.
+    Lines are taken from explicit line breaks in the text. Automatically wrapped lines are not split.
+    Args:
+        layout (pyglet.text.layout.TextLayout): The rendered label or layout.
+        level (str, optional): "word" or "character". Defaults to "word".
+    Returns:
+        list[InterestArea]: Interest areas in reading order.
+    """
+    font = layout.document.get_font(0)
+    line_height = font.ascent - font.descent
+    line_spacing = layout.document.get_style("line_spacing") or line_height
+    align = layout.document.get_style("align") or "left"
+
+    # bounding box of the layout
+    box_w = layout.width if (layout.multiline and layout.width is not None) else layout.content_width
+    left = layout.x - {"left": 0, "center": box_w / 2, "right": box_w}[layout.anchor_x]
+    top = layout.y + {"top": 0, "center": layout.content_height / 2, "bottom": layout.content_height,
+                      "baseline": font.ascent}[layout.anchor_y]
+
+    lines = []
+    for i, text in enumerate(layout.document.text.split("\n")):
+        advances = [0] + list(accumulate(g.advance for g in font.get_glyphs(text)))
+        line_x = left + {"left": 0, "center": (box_w - advances[-1]) / 2, "right": box_w - advances[-1]}[align]
+        line_top = top - i * line_spacing
+        lines.append(TextLine(text, [line_x + a for a in advances], line_top, line_top - line_height))
+    return boxes_from_lines(lines, level)
+
+
+class CameraDisplay(camera.CameraDisplay):
+    def __init__(self, win:pyglet.window.Window, target:Target, background, scale:int=2) -> None:
+        """Shows the eye camera image during EyeLink.doTrackerSetup, see camera.CameraDisplay.
+        Frames are uploaded into one reused texture.
+        """
+        super().__init__()
+        self.win = win
+        self.target_stim = target
+        self.background = background
+        self.scale = scale
+
+        self._texture = None
+        self._pressed = []
+
+    def setup_cal_display(self):
+        super().setup_cal_display()
+        self.win.push_handlers(on_key_press=self._on_key_press)
+
+    def exit_cal_display(self):
+        super().exit_cal_display()
+        self.win.pop_handlers()
+
+    def _on_key_press(self, symbol, modifiers):
+        self._pressed.append(pyglet.window.key.symbol_string(symbol).lower())
+        return pyglet.event.EVENT_HANDLED
+
+    def poll(self) -> list:
+        # doTrackerSetup blocks the pyglet event loop, so dispatch the window events here
+        self.win.dispatch_events()
+        keys, self._pressed = self._pressed, []
+        return keys
+
+    def render(self) -> None:
+        self.win.switch_to()
+        self.win.clear()
+        self.background.draw()
+        if self.image_shown and self.image.frame > 0:
+            h, w = self.image.rgb.shape[:2]
+            if (self._texture is None) or (self._texture.width, self._texture.height) != (w, h):
+                self._texture = pyglet.image.Texture.create(w, h)
+            # negative pitch: the rows are stored top-down
+            data = pyglet.image.ImageData(w, h, "RGB", self.image.rgb.tobytes(), pitch=-w * 3)
+            self._texture.blit_into(data, 0, 0, 0)
+            self._texture.blit((self.win.width - w * self.scale) // 2, (self.win.height - h * self.scale) // 2,
+                               width=w * self.scale, height=h * self.scale)
+        elif self.target is not None:
+            self.target_stim.set_x(self.target[0])
+            self.target_stim.set_y(self.target[1])
+            self.target_stim.show()
+            self.target_stim.draw()
+        self.win.flip()
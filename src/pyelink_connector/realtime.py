@@ -0,0 +1,113 @@
+import os
+import threading
+from typing import NamedTuple
+
+
+class RealtimeReport(NamedTuple):
+    thread_id: int
+    cores: tuple|None # cores the thread may run on, None if unknown
+    policy: str # scheduling policy in effect
+    priority: int # real-time priority, or niceness for non real-time policies
+    requested: str # what was requested
+
+
+_POLICY_NAMES = {getattr(os, n): n for n in ["SCHED_OTHER", "SCHED_FIFO", "SCHED_RR", "SCHED_BATCH", "SCHED_IDLE"] if hasattr(os, n)}
+
+
+def apply_realtime(cores:list|None=None, priority:int|None=50, thread_id:int|None=None, whole_process:bool=False) -> list:
+    """Pins a thread to the given cores and requests SCHED_FIFO scheduling.
+    If real-time scheduling is not permitted, a raised priority (lower niceness) is requested instead.
+    Only supported on Linux. On other systems nothing is changed.
+
+    Args:
+        cores (list|None, optional): CPU cores to pin to. Defaults to None, i.e. affinity is not changed.
+        priority (int|None, optional): SCHED_FIFO priority (1-99). Defaults to 50. None keeps the scheduling policy.
+        thread_id (int|None, optional): Native thread id. Defaults to None, i.e. the calling thread.
+        whole_process (bool, optional): Apply to all threads of this process. Defaults to False.
+
+    Returns:
+        list[RealtimeReport]: What was actually applied, one report per thread.
+    """
+    if not hasattr(os, "sched_setaffinity"):
+        print("WARNING (EyeLinkConnector): real-time mode is only supported on Linux. Nothing changed.")
+        return []
+
+    if whole_process:
+        tids = [int(t) for t in os.listdir("/proc/self/task")]
+    else:
+        tids = [thread_id if thread_id is not None else threading.get_native_id()]
+
+    reports = []
+    for tid in tids:
+        requested = []
+        if cores is not None:
+            requested.append(f"cores {sorted(cores)}")
+            try:
+                os.sched_setaffinity(tid, cores)
+            except OSError as e:
+                print(f"WARNING (EyeLinkConnector): could not set cpu affinity of thread {tid}: {e}")
+
+        if priority is not None:
+            requested.append(f"SCHED_FIFO {priority}")
+            try:
+                os.sched_setscheduler(tid, os.SCHED_FIFO, os.sched_param(priority))
+            except OSError as e:
+                # not permitted or invalid priority: fall back to a raised priority within the normal scheduler
+                print(f"WARNING (EyeLinkConnector): could not set SCHED_FIFO {priority} for thread {tid}: {e}")
+                try:
+                    os.setpriority(os.PRIO_PROCESS, tid, -10)
+                except OSError:
+                    pass
+
+        reports.append(get_realtime_state(tid, ", ".join(requested)))
+
+    for r in reports:
+        print(f"INFO (EyeLinkConnector): thread {r.thread_id} requested [{r.requested}], "
+              f"got cores {list(r.cores) if r.cores is not None else '?'}, {r.policy} priority {r.priority}.")
+    return reports
+
+
+def get_realtime_state(thread_id:int|None=None, requested:str="") -> RealtimeReport:
+    """Returns affinity and scheduling currently in effect for a thread (default: the calling thread)."""
+    tid = thread_id if thread_id is not None else threading.get_native_id()
+
+    cores = tuple(sorted(os.sched_getaffinity(tid))) if hasattr(os, "sched_getaffinity") else None
+    if hasattr(os, "sched_getscheduler"):
+        policy = os.sched_getscheduler(tid)
+        if policy in (getattr(os, "SCHED_FIFO", None), getattr(os, "SCHED_RR", None)):
+            priority = os.sched_getparam(tid).sched_priority
+        else:
+            priority = os.getpriority(os.PRIO_PROCESS, tid)
+        policy = _POLICY_NAMES.get(policy, str(policy))
+    else:
+        policy, priority = "unknown", 0
+
+    return RealtimeReport(tid, cores, policy, priority, requested)
+
+
+def restore_realtime(state:RealtimeReport) -> RealtimeReport:
+    """Restores affinity and scheduling recorded with get_realtime_state, e.g. after apply_realtime.
+    Returns:
+        RealtimeReport: State in effect afterwards.
+    """
+    tid = state.thread_id
+    if not hasattr(os, "sched_setaffinity"):
+        return get_realtime_state(tid, "restore")
+
+    if state.cores is not None:
+        try:
+            os.sched_setaffinity(tid, state.cores)
+        except OSError as e:
+            print(f"WARNING (EyeLinkConnector): could not restore cpu affinity of thread {tid}: {e}")
+
+    policy = getattr(os, state.policy, None)
+    if policy is not None:
+        realtime = policy in (getattr(os, "SCHED_FIFO", None), getattr(os, "SCHED_RR", None))
+        try:
+            os.sched_setscheduler(tid, policy, os.sched_param(state.priority if realtime else 0))
+            if not realtime:
+                os.setpriority(os.PRIO_PROCESS, tid, state.priority)
+        except OSError as e:
+            print(f"WARNING (EyeLinkConnector): could not restore scheduling of thread {tid}: {e}")
+
+    return get_realtime_state(tid, "restore")
@@ -0,0 +1,272 @@
+import pylink
+import numpy as np
+import os
+
+from .asc import read_asc
+from .session import Session
+
+MISSING_DATA = -32768. # pylink.MISSING_DATA
+SAMPLE_TYPE = 200 # pylink.SAMPLE_TYPE
+
+
+def load_recording(source):
+    """Returns (samples, trials) column dicts of a session directory, an asc file, a Session, AscData or SampleHistory."""
+    if isinstance(source, str):
+        source = Session(source) if os.path.isdir(source) else read_asc(source)
+    if hasattr(source, "samples") and hasattr(source, "trials"):
+        return source.samples, source.trials
+    return source
+
+
+class ReplayEye():
+    def __init__(self, gaze:tuple, pupil:float) -> None:
+        self._gaze = gaze
+        self._pupil = pupil
+
+    def getGaze(self) -> tuple:
+        return self._gaze
+
+    def getHREF(self) -> tuple:
+        # not part of asc exports
+        return (MISSING_DATA, MISSING_DATA)
+
+    def getRawPupil(self) -> tuple:
+        return (MISSING_DATA, MISSING_DATA)
+
+    def getPupilSize(self) -> float:
+        return self._pupil
+
+
+class ReplaySample():
+    def __init__(self, t:float, left:ReplayEye|None, right:ReplayEye|None) -> None:
+        """A recorded sample with the accessors of pylink's sample class."""
+        self._t = t
+        self._left = left
+        self._right = right
+
+    def getTime(self) -> float:
+        return self._t
+
+    def isLeftSample(self) -> bool:
+        return self._left is not None
+
+    def isRightSample(self) -> bool:
+        return self._right is not None
+
+    def isBinocular(self) -> bool:
+        return (self._left is not None) and (self._right is not None)
+
+    def getLeftEye(self) -> ReplayEye:
+        return self._left
+
+    def getRightEye(self) -> ReplayEye:
+        return self._right
+
+
+class ReplayEyeLink():
+    records_files = False # downloads are skipped, see download.receive_verified
+
+    def __init__(self, source, speed:float=1., step_ms:float|None=None, align_trials:bool=True) -> None:
+        """Plays back a recording through the parts of the pylink.EyeLink API used by EyeConnector.
+        Pass it as host to an EyeConnector to run an experiment without tracker:
+
+            eyeConnector = EyeConnector(win, host=ReplayEyeLink("./eye_tracking/TEST.session", speed=2.))
+
+        Setup routines succeed immediately, messages and commands are collected in self.messages and self.commands.
+        Nothing is recorded to a file, so downloads are skipped.
+
+        Args:
+            source: Session directory, asc file, session.Session, asc.AscData, history.SampleHistory
+                or a (samples, trials) tuple of column dicts.
+            speed (float, optional): Playback speed relative to real time. Defaults to 1.
+            step_ms (float|None, optional): Deterministic timing: tracker time only advances by step_ms per
+                getNewestSample call, per getNextData call on an empty queue and by advance(), e.g. 1000/60 to emulate
+                a 60 Hz render loop.
+                Defaults to None, i.e. the clock follows real time.
+            align_trials (bool, optional): The START OF TRIAL message of EyeConnector.startRecording jumps to the start
+                of the next recorded trial. Defaults to True.
+        """
+        samples, trials = load_recording(source)
+        self.times = np.asarray(samples["time"], dtype=np.float64)
+        self._eyes = []
+        for e in ["l", "r"]:
+            if f"x_{e}" in samples:
+                cols = [np.asarray(samples[f"{c}_{e}"], dtype=np.float64) for c in ["x", "y", "pupil"]]
+                self._eyes.append((e, np.stack(cols, axis=1)))
+            else:
+                self._eyes.append((e, None))
+        self.trial_starts = np.asarray(trials["start"], dtype=np.float64)
+
+        self.speed = speed
+        self.step_ms = step_ms
+        self.align_trials = align_trials
+
+        self.messages = [] # (tracker time, text)
+        self.commands = []
+        self.recording = False
+
+        self._connected = True
+        self._trial = 0
+        self._origin = self.times[0] if self.times.size else 0. # recorded time at the reference point
+        self._wall_origin = pylink.currentDoubleUsec() / 1000. # ms, same clock as the connectors
+        self._elapsed = 0. # deterministic clock
+        self._queue_index = None # next sample for getNextData
+        self._queue_end = None # time of the last queued sample after the recording stopped
+        self._current = None
+
+    ### CLOCK
+    def trackerTime(self) -> float:
+        """Current playback position in recorded tracker time (ms)."""
+        if self.step_ms is not None:
+            return self._origin + self._elapsed
+        return self._origin + (pylink.currentDoubleUsec() / 1000. - self._wall_origin) * self.speed
+
+    def trackerTimeOffset(self) -> float:
+        """Offset of the tracker clock to pylink.currentTime(). Only meaningful for real-time playback."""
+        return self.trackerTime() - pylink.currentDoubleUsec() / 1000.
+
+    def advance(self, ms:float) -> None:
+        """Advances the deterministic clock."""
+        self._elapsed += ms
+
+    def seek(self, t:float) -> None:
+        """Continues playback from recorded time t."""
+        self._origin = t
+        self._elapsed = 0.
+        self._wall_origin = pylink.currentDoubleUsec() / 1000.
+        if self._queue_index is not None:
+            self._queue_index = int(np.searchsorted(self.times, t, side="left"))
+
+    def _index(self, t:float) -> int:
+        return int(np.searchsorted(self.times, t, side="right")) - 1
+
+    def finished(self) -> bool:
+        return self.trackerTime() > self.times[-1] if self.times.size else True
+
+    ### SAMPLES
+    def _sample(self, i:int) -> ReplaySample:
+        eyes = []
+        for _, values in self._eyes:
+            if values is None:
+                eyes.append(None)
+                continue
+            x, y, pupil = values[i]
+            gaze = (MISSING_DATA if np.isnan(x) else float(x), MISSING_DATA if np.isnan(y) else float(y))
+            eyes.append(ReplayEye(gaze, 0. if np.isnan(pupil) else float(pupil)))
+        return ReplaySample(float(self.times[i]), *eyes)
+
+    def getNewestSample(self) -> ReplaySample|None:
+        if self.step_ms is not None:
+            self._elapsed += self.step_ms
+        i = self._index(self.trackerTime())
+        return self._sample(i) if i >= 0 else None
+
+    def getNextData(self) -> int:
+        """Returns SAMPLE_TYPE while recorded samples up to the current time are queued, 0 otherwise."""
+        # like the tracker, samples recorded before stopRecording stay queued until they are read
+        end = self.trackerTime() if self.recording else self._queue_end
+        if ((end is None) or (self._queue_index is None) or (self._queue_index >= self.times.size)
+                or (self.times[self._queue_index] > end)):
+            # the queue is empty: loops reading it until trackerTime passes a deadline, e.g. QuickCheck, move on
+            if self.step_ms is not None:
+                self._elapsed += self.step_ms
+            return 0
+        self._current = self._sample(self._queue_index)
+        self._queue_index += 1
+        return SAMPLE_TYPE
+
+    def getFloatData(self) -> ReplaySample:
+        return self._current
+
+    ### RECORDING
+    def startRecording(self, file_samples:int=1, file_events:int=1, link_samples:int=1, link_events:int=1) -> int:
+        self.recording = True
+        self._queue_end = None
+        self._queue_index = int(np.searchsorted(self.times, self.trackerTime(), side="left"))
+        return 0
+
+    def stopRecording(self) -> None:
+        if self.recording:
+            self._queue_end = self.trackerTime()
+        self.recording = False
+
+    def sendMessage(self, text:str) -> int:
+        # EyeConnector.startRecording announces the trial before anything else happens
+        if self.align_trials and (" - START OF TRIAL " in text) and (self._trial < self.trial_starts.size):
+            self.seek(self.trial_starts[self._trial])
+            self._trial += 1
+        self.messages.append((self.trackerTime(), text))
+        return 0
+
+    def sendCommand(self, command:str) -> int:
+        self.commands.append(command)
+        return 0
+
+    ### CONNECTION AND FILES
+    def isConnected(self) -> bool:
+        return self._connected
+
+    def close(self) -> int:
+        self._connected = False
+        return 0
+
+    def receiveDataFile(self, src:str, dest:str) -> int:
+        # nothing was recorded to a file
+        return 0
+
+    def openDataFile(self, name:str) -> int:
+        return 0
+
+    def closeDataFile(self) -> int:
+        return 0
+
+    def setFileEventFilter(self, flags:str) -> None:
+        self.commands.append(f"file_event_filter = {flags}")
+
+    def setFileSampleFilter(self, flags:str) -> None:
+        self.commands.append(f"file_sample_data = {flags}")
+
+    def terminalBreak(self, value:int) -> None:
+        pass
+
+    ### SETUP
+    # setup routines end immediately with success
+    def startSetup(self) -> None:
+        pass
+
+    def setOfflineMode(self) -> None:
+        self.stopRecording()
+
+    def sendKeybutton(self, key:int, modifier:int, state:int) -> int:
+        return 0
+
+    def setCalibrationType(self, calibration_type:str) -> None:
+        self.commands.append(f"calibration_type = {calibration_type}")
+
+    def setAcceptTargetFixationButton(self, button:int) -> None:
+        pass
+
+    def getTargetPositionAndState(self) -> tuple:
+        return (0, 0, 0)
+
+    def getCalibrationResult(self) -> int:
+        return 0
+
+    def getCalibrationMessage(self) -> str:
+        return "replay: 0.00 deg. avg. error, 0.00 deg. max error"
+
+    def doTrackerSetup(self) -> None:
+        # no camera image to show
+        pass
+
+    def startDriftCorrect(self, x:int, y:int) -> int:
+        return 0
+
+    def applyDriftCorrect(self) -> int:
+        return 0
+
+    def bitmapBackdrop(self, *args) -> int:
+        return 0
+
+    def imageBackdrop(self, *args) -> int:
+        return 0
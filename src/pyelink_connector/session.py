@@ -0,0 +1,138 @@
+import numpy as np
+import json
+import os
+
+from .asc import AscData
+
+SESSION_VERSION = 1
+SESSION_SUFFIX = ".session"
+TABLES = ["samples", "fixations", "saccades", "blinks", "messages", "trials"]
+
+
+def session_path(download_directory:str, edf_file_name:str) -> str:
+    """Returns the session directory for an edf file name as created by EyeConnector.openFile, e.g.
+    ("./eye_tracking/", "TEST_pgl.edf") -> "./eye_tracking/TEST_pgl.session".
+    """
+    return os.path.join(download_directory, os.path.splitext(os.path.basename(edf_file_name))[0] + SESSION_SUFFIX)
+
+
+def save_session(data:AscData, path:str, source:str="") -> "Session":
+    """Writes parsed data as session: one .npy file per column, rows sorted by time and an index of the messages.
+    Args:
+        data (AscData): Parsed data, e.g. from asc.read_asc.
+        path (str): Session directory, see session_path.
+        source (str, optional): Name of the source file. Stored in the session's meta data. Defaults to "".
+    Returns:
+        Session: The opened session.
+    """
+    tables = data._asdict()
+
+    # tables are queried by time, so store them sorted. Events are parsed at their end and interleave both eyes.
+    for table, key in [("messages", "time"), ("fixations", "start"), ("saccades", "start"), ("blinks", "start"), ("trials", "start")]:
+        order = np.argsort(np.asarray(tables[table][key]), kind="stable")
+        tables[table] = {k: np.asarray(v)[order] for k, v in tables[table].items()}
+
+    meta = {"version": SESSION_VERSION, "source": source, "tables": {}}
+    for table, columns in tables.items():
+        os.makedirs(os.path.join(path, table), exist_ok=True)
+        meta["tables"][table] = list(columns.keys())
+        for name, values in columns.items():
+            values = np.asarray(values)
+            if values.dtype == object:
+                # fixed width strings can be memory-mapped
+                values = values.astype(str) if values.size else np.empty(0, dtype="U1")
+            np.save(os.path.join(path, table, f"{name}.npy"), values)
+
+    # inverted index: message text and first word -> message times
+    index = {"text": {}, "word": {}}
+    for t, text in zip(tables["messages"]["time"].tolist(), tables["messages"]["text"]):
+        index["text"].setdefault(text, []).append(t)
+        words = text.split(maxsplit=1)
+        if words:
+            index["word"].setdefault(words[0], []).append(t)
+    with open(os.path.join(path, "message_index.json"), "w") as f:
+        json.dump(index, f)
+
+    # meta data last, an interrupted write leaves no valid session
+    with open(os.path.join(path, "meta.json"), "w") as f:
+        json.dump(meta, f)
+
+    return Session(path)
+
+
+class Session():
+    def __init__(self, path:str) -> None:
+        """Opens a session written by save_session. Columns are memory-mapped when they are first used,
+        so opening is cheap and queries only read the pages they touch.
+        Args:
+            path (str): Session directory.
+        """
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        if self.meta["version"] != SESSION_VERSION:
+            raise ValueError(f"Session {path} has version {self.meta['version']}, expected {SESSION_VERSION}.")
+
+        self._columns = {}
+        self._index = None
+
+    ### COLUMNS
+    def column(self, table:str, name:str) -> np.ndarray:
+        """Returns a memory-mapped column, e.g. column("samples", "x_l")."""
+        key = (table, name)
+        if key not in self._columns:
+            if name not in self.meta["tables"][table]:
+                raise KeyError(f"Table {table} has no column {name}.")
+            self._columns[key] = np.load(os.path.join(self.path, table, f"{name}.npy"), mmap_mode="r")
+        return self._columns[key]
+
+    def table(self, table:str) -> dict:
+        """Returns all columns of a table, e.g. table("fixations")."""
+        return {name: self.column(table, name) for name in self.meta["tables"][table]}
+
+    @property
+    def samples(self) -> dict:
+        return self.table("samples")
+
+    @property
+    def trials(self) -> dict:
+        return self.table("trials")
+
+    ### TIME QUERIES
+    def index_range(self, t0:float, t1:float, table:str="samples") -> slice:
+        """Returns the rows of a table with t0 <= time < t1. Events use their start time."""
+        times = self.column(table, "start" if table in ["fixations", "saccades", "blinks", "trials"] else "time")
+        i0, i1 = np.searchsorted(times, [t0, t1], side="left")
+        return slice(int(i0), int(i1))
+
+    def time_range(self, t0:float, t1:float, table:str="samples", columns:list|None=None) -> dict:
+        """Returns views of the columns for t0 <= time < t1.
+        Args:
+            t0 (float): Start in tracker time (ms).
+            t1 (float): End in tracker time (ms), exclusive.
+            table (str, optional): Table to query. Defaults to "samples".
+            columns (list|None, optional): Columns to return. Defaults to None, i.e. all columns.
+        """
+        rows = self.index_range(t0, t1, table)
+        columns = columns if columns is not None else self.meta["tables"][table]
+        return {c: self.column(table, c)[rows] for c in columns}
+
+    def trial(self, i:int, columns:list|None=None) -> dict:
+        """Returns views of the samples recorded in trial i."""
+        return self.time_range(self.column("trials", "start")[i], self.column("trials", "end")[i], columns=columns)
+
+    ### MESSAGES
+    def find_messages(self, text:str, word:bool=False) -> np.ndarray:
+        """Returns the times of all messages with the given text.
+        Args:
+            text (str): Full message text, or the first word of the message if word is True (e.g. "DISPLAY_COORDS").
+            word (bool, optional): Match the first word only. Defaults to False.
+        """
+        if self._index is None:
+            with open(os.path.join(self.path, "message_index.json")) as f:
+                self._index = json.load(f)
+        return np.array(self._index["word" if word else "text"].get(text, []), dtype=np.float64)
+
+    def messages_between(self, t0:float, t1:float) -> dict:
+        """Returns time and text of the messages with t0 <= time < t1."""
+        return self.time_range(t0, t1, table="messages")
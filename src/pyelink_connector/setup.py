@@ -0,0 +1,423 @@
+import pylink
+import time
+from typing import NamedTuple
+
+from .utils import *
+from .validation import parse_validation, read_link_messages, validation_sequence, sequence_commands
+from .fixation import newest_gaze
+from .calibration import CalibrationPolicy
+
+# setup states
+IDLE = "idle"
+STATUS = "status"
+CALIBRATION = "calibration"
+CALIBRATION_DONE = "calibration_done"
+VALIDATION = "validation"
+VALIDATION_DONE = "validation_done"
+DRIFT = "drift"
+
+# keys understood by SetupStateMachine.step. Backends translate their key codes to these names.
+SETUP_KEYS = ["c", "v", "d", "e", "r", "q", "enter", "escape", "space", "backspace", "delete"]
+
+
+class SetupFrame(NamedTuple):
+    mode: str # "text", "target" or "done"
+    text: str # text to show in "text" mode
+    target: tuple|None # (x, y) of the target in tracker coordinates in "target" mode. None if hidden.
+    changed: bool # True if text or target differ from the previous frame
+
+
+class SetupStateMachine():
+    def __init__(self, connector) -> None:
+        """Backend independent setup: status screen, calibration, validation and drift correction.
+        Advances one step per call of step() and reports what to draw, so the setup can run inside any frame loop.
+        The results are stored in the connector's c_status, v_status, d_status, v_error and v_result.
+
+            connector.setup.start("status")
+            while connector.setup.running:
+                frame = connector.setup.step(keys)
+                # draw frame.text or a target at frame.target
+
+        Args:
+            connector: EyeConnector of any backend.
+        """
+        self.connector = connector
+        self.eyelink = connector.eyelink
+
+        self.state = IDLE
+        self.message = "" # result of the last action, e.g. "Calibration accepted."
+        self.result = None # status the setup ended with: c_status, or d_status of a directly returning drift correction
+        self.revalidation_threshold = 1. # error in degrees above which R re-validates a point
+        self.calibration_policy = CalibrationPolicy() # calibration type and areas, see calibration.adaptive_policy
+        self.poll_interval = 0.02 # s between link polls in step(). Keys are handled in every step.
+        self.idle_timeout = 1. # s the backends wait for keys on static screens before stepping again
+        self.auto_accept = None # fixation.FixationDetector accepting targets without operator, see EyeConnector.enableAutoAccept
+
+        self._return_to_status = True
+        self._text = ""
+        self._target = None
+        self._drift_pos = (0, 0)
+        self._last_frame = None
+        self._next_poll = -float("inf")
+        self._v_result = None # validation.ValidationResult not yet accepted
+        self._partial = [] # targets of a partial validation
+        self._full_sequence = [] # tracker point numbers to restore after a partial validation
+        self._calibrated = False # a calibration completed that is accepted together with the next validation
+        self._escalated = False # the calibration policy moved to its next stage since the last completed calibration
+
+    @property
+    def running(self) -> bool:
+        return self.state != IDLE
+
+    @property
+    def idle(self) -> bool:
+        """True on static text screens, which only change on key presses. Backends can wait for input instead of rendering."""
+        return self.state in [STATUS, CALIBRATION_DONE, VALIDATION_DONE]
+
+    @property
+    def frame(self) -> SetupFrame|None:
+        """Frame returned by the last step."""
+        return self._last_frame
+
+    ### ENTRY
+    def start(self, entry:str="status", return_to_status:bool=True, drift_pos:tuple=(0, 0), failed_only:bool=False) -> None:
+        """Starts the setup.
+        Args:
+            entry (str, optional): "status", "calibration", "validation" or "drift". Defaults to "status".
+            return_to_status (bool, optional): Show the status screen after the entry routine ended.
+                Otherwise the setup ends with it. Defaults to True.
+            drift_pos (tuple, optional): Drift correction target in tracker coordinates. Defaults to (0, 0).
+            failed_only (bool, optional): A validation only repeats the points of the last validation with an error
+                above revalidation_threshold. Defaults to False.
+        """
+        assert(entry in [STATUS, CALIBRATION, VALIDATION, DRIFT])
+        self._return_to_status = return_to_status
+        self._drift_pos = drift_pos
+        self._last_frame = None
+        self._next_poll = -float("inf")
+        self.message = ""
+        self.result = None
+        self._calibrated = False
+
+        if entry in [STATUS, CALIBRATION]:
+            # the setup replaces the host screen
+            self.connector.backdrop.invalidate()
+            self.eyelink.startSetup()
+
+        if entry == VALIDATION:
+            self._enter_validation(failed_only)
+        else:
+            {STATUS: self._enter_status, CALIBRATION: self._enter_calibration, DRIFT: self._enter_drift}[entry]()
+
+    def step(self, keys:list=(), now:float|None=None) -> SetupFrame:
+        """Handles key presses, polls the tracker if poll_interval passed and returns what to draw.
+        The target state is cached between polls, frame.changed tells if a redraw is needed.
+        Args:
+            keys (list, optional): Names of the keys pressed since the last step, see SETUP_KEYS. Defaults to ().
+            now (float|None, optional): Current time in s. Defaults to None, i.e. time.perf_counter().
+        Returns:
+            SetupFrame: What to draw. mode is "done" once the setup ended.
+        """
+        now = time.perf_counter() if now is None else now
+        state = self.state
+        for key in keys:
+            if self.state == IDLE:
+                break
+            self._on_key(key)
+        if self.state != state:
+            # poll the new routine right away
+            self._next_poll = -float("inf")
+
+        if (now >= self._next_poll) and (self.state in [CALIBRATION, VALIDATION, DRIFT]):
+            self._next_poll = now + self.poll_interval
+            if self.state == DRIFT:
+                self._poll_drift()
+            else:
+                self._poll_target()
+            if self.state in [CALIBRATION, VALIDATION, DRIFT]:
+                self._auto_accept()
+
+        if self.state == IDLE:
+            frame = SetupFrame("done", "", None, True)
+        elif self.state in [CALIBRATION, VALIDATION, DRIFT]:
+            frame = SetupFrame("target", "", self._target, False)
+        else:
+            frame = SetupFrame("text", self._text, None, False)
+
+        last = self._last_frame
+        changed = (last is None) or (frame.mode != last.mode) or (frame.text != last.text) or (frame.target != last.target)
+        frame = frame._replace(changed=changed)
+        self._last_frame = frame
+        return frame
+
+    ### HELPERS
+    def _send_key(self, key:int) -> None:
+        self.eyelink.sendKeybutton(key, 0, pylink.KB_PRESS)
+        self.eyelink.sendKeybutton(key, 0, pylink.KB_RELEASE)
+
+    def _auto_accept(self) -> None:
+        if self.auto_accept is None:
+            return
+        # gaze is not calibrated yet during the calibration, only its stability counts
+        if self.auto_accept.update(newest_gaze(self.eyelink), self._target, check_distance=self.state != CALIBRATION):
+            self._send_key(SPACE_KEY)
+
+    def _reset_drift_estimate(self, recalibrated:bool=False) -> None:
+        # the tracker corrected the drift measured so far
+        if getattr(self.connector, "drift_estimator", None) is not None:
+            self.connector.drift_estimator.reset(self.eyelink.trackerTime())
+        if recalibrated and (getattr(self.connector, "drift_monitor", None) is not None):
+            self.connector.drift_monitor.recalibrated(self.eyelink.trackerTime())
+
+    def _finish(self, message:str, result:int|None=None) -> None:
+        """Ends the current routine: back to the status screen or end of the setup."""
+        self.message = message
+        if self._return_to_status:
+            self._enter_status(message)
+        else:
+            self.state = IDLE
+            self.result = self.connector.c_status if result is None else result
+
+    def _on_key(self, key:str) -> None:
+        c = self.connector
+        if self.state == STATUS:
+            if key == "c":
+                self._return_to_status = True
+                self._enter_calibration()
+            elif key == "v":
+                self._return_to_status = True
+                self._enter_validation()
+            elif key == "d":
+                self._return_to_status = True
+                self._enter_drift()
+            elif key == "e":
+                # blocks while the camera image is shown
+                c.showCameraImage()
+                self.eyelink.startSetup()
+                self._enter_status("Camera image closed.")
+            elif key in ["q", "enter"]:
+                self.eyelink.setOfflineMode()
+                self.state = IDLE
+                self.result = c.c_status
+
+        elif self.state in [CALIBRATION, VALIDATION]:
+            if key == "space":
+                # (manually) accept target fixation
+                self._send_key(SPACE_KEY)
+            elif key == "backspace":
+                # repeat previous target
+                self._send_key(BACKSPACE_KEY)
+            elif key in ["q", "escape"]:
+                self._send_key(ESC_KEY)
+                self.eyelink.startSetup()
+                if self.state == CALIBRATION:
+                    c.c_status = 27
+                    self._calibrated = False
+                    self._finish("Calibration was aborted.")
+                else:
+                    c.v_status = 27
+                    self._restore_sequence()
+                    self._v_result = None
+                    self._finish("Validation was aborted.")
+
+        elif self.state == CALIBRATION_DONE:
+            if key == "enter":
+                # accept calibration
+                self._send_key(ENTER_KEY)
+                self._calibrated = False
+                self._reset_drift_estimate(recalibrated=True)
+                self._finish("Calibration accepted.")
+            elif key == "c":
+                # restart calibration on tracker
+                self._send_key(DELETE_KEY)
+                self._enter_calibration()
+            elif key == "v":
+                self._enter_validation()
+            elif key in ["backspace", "delete"]:
+                # discard calibration without repeating
+                self._send_key(ESC_KEY)
+                c.c_status = 1000
+                self._calibrated = False
+                self._finish("Calibration discarded.")
+
+        elif self.state == VALIDATION_DONE:
+            if key == "enter":
+                # accept calibration and validation
+                self._send_key(ENTER_KEY)
+                self._store_validation_error()
+                if self._calibrated:
+                    # the new calibration is in effect from now on
+                    self._calibrated = False
+                    self._reset_drift_estimate(recalibrated=True)
+                self._finish("Validation accepted.")
+            elif key == "v":
+                # restart validation on tracker
+                self._send_key(DELETE_KEY)
+                self._enter_validation()
+            elif key == "r":
+                # repeat the failed points only
+                self._send_key(DELETE_KEY)
+                self._enter_validation(failed_only=True)
+            elif key == "c":
+                # discard validation and calibrate again. A failed check escalates the calibration policy once per calibration.
+                if (not self._escalated) and (self._v_result is not None):
+                    self._escalated = self.calibration_policy.escalate(self._v_result.error)
+                self._send_key(ESC_KEY)
+                c.v_status = 1000
+                self._v_result = None
+                self._enter_calibration()
+            elif key in ["backspace", "delete"]:
+                # discard validation without repeating
+                self._send_key(ESC_KEY)
+                c.v_status = 1000
+                self._v_result = None
+                self._finish("Validation discarded.")
+
+        elif self.state == DRIFT:
+            if key == "space":
+                self._send_key(SPACE_KEY)
+            elif key in ["q", "escape"]:
+                # leave drift correct mode on tracker
+                self._send_key(ESC_KEY)
+                c.d_status = 27
+                self._finish(f"Drift correction: {STATUS_MSGS[c.d_status]}", result=27)
+
+    ### STATUS SCREEN
+    def _enter_status(self, msg:str="") -> None:
+        c = self.connector
+        self.state = STATUS
+        self._text = f"STATUS:\
+            \n\t> {msg}\
+            \n\nCalibration: {STATUS_MSGS[c.c_status]}\
+            \nValidation: {STATUS_MSGS[c.v_status]}{f' - avg. error: {c.v_error} °' if c.v_error is not None else ''}\
+            \n\n\tPress C to {'(re)' if c.c_status != 1000 else ''}calibrate.\
+            \n\tPress V to {'(re)' if c.v_status != 1000 else ''}validate.\
+            \n\tPress D to drift correct.\
+            \n\tPress E to show the camera image.\
+            \n\tPress Q/ENTER to quit setup and continue.\
+            \n\nUse SPACE to manually accept a fixation."
+
+    ### CALIBRATION
+    def _enter_calibration(self) -> None:
+        # configure calibration
+        self.calibration_policy.configure(self.eyelink)
+
+        # start calibration on host
+        self._send_key(C_KEY)
+        self.eyelink.setAcceptTargetFixationButton(SPACE_KEY)
+        self._target = None
+        self.state = CALIBRATION
+
+    ### VALIDATION
+    def _enter_validation(self, failed_only:bool=False) -> None:
+        # messages queued before belong to earlier validations
+        read_link_messages(self.connector.link)
+        self._partial = []
+        base = self._validation_base()
+        if failed_only and (base is not None):
+            self._partial = base.failed(self.revalidation_threshold)
+            self._full_sequence = base.sequence
+            if self._partial:
+                for command in validation_sequence(base, self._partial):
+                    self.eyelink.sendCommand(command)
+        if not self._partial:
+            self._v_result = None
+
+        # start validation process
+        self._send_key(V_KEY)
+        self.eyelink.setAcceptTargetFixationButton(SPACE_KEY)
+        self._target = None
+        self.state = VALIDATION
+
+    def _end_validation(self, msg:str) -> None:
+        """Parses the result. A partial validation replaces the repeated points of the previous result."""
+        result = parse_validation(msg, read_link_messages(self.connector.link))
+        if self._partial:
+            result = self._validation_base().merge(result)
+            self._restore_sequence()
+        self._v_result = result
+
+    def _validation_base(self):
+        return self._v_result if self._v_result is not None else self.connector.v_result
+
+    def _restore_sequence(self) -> None:
+        """Ends a partial validation: the next validation uses all points again."""
+        if self._partial:
+            for command in sequence_commands(self._full_sequence):
+                self.eyelink.sendCommand(command)
+            self._partial = []
+
+    def _store_validation_error(self) -> None:
+        c = self.connector
+        c.v_result = self._v_result
+        c.v_error = self._v_result.error if self._v_result is not None else None
+        self._v_result = None
+
+    def _poll_target(self) -> None:
+        c = self.connector
+        # get target position
+        p = self.eyelink.getTargetPositionAndState()
+        self._target = (p[1], p[2]) if p[0] else None
+
+        # check if calibration/validation ended
+        result = self.eyelink.getCalibrationResult()
+        if result == 1000:
+            return
+        msg = self.eyelink.getCalibrationMessage()
+        if self.state == CALIBRATION:
+            c.c_status = result
+            self._calibrated = result == 0
+            self._escalated = False
+            self.state = CALIBRATION_DONE
+            self._text = f"Calibration {STATUS_MSGS[c.c_status]}\
+                \n\t> {msg}\
+                \nPress ENTER to accept the calibration and continue.\
+                \nPress C to calibrate again.\
+                \nPress V to validate.\
+                \nPress BACKSPACE/ DELETE to discard the calibration."
+        else:
+            c.v_status = result
+            c._v_msg = msg
+            self._end_validation(msg)
+            failed = self._v_result.failed(self.revalidation_threshold)
+            failed_text = f"\n{len(failed)} of {len(self._v_result.targets)} points above {self.revalidation_threshold} °" if failed else ""
+            failed_key = "\nPress R to validate the failed points again." if failed else ""
+            stage = None if self._escalated else self.calibration_policy.next_stage(self._v_result.error)
+            if stage is not None:
+                failed_text += f"\nAbove the thresholds: calibrating again (C) uses {stage.calibration_type}."
+            self.state = VALIDATION_DONE
+            self._text = f"Validation {STATUS_MSGS[c.v_status]}\
+                \n\t> {msg}\
+                {failed_text}\
+                \nPress ENTER to accept the validation and continue.\
+                \nPress V to validate again.\
+                {failed_key}\
+                \nPress C to calibrate again.\
+                \nPress BACKSPACE/ DELETE to discard the validation."
+
+    ### DRIFT CORRECTION
+    def _enter_drift(self) -> None:
+        self.connector.backdrop.invalidate()
+        self._target = tuple(self._drift_pos)
+        # messages queued before belong to earlier checks
+        read_link_messages(self.connector.link)
+        self.eyelink.startDriftCorrect(int(self._drift_pos[0]), int(self._drift_pos[1]))
+        # make sure "Apply correction" is active on the Host PC
+        self.state = DRIFT
+
+    def _poll_drift(self) -> None:
+        d = self.eyelink.getCalibrationResult()
+        if d == 1000:
+            return
+        msg = self.eyelink.getCalibrationMessage()
+        self.eyelink.applyDriftCorrect()
+        monitor = getattr(self.connector, "drift_monitor", None)
+        if monitor is not None:
+            monitor.add_drift_check(self.eyelink.trackerTime(), [msg] + read_link_messages(self.connector.link), corrected=d == 0)
+        if d == 0:
+            self._reset_drift_estimate()
+
+        # enter setup mode
+        self.eyelink.startSetup()
+        self.connector.d_status = d
+        self._finish(f"Drift correction: {STATUS_MSGS[d]}", result=d)
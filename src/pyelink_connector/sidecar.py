@@ -0,0 +1,166 @@
+import pylink
+import numpy as np
+import threading
+import queue
+import json
+import os
+
+
+class StimulusLog():
+    def __init__(self, directory:str, name:str="stimulus", chunk_size:int=4096) -> None:
+        """Logs per-frame stimulus state to local files instead of sending it over the link.
+        Rows are timestamped in tracker time and buffered column-wise in memory. Full chunks are written
+        by a background thread. Per trial only one anchor message is written to the edf file.
+
+        Add it to EyeConnector.recording_listeners to start and end trials together with the recording.
+        Trials are stored in directory/<edf name>_<name>_<trial>, so sessions sharing a directory do not mix.
+
+        Args:
+            directory (str): Directory to write the logs to, e.g. EyeConnector.download_directory.
+            name (str, optional): Name of the log. Used for file names and the anchor message. Defaults to "stimulus".
+            chunk_size (int, optional): Number of rows buffered before they are written. Defaults to 4096.
+        """
+        self.directory = directory
+        self.name = name
+        self.chunk_size = chunk_size
+
+        self.trial = -1
+        self.path = None
+        self.columns = None
+        self._buffer = None
+        self._n = 0
+        self._offset = 0.
+
+        os.makedirs(self.directory, exist_ok=True)
+
+        self._queue = queue.Queue()
+        self._writer = threading.Thread(target=self._write_loop, daemon=True)
+        self._writer.start()
+
+    ### RECORDING LISTENER
+    def on_recording_start(self, connector, msg:str) -> None:
+        self.start_trial(connector.eyelink, os.path.splitext(os.path.basename(connector.edf_file_name))[0])
+
+    def on_recording_stop(self, connector) -> None:
+        self.end_trial()
+
+    ### TRIALS
+    def start_trial(self, eyelink, session:str="") -> None:
+        """Starts a new trial log and writes its anchor message to the edf file.
+        Args:
+            eyelink (pylink.EyeLink): Connected tracker. Used for the clock offset and the anchor message.
+            session (str, optional): Prefix of the trial directory, e.g. the edf file name. Defaults to "".
+        """
+        if self.path is not None:
+            self.end_trial()
+
+        self.trial += 1
+        prefix = f"{session}_" if session else ""
+        self.path = os.path.join(self.directory, f"{prefix}{self.name}_{self.trial:04d}")
+        self.columns = None
+        self._buffer = None
+        self._n = 0
+        # trials without rows are readable as well
+        self._queue.put(("open", self.path, None))
+
+        # tracker time = local time + offset
+        self._offset = eyelink.trackerTimeOffset()
+        eyelink.sendMessage(f"STIMULUS_LOG {self.name} TRIAL {self.trial} FILE {os.path.basename(self.path)} OFFSET {self._offset}")
+
+    def end_trial(self) -> None:
+        """Writes the remaining rows of the current trial and closes its files."""
+        if self.path is None:
+            return
+        self._flush()
+        self._queue.put(("close", self.path, None))
+        self.path = None
+
+    def log(self, time:float|None=None, **fields) -> None:
+        """Adds one row to the current trial.
+        Tuples are split into one column per element, e.g. target=(x, y) is stored as target_x and target_y.
+        All rows of a trial must provide the same fields.
+        Args:
+            time (float|None, optional): Tracker time in ms. Defaults to None, i.e. now.
+            **fields: Numeric values to log.
+        """
+        assert(self.path is not None)
+
+        if time is None:
+            time = pylink.currentDoubleUsec() / 1000. + self._offset
+
+        row = {"time": time}
+        for k, v in fields.items():
+            if isinstance(v, (tuple, list, np.ndarray)):
+                suffixes = "xy" if len(v) == 2 else range(len(v))
+                for s, x in zip(suffixes, v):
+                    row[f"{k}_{s}"] = x
+            else:
+                row[k] = v
+
+        if self.columns is None:
+            self.columns = list(row.keys())
+            self._allocate()
+        elif set(row) != set(self.columns):
+            raise ValueError(f"Logged fields {list(row.keys())} do not match the trial's columns {self.columns}.")
+
+        for k, v in row.items():
+            self._buffer[k][self._n] = v
+        self._n += 1
+
+        if self._n == self.chunk_size:
+            self._flush()
+
+    def close(self) -> None:
+        """Ends the current trial and waits until everything is written."""
+        self.end_trial()
+        self._queue.put(None)
+        self._writer.join()
+
+    ### BUFFERING
+    def _allocate(self):
+        self._buffer = {k: np.empty(self.chunk_size, dtype=np.float64) for k in self.columns}
+        self._n = 0
+
+    def _flush(self):
+        if self._buffer is None or self._n == 0:
+            return
+        # hand the filled arrays to the writer and continue with fresh ones
+        chunk = {k: v[:self._n] for k, v in self._buffer.items()}
+        self._queue.put(("write", self.path, chunk))
+        self._allocate()
+
+    def _write_loop(self):
+        files = {}
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+
+            action, path, chunk = item
+            if action == "open":
+                os.makedirs(path, exist_ok=True)
+                with open(os.path.join(path, "columns.json"), "w") as f:
+                    json.dump([], f)
+            elif action == "write":
+                if path not in files:
+                    with open(os.path.join(path, "columns.json"), "w") as f:
+                        json.dump(list(chunk.keys()), f)
+                    # a trial directory left by an earlier run is overwritten, not appended to
+                    files[path] = {k: open(os.path.join(path, f"{k}.f64"), "wb") for k in chunk}
+                for k, v in chunk.items():
+                    v.tofile(files[path][k])
+            elif action == "close":
+                for f in files.pop(path, {}).values():
+                    f.close()
+
+
+def read_stimulus_log(path:str) -> dict:
+    """Reads one trial written by StimulusLog.
+    Args:
+        path (str): Directory of the trial, e.g. "./eye_tracking/TEST_stimulus_0000".
+    Returns:
+        dict[str, np.ndarray]: Columns by name. "time" is the tracker time in ms. Empty for a trial without rows.
+    """
+    with open(os.path.join(path, "columns.json")) as f:
+        columns = json.load(f)
+    return {k: np.fromfile(os.path.join(path, f"{k}.f64"), dtype=np.float64) for k in columns}
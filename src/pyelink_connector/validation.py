@@ -0,0 +1,134 @@
+import re
+from typing import NamedTuple
+
+from .link import MESSAGE_EVENT
+
+
+# e.g. "VALIDATE R POINT 3  LEFT  at 1472,540  OFFSET 0.41 deg.  -9.8,12.1 pix."
+POINT_PATTERN = re.compile(r"VALIDATE\s+\S+\s+\d*POINT\s+(\d+)\s+(LEFT|RIGHT)\s+at\s+(-?[\d.]+)\s*,\s*(-?[\d.]+)"
+                           r"\s+OFFSET\s+(-?[\d.]+)\s+deg\.\s+(-?[\d.]+)\s*,\s*(-?[\d.]+)\s+pix")
+# summary of getCalibrationMessage or the "!CAL VALIDATION" message, e.g. "0.35 deg. avg. error, 0.62 deg. max error"
+# or "LEFT GOOD ERROR 0.35 avg. 0.62 max OFFSET ..."
+AVG_PATTERN = re.compile(r"(-?[\d.]+)\s+(?:deg\.\s+)?avg\.")
+MAX_PATTERN = re.compile(r"(-?[\d.]+)\s+(?:deg\.\s+)?max\b")
+
+
+class ValidationPoint(NamedTuple):
+    index: int # tracker point number (POINT n), as used by validation_sequence
+    eye: str # "left" or "right"
+    target: tuple # (x, y) in tracker (screen) coordinates
+    error: float # in degrees
+    offset: tuple # (dx, dy) in pixels
+
+
+class ValidationResult():
+    def __init__(self, points:list=(), avg_error:float|None=None, max_error:float|None=None, message:str="",
+                 sequence:list|None=None) -> None:
+        """Result of a validation: summary errors and, if the tracker reported them, the error of every point and eye.
+        Args:
+            points (list, optional): ValidationPoints. Defaults to ().
+            avg_error (float|None, optional): Average error in degrees. Defaults to None, i.e. computed from the points.
+            max_error (float|None, optional): Maximum error in degrees. Defaults to None, i.e. computed from the points.
+            message (str, optional): Message of the tracker. Defaults to "".
+            sequence (list|None, optional): Tracker point numbers in the order they were validated.
+                Defaults to None, i.e. the order of the points.
+        """
+        self.points = list(points)
+        self.message = message
+        if sequence is None:
+            sequence = list(dict.fromkeys(p.index for p in self.points))
+        self.sequence = list(sequence)
+        errors = [p.error for p in self.points]
+        if (avg_error is None) and errors:
+            avg_error = sum(errors) / len(errors)
+        if (max_error is None) and errors:
+            max_error = max(errors)
+        self.avg = avg_error
+        self.max = max_error
+
+    def __repr__(self) -> str:
+        return f"ValidationResult(avg={self.avg}, max={self.max}, points={len(self.points)})"
+
+    @property
+    def error(self) -> tuple|None:
+        """(average, maximum) error in degrees, as stored in EyeConnector.v_error."""
+        if (self.avg is None) or (self.max is None):
+            return None
+        return (self.avg, self.max)
+
+    @property
+    def point_numbers(self) -> dict:
+        """Tracker point number of every target position."""
+        return {p.target: p.index for p in self.points}
+
+    @property
+    def targets(self) -> list:
+        """Target positions in the order of the validation sequence."""
+        targets = {}
+        for p in self.points:
+            targets.setdefault(p.index, p.target)
+        return [targets[i] for i in self.sequence if i in targets]
+
+    def failed(self, threshold:float) -> list:
+        """Returns the targets at which the error of any eye exceeds threshold (degrees)."""
+        return [t for t in self.targets if any((p.target == t) and (p.error > threshold) for p in self.points)]
+
+    def merge(self, other:"ValidationResult") -> "ValidationResult":
+        """Returns this result with the points re-validated in other replaced, e.g. after a partial validation.
+        The summary is recomputed from the points.
+        """
+        if not other.points:
+            return other
+        renewed = {(p.target, p.eye) for p in other.points}
+        points = [p for p in self.points if (p.target, p.eye) not in renewed]
+        numbers = self.point_numbers
+        for p in other.points:
+            # keep the point numbers of the full validation
+            points.append(p._replace(index=numbers.get(p.target, p.index)))
+        sequence = self.sequence + [p.index for p in points if p.index not in self.sequence]
+        return ValidationResult(sorted(points, key=lambda p: (sequence.index(p.index), p.eye)), message=other.message,
+                                sequence=list(dict.fromkeys(sequence)))
+
+
+def parse_validation(message:str, lines:list=()) -> ValidationResult:
+    """Parses the validation message of the tracker (getCalibrationMessage) and VALIDATE lines, e.g. link
+    messages (see read_link_messages) or messages of an asc file.
+    Returns:
+        ValidationResult: Summary errors are None if they could not be parsed.
+    """
+    points = []
+    for line in lines:
+        m = POINT_PATTERN.search(line)
+        if m is None:
+            continue
+        i, eye, x, y, error, dx, dy = m.groups()
+        points.append(ValidationPoint(int(i), eye.lower(), (float(x), float(y)), float(error), (float(dx), float(dy))))
+
+    avg = AVG_PATTERN.search(message)
+    max_error = MAX_PATTERN.search(message)
+    if (avg is None) or (max_error is None):
+        return ValidationResult(points, message=message)
+    return ValidationResult(points, float(avg.group(1)), float(max_error.group(1)), message)
+
+
+def read_link_messages(link, consumer:str="setup") -> list:
+    """Returns the texts of the link messages that arrived since the last read of consumer.
+    Args:
+        link (link.LinkReader): Reader of the connector (EyeConnector.link), shared with e.g. the sample history.
+    """
+    return link.messages(consumer)
+
+
+def validation_sequence(result:ValidationResult, selected:list) -> list:
+    """Returns the tracker commands that restrict the next validation to the selected targets.
+    Args:
+        result (ValidationResult): Result of the full validation, which maps the targets to tracker point numbers.
+        selected (list): Targets to validate, e.g. ValidationResult.failed(threshold).
+    """
+    numbers = result.point_numbers
+    return sequence_commands([numbers[t] for t in result.targets if t in selected])
+
+
+def sequence_commands(sequence:list) -> list:
+    """Returns the tracker commands that validate the given point numbers in order, e.g. ValidationResult.sequence."""
+    return [f"validation_samples = {len(sequence)}", f"validation_sequence = {','.join(map(str, sequence))}"]
@@ -0,0 +1,29 @@
+import numpy as np
+
+from pyelink_connector.asc import read_asc
+
+ASC = b"""** CONVERTED FROM TEST.EDF
+MSG\t100 TIMESTAMP 2024 - START OF TRIAL a
+SAMPLES\tGAZE\tLEFT\tRATE\t1000.00
+101\t  10.0\t  20.0\t 1000.0\t...
+EFIX L   90\t101\t12\t  10.0\t  20.0\t  1000
+102\t   .\t   .\t    0.0\t...
+MSG\t102 -1 hello
+SAMPLES\tGAZE\tLEFT\tRIGHT\tRATE\t1000.00
+103\t  11.0\t  21.0\t 1000.0\t  30.0\t  40.0\t  900.0\t.....
+MSG\t104 TIMESTAMP 2024 - END OF TRIAL a
+"""
+
+
+def test_read_asc_switches_columns_within_a_chunk(tmp_path):
+    path = tmp_path / "test.asc"
+    path.write_bytes(ASC)
+    for chunk_size in [2**20, 40]:
+        data = read_asc(str(path), chunk_size)
+
+        np.testing.assert_array_equal(data.samples["time"], [101, 102, 103])
+        np.testing.assert_array_equal(data.samples["x_l"], [10, np.nan, 11])
+        np.testing.assert_array_equal(data.samples["x_r"], [np.nan, np.nan, 30])
+        np.testing.assert_array_equal(data.fixations["end"], [101])
+        assert list(data.messages["text"]) == ["TIMESTAMP 2024 - START OF TRIAL a", "hello", "TIMESTAMP 2024 - END OF TRIAL a"]
+        np.testing.assert_array_equal(data.trials["end"], [104])
@@ -0,0 +1,33 @@
+import numpy as np
+
+from pyelink_connector.epochs import epoch_array
+
+
+def recording(times:list, trials:list) -> tuple:
+    """(samples, trials) column dicts, x is the sample time."""
+    times = np.asarray(times, dtype=np.float64)
+    samples = {"time": times, "x_l": times.astype(np.float32)}
+    trials = {"start": np.array([t[0] for t in trials], dtype=np.float64),
+              "end": np.array([t[1] for t in trials], dtype=np.float64),
+              "label": np.array(["trial"] * len(trials))}
+    return samples, trials
+
+
+def test_gaps_between_trials_stay_nan():
+    # two trials recorded 1 kHz with a break in between
+    data = recording(list(range(100, 110)) + list(range(200, 210)), [(100, 109), (200, 209)])
+    out, t, _ = epoch_array(data, ["x_l"], pre=5, post=5)
+
+    assert t[0] == -5 and t[-1] == 14
+    # the samples before and after every trial are outside the recording, not the other trial
+    assert np.isnan(out[:, :5, 0]).all() and np.isnan(out[:, 15:, 0]).all()
+    np.testing.assert_array_equal(out[1, 5:15, 0], np.arange(200, 210))
+
+
+def test_dropped_samples_keep_their_time():
+    data = recording([0, 1, 2, 5, 6, 7, 8, 9], [(0, 9)])
+    out, t, _ = epoch_array(data, ["x_l"], length=10)
+
+    assert len(t) == 10
+    np.testing.assert_array_equal(out[0, [0, 1, 2, 5, 9], 0], [0, 1, 2, 5, 9])
+    assert np.isnan(out[0, 3:5, 0]).all()
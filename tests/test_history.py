@@ -0,0 +1,24 @@
+import pytest
+
+pytest.importorskip("pylink")
+
+import numpy as np
+from pyelink_connector.history import SampleHistory
+
+
+def rows(t0:int, n:int) -> list:
+    return [(t, t, t, 3., np.nan, np.nan, 0.) for t in range(t0, t0 + n)]
+
+
+def test_grow_keeps_samples_and_earlier_views(tmp_path):
+    history = SampleHistory(str(tmp_path), capacity=4)
+    history.append(rows(0, 3))
+    view = history.column("x_l")
+    history.append(rows(3, 10))
+
+    assert history.capacity >= 13
+    np.testing.assert_array_equal(history.column("time"), np.arange(13))
+    np.testing.assert_array_equal(view, [0, 1, 2])
+
+    history.close()
+    assert history.size == 0
@@ -0,0 +1,39 @@
+import pytest
+
+visual = pytest.importorskip("psychopy.visual")
+
+from pyelink_connector.psychopy.utils import MultiLineText, interest_areas_from_stim
+
+
+@pytest.fixture(scope="module")
+def win():
+    try:
+        win = visual.Window((800, 600), units="pix", winType="pyglet", fullscr=False)
+    except Exception as e:
+        pytest.skip(f"no window: {e}")
+    yield win
+    win.close()
+
+
+@pytest.mark.parametrize("anchor", ["left", "center", "right"])
+def test_interest_areas_fill_the_bounding_box(win, anchor):
+    text = MultiLineText(win, text="first line\nthe second line", pos=(30, -20), height=30, wrapWidth=2000,
+                         anchorHoriz=anchor)
+    text.draw()
+    areas = text.interest_areas()
+
+    assert [a.label for a in areas] == ["first", "line", "the", "second", "line"]
+    w, h = text.boundingBox
+    x, y = text.posPix
+    left = x - {"left": 0, "center": w / 2, "right": w}[anchor]
+    assert min(a.left for a in areas) == pytest.approx(left, abs=2)
+    assert max(a.right for a in areas) == pytest.approx(left + w, abs=2)
+    assert max(a.top for a in areas) == pytest.approx(y + h / 2, abs=h * .1)
+    assert min(a.bottom for a in areas) == pytest.approx(y - h / 2, abs=h * .1)
+
+
+def test_plain_text_stim(win):
+    stim = visual.TextStim(win, text="one two", pos=(0, 0), height=30, wrapWidth=2000)
+    areas = interest_areas_from_stim(stim, "character")
+    assert "".join(a.label for a in areas) == "onetwo"
+    assert all(a.left < a.right for a in areas)
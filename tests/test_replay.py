@@ -0,0 +1,47 @@
+import pytest
+
+pytest.importorskip("pylink")
+
+import numpy as np
+from pyelink_connector.replay import ReplayEyeLink
+from pyelink_connector.accuracy import QuickCheck
+from pyelink_connector.link import LinkReader
+
+
+def fixating(target:tuple, ms:int=10000) -> tuple:
+    """(samples, trials) of a 1 kHz recording looking at target."""
+    times = np.arange(ms, dtype=np.float64)
+    samples = {"time": times, "x_l": np.full(ms, target[0] + 3.), "y_l": np.full(ms, target[1] + 4.),
+               "pupil_l": np.full(ms, 1000.)}
+    trials = {"start": np.array([0.]), "end": np.array([ms - 1.]), "label": np.array(["trial"])}
+    return samples, trials
+
+
+def test_quick_check_finishes_with_deterministic_clock():
+    eyelink = ReplayEyeLink(fixating((100., 200.)), step_ms=1000 / 60)
+    check = QuickCheck(eyelink, [(100., 200.)] * 3, pixels_per_degree=10., link=LinkReader(eyelink))
+    check.start()
+    for _ in range(1000):
+        if check.step() is None:
+            break
+
+    assert not check.running
+    assert check.result.passed
+    assert len(check.result.targets) == 3
+    assert check.result.max_error == pytest.approx(.5)
+
+
+def test_quick_check_without_resolution_is_unchecked():
+    eyelink = ReplayEyeLink(fixating((100., 200.)), step_ms=1000 / 60)
+    link = LinkReader(eyelink)
+    check = QuickCheck(eyelink, [(100., 200.)], link=link)
+    check.start()
+    while check.step() is not None:
+        pass
+
+    # 5 px could be far above or below 1 degree
+    assert check.result.passed is None
+    assert check.result.max_error == pytest.approx(5.)
+    assert eyelink.messages[-1][1].startswith("QUICK_CHECK UNCHECKED")
+    # the samples up to stopRecording were read
+    assert link.samples("quick_check") == []
@@ -0,0 +1,191 @@
+import pytest
+
+pytest.importorskip("pylink")
+
+from pyelink_connector.setup import SetupStateMachine, STATUS, VALIDATION_DONE
+from pyelink_connector.link import LinkReader, MESSAGE_EVENT
+from pyelink_connector.drift import DriftEstimator, DriftTrendMonitor, NO_CORRECTION, RECALIBRATION
+from pyelink_connector.calibration import adaptive_policy
+
+
+class FakeMessage():
+    def __init__(self, text:str) -> None:
+        self.text = text
+
+    def getText(self) -> str:
+        return self.text
+
+
+class FakeEyeLink():
+    """Tracker in setup mode: the test sets the calibration result and the queued link messages."""
+    def __init__(self) -> None:
+        self.result = 1000
+        self.message = "0.30 deg. avg. error, 0.50 deg. max error"
+        self.messages = []
+        self.commands = []
+        self.keys = []
+        self.calibration_types = []
+        self.time = 1000.
+        self._current = None
+
+    def trackerTime(self) -> float:
+        return self.time
+
+    def getTargetPositionAndState(self) -> tuple:
+        return (1, 10, 20)
+
+    def getCalibrationResult(self) -> int:
+        return self.result
+
+    def getCalibrationMessage(self) -> str:
+        return self.message
+
+    def getNextData(self) -> int:
+        if not self.messages:
+            return 0
+        self._current = FakeMessage(self.messages.pop(0))
+        return MESSAGE_EVENT
+
+    def getFloatData(self) -> FakeMessage:
+        return self._current
+
+    def sendKeybutton(self, key:int, modifier:int, state:int) -> None:
+        self.keys.append(key)
+
+    def sendCommand(self, command:str) -> None:
+        self.commands.append(command)
+
+    def setCalibrationType(self, calibration_type:str) -> None:
+        self.calibration_types.append(calibration_type)
+
+    def __getattr__(self, name:str):
+        # startSetup, setOfflineMode, setAcceptTargetFixationButton, ...
+        return lambda *args: None
+
+
+class FakeBackdrop():
+    def invalidate(self) -> None:
+        pass
+
+
+class FakeConnector():
+    def __init__(self) -> None:
+        self.eyelink = FakeEyeLink()
+        self.link = LinkReader(self.eyelink)
+        self.backdrop = FakeBackdrop()
+        self.c_status = self.v_status = self.d_status = 1000
+        self.v_error = None
+        self.v_result = None
+        self._v_msg = ""
+        self.drift_estimator = None
+        self.drift_monitor = None
+
+
+def validation_lines(errors:list) -> list:
+    return [f"VALIDATE R POINT {i}  LEFT  at {10 * i},{10 * i}  OFFSET {e} deg.  1,1 pix." for i, e in enumerate(errors)]
+
+
+@pytest.fixture
+def setup():
+    sm = SetupStateMachine(FakeConnector())
+    sm.poll_interval = 0
+    return sm
+
+
+def finish_routine(sm:SetupStateMachine, result:int=0, messages:list=()) -> None:
+    """Lets the tracker end the running calibration or validation."""
+    sm.eyelink.messages[:] = list(messages)
+    sm.eyelink.result = result
+    sm.step()
+    sm.eyelink.result = 1000
+
+
+def test_accepting_validation_after_calibration_resets_drift(setup):
+    c = setup.connector
+    c.drift_estimator = DriftEstimator()
+    c.drift_estimator.add_residual(500., "left", 30., 0.)
+    c.drift_monitor = DriftTrendMonitor(pixels_per_degree=30.)
+    c.drift_monitor._distorted = True
+
+    setup.start("status")
+    setup.step(["c"])
+    finish_routine(setup)
+    setup.step(["v"])
+    finish_routine(setup, messages=validation_lines([0.3, 0.4]))
+    assert setup.state == VALIDATION_DONE
+    c.eyelink.time = 2000.
+    setup.step(["enter"])
+
+    assert setup.state == STATUS
+    assert c.drift_estimator.offsets["left"] == (0., 0.)
+    assert c.drift_monitor.recommend(2001.) == NO_CORRECTION
+
+
+def test_accepting_validation_without_calibration_keeps_drift(setup):
+    c = setup.connector
+    c.drift_monitor = DriftTrendMonitor(pixels_per_degree=30.)
+    c.drift_monitor._distorted = True
+
+    setup.start("status")
+    setup.step(["v"])
+    finish_routine(setup, messages=validation_lines([0.3, 0.4]))
+    setup.step(["enter"])
+
+    assert c.drift_monitor.recommend(2001.) == RECALIBRATION
+
+
+FAILED = "LEFT POOR ERROR 0.90 avg. 2.00 max"
+
+
+def failed_validation(sm:SetupStateMachine, key:str="v") -> None:
+    sm.eyelink.message = FAILED
+    sm.step([key])
+    finish_routine(sm, messages=validation_lines([0.3, 2.0, 0.4]))
+    assert sm.state == VALIDATION_DONE
+
+
+def test_repeated_validations_do_not_escalate(setup):
+    setup.calibration_policy = adaptive_policy()
+    setup.start("status")
+    failed_validation(setup)
+    failed_validation(setup, "v")
+    assert setup.calibration_policy.stage.calibration_type == "HV5"
+
+    # only calibrating again moves on, by one stage
+    setup.step(["c"])
+    assert setup.connector.eyelink.calibration_types[-1] == "HV9"
+
+
+def test_partial_validations_do_not_escalate(setup):
+    setup.calibration_policy = adaptive_policy()
+    setup.start("status")
+    failed_validation(setup)
+    setup.eyelink.commands.clear()
+    failed_validation(setup, "r")
+    assert "validation_sequence = 1" in setup.eyelink.commands
+    assert setup.calibration_policy.stage.calibration_type == "HV5"
+
+
+def test_accepted_validation_does_not_escalate(setup):
+    setup.calibration_policy = adaptive_policy()
+    setup.start("status")
+    failed_validation(setup)
+    setup.step(["enter"])
+    assert setup.calibration_policy.stage.calibration_type == "HV5"
+
+
+def test_escalates_once_per_calibration(setup):
+    setup.calibration_policy = adaptive_policy()
+    setup.start("status")
+    failed_validation(setup)
+    setup.step(["c"])
+    # aborted before it completed: the next failed check keeps HV9
+    setup.step(["escape"])
+    failed_validation(setup)
+    setup.step(["c"])
+    assert setup.calibration_policy.stage.calibration_type == "HV9"
+
+    finish_routine(setup)
+    failed_validation(setup)
+    setup.step(["c"])
+    assert setup.calibration_policy.stage.calibration_type == "HV13"